@@ -1,6 +1,7 @@
-from urllib import request
 from django import forms
 from django.contrib.auth import authenticate, get_user_model
+from finnhub_integration.client_registry import registry
+from finnhub_integration.key_validation import forget_key_validity, remember_key_validity
 
 User = get_user_model()
 
@@ -117,31 +118,40 @@ class UserRegisterForm(forms.ModelForm):
 class UserAddFinnhubKeyForm(forms.ModelForm):
     finnhub_api_key = forms.CharField(
         label='Finnhub API Key',
+        required=False,
         widget=forms.TextInput(attrs={'placeholder': 'Enter API key'})
     )
 
     class Meta:
         model = User
         fields = ['finnhub_api_key', ]
-    
-    def clean_api_key(self):
-        API_URL = "https://finnhub.io/api/v1/?token="
-        key = self.cleaned_data['finnhub_api_key']
-
-        if key:
-            # Check if the key corresponds to an active subscription
-            url = API_URL + key
-        
-            # Check if exception is raised for any endpoint
-            r = request.get(url)
-            if r.status_code != 401:
-                return key
-        else:
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The instance is updated while the form is validated, so its current key is kept aside.
+        self.previous_key = self.instance.finnhub_api_key
+
+    def clean_finnhub_api_key(self):
+        # An empty key clears the user's key. It is saved as NULL, since the column is unique.
+        key = self.cleaned_data['finnhub_api_key'] or None
+        if key is None:
+            return key
+
+        # Check if the key corresponds to an active subscription. The result is cached, so the
+        # dashboard pages don't need to validate the key again.
+        if not registry.check_key_valid(key):
             raise forms.ValidationError('The API key you entered is invalid.')
+        return key
 
     def save(self, commit=True):
         user = super(UserAddFinnhubKeyForm, self).save(commit=False)
         user.finnhub_api_key = self.cleaned_data.get('finnhub_api_key')
         if commit:
             user.save()
-        return 
\ No newline at end of file
+            if self.previous_key and self.previous_key != user.finnhub_api_key:
+                # The previous key is no longer used, so its cached validity and pooled client are dropped.
+                forget_key_validity(self.previous_key)
+                registry.discard(self.previous_key)
+            if user.finnhub_api_key:
+                remember_key_validity(user.finnhub_api_key, True)
+        return user
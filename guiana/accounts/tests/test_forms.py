@@ -1,6 +1,10 @@
+from unittest import mock
+
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.test import TestCase
-from accounts.forms import UserAdminCreationForm, UserLoginForm, UserRegisterForm
+from accounts.forms import UserAddFinnhubKeyForm, UserAdminCreationForm, UserLoginForm, UserRegisterForm
+from finnhub_integration.key_validation import get_cached_key_validity, remember_key_validity
 
 CustomUser = get_user_model()
 
@@ -187,4 +191,45 @@ class UserAdminCreationFormTestClass(TestCase):
         }
 
         form = UserAdminCreationForm(data=form_data)
-        self.assertEquals(form.errors['__all__'][0], 'Your passwords must match.')
\ No newline at end of file
+        self.assertEquals(form.errors['__all__'][0], 'Your passwords must match.')
+
+
+class UserAddFinnhubKeyFormTestClass(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(username="testuser", password="password",
+                                                   email="testuser@example.com")
+        self.user.finnhub_api_key = "oldkey"
+        self.user.save()
+        remember_key_validity("oldkey", True)
+
+    def test_key_can_be_cleared(self):
+        CustomUser.objects.create_user(username="nokey", password="password", email="nokey@example.com")
+        form = UserAddFinnhubKeyForm(data={"finnhub_api_key": ""}, instance=self.user)
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.finnhub_api_key)
+        self.assertIsNone(get_cached_key_validity("oldkey"))
+
+    def test_invalid_key(self):
+        remember_key_validity("badkey", False)
+        form = UserAddFinnhubKeyForm(data={"finnhub_api_key": "badkey"}, instance=self.user)
+        self.assertFormError(form=form, field='finnhub_api_key', errors=['The API key you entered is invalid.'])
+
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.finnhub_api_key, "oldkey")
+
+    @mock.patch('accounts.forms.registry')
+    def test_changed_key(self, registry):
+        registry.check_key_valid.return_value = True
+        form = UserAddFinnhubKeyForm(data={"finnhub_api_key": "newkey"}, instance=self.user)
+        self.assertTrue(form.is_valid())
+        form.save()
+
+        self.user.refresh_from_db()
+        self.assertEquals(self.user.finnhub_api_key, "newkey")
+        self.assertTrue(get_cached_key_validity("newkey"))
+        self.assertIsNone(get_cached_key_validity("oldkey"))
+        registry.discard.assert_called_once_with("oldkey")
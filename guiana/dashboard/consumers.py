@@ -0,0 +1,101 @@
+"""
+WebSocket endpoints of the dashboard, served by guiana/asgi.py.
+"""
+
+import asyncio
+import json
+import logging
+from importlib import import_module
+from types import SimpleNamespace
+from urllib.parse import urlparse
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib import auth
+from django.http import parse_cookie
+
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.trade_stream import get_trade_hub
+
+
+logger = logging.getLogger(__name__)
+
+# Symbols a single browser may watch at once.
+MAX_SYMBOLS = 20
+
+
+def _get_user(session_key: str):
+    session = import_module(settings.SESSION_ENGINE).SessionStore(session_key)
+    # auth.get_user only needs the request's session.
+    return auth.get_user(SimpleNamespace(session=session))
+
+
+def _is_same_origin(headers: dict):
+    # Browsers send cookies along with cross-site WebSocket handshakes, so those are refused.
+    origin = headers.get(b'origin')
+    return origin is None or urlparse(origin.decode('latin-1')).netloc == headers.get(b'host', b'').decode('latin-1')
+
+
+async def get_api_key(scope: dict):
+    """
+    @return: The API key of the user of the WebSocket's session, or None if it isn't a valid one.
+    """
+
+    headers = dict(scope['headers'])
+    if not _is_same_origin(headers):
+        return None
+
+    cookies = parse_cookie(headers.get(b'cookie', b'').decode('latin-1'))
+    user = await sync_to_async(_get_user)(cookies.get(settings.SESSION_COOKIE_NAME))
+    if not user.is_authenticated or not await async_registry.check_key_valid(user.finnhub_api_key):
+        return None
+    return user.finnhub_api_key
+
+
+async def trades_consumer(scope: dict, receive, send):
+    """
+    Stream live trades to the browser, in the format of finnhub.io's WebSocket API: the browser sends
+    {"type": "subscribe"|"unsubscribe", "symbol": "AAPL"} messages and receives
+    {"type": "trade", "data": [{"s": "AAPL", "p": 150.1, "v": 300, "t": 1666000000000, "n": 4}, ...]} messages,
+    where every item coalesces the "n" trades of a symbol since the previous message.
+    """
+
+    if (await receive())['type'] != 'websocket.connect':
+        return
+
+    api_key = await get_api_key(scope)
+    if api_key is None:
+        await send({'type': 'websocket.close', 'code': 4003})
+        return
+    await send({'type': 'websocket.accept'})
+
+    subscription = get_trade_hub().connect(api_key)
+
+    async def send_trades():
+        while True:
+            await send({'type': 'websocket.send', 'text': json.dumps(await subscription.get())})
+
+    sender = asyncio.create_task(send_trades())
+    try:
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            try:
+                request = json.loads(message.get('text') or '')
+                symbol = str(request['symbol']).upper()
+            except (ValueError, TypeError, KeyError):
+                continue
+
+            if request.get('type') == 'subscribe' and len(subscription.symbols) < MAX_SYMBOLS:
+                await subscription.subscribe(symbol)
+            elif request.get('type') == 'unsubscribe':
+                await subscription.unsubscribe(symbol)
+    finally:
+        sender.cancel()
+        try:
+            await sender
+        except asyncio.CancelledError:
+            pass
+        except Exception:
+            logger.exception("Could not send trades to the browser")
+        await subscription.close()
@@ -0,0 +1,31 @@
+# Generated by Django 4.1.2 on 2026-10-18 16:00
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('finnhub_integration', '0008_symbol_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='WatchlistSymbol',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('watchlist_added', models.DateTimeField(auto_now_add=True)),
+                ('watchlist_symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finnhub_integration.finnhubsupportedstocksymbols')),
+                ('watchlist_user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='watchlist', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='watchlistsymbol',
+            constraint=models.UniqueConstraint(fields=('watchlist_user', 'watchlist_symbol'), name='unique_user_watchlist_symbol'),
+        ),
+    ]
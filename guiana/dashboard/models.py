@@ -1,3 +1,17 @@
+from django.conf import settings
 from django.db import models
 
-# Create your models here.
+from finnhub_integration.models import FinnhubSupportedStockSymbols
+
+
+class WatchlistSymbol(models.Model):
+    watchlist_user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='watchlist')
+    watchlist_symbol = models.ForeignKey(FinnhubSupportedStockSymbols, on_delete=models.CASCADE)
+
+    # When the symbol was added to the watchlist, which lists symbols in that order
+    watchlist_added = models.DateTimeField(auto_now_add=True, blank=False, null=False, unique=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['watchlist_user', 'watchlist_symbol'], name='unique_user_watchlist_symbol'),
+        ]
@@ -5,4 +5,23 @@ register = Library()
 
 @register.filter(name='get_item')
 def get_item(dictionary, key):
-    return dictionary.get(key)
\ No newline at end of file
+    return dictionary.get(key)
+
+
+@register.filter(name='sparkline_points')
+def sparkline_points(closes, size='100x30'):
+    """
+    Scale closes to the points of an SVG polyline of the given 'widthxheight' size, higher closes drawn higher.
+
+    @return: The polyline's points attribute, e.g. "0.0,30.0 50.0,0.0 100.0,15.0".
+    """
+
+    if not closes or len(closes) < 2:
+        return ""
+    width, height = (float(x) for x in size.split('x'))
+    low, high = min(closes), max(closes)
+    spread = (high - low) or 1
+    step = width / (len(closes) - 1)
+    return " ".join(
+        "{:.1f},{:.1f}".format(i * step, height - (close - low) / spread * height) for i, close in enumerate(closes)
+    )
@@ -0,0 +1,76 @@
+import asyncio
+from unittest import mock
+
+from asgiref.testing import ApplicationCommunicator
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.bar_aggregator import BarAggregator
+from finnhub_integration.trade_stream import LocalTradeFeed, TradeHub
+from guiana.asgi import application
+
+CustomUser = get_user_model()
+
+
+class TradesConsumerTestClass(TestCase):
+    def setUp(self):
+        user = CustomUser.objects.create_user(username="testuser", password="password", email="testuser@example.com")
+        user.finnhub_api_key = "key"
+        user.save()
+        self.client.login(username="testuser", password="password")
+        self.cookie = "%s=%s" % (settings.SESSION_COOKIE_NAME, self.client.cookies[settings.SESSION_COOKIE_NAME].value)
+
+        self.feeds = []
+        self.hub = TradeHub(feed_factory=self.make_feed, throttle=0.01, aggregator=BarAggregator())
+        for patcher in (mock.patch('dashboard.consumers.get_trade_hub', return_value=self.hub),
+                        mock.patch.object(async_registry, 'check_key_valid', return_value=True)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def make_feed(self, api_key):
+        self.feeds.append(LocalTradeFeed(api_key))
+        return self.feeds[-1]
+
+    def connect(self, headers):
+        scope = {'type': 'websocket', 'path': '/ws/trades/', 'headers': headers}
+        return ApplicationCommunicator(application, scope)
+
+    async def test_trades_are_streamed(self):
+        communicator = self.connect([(b'host', b'testserver'), (b'origin', b'http://testserver'),
+                                     (b'cookie', self.cookie.encode())])
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEquals(await communicator.receive_output(1), {'type': 'websocket.accept'})
+
+        await communicator.send_input({'type': 'websocket.receive', 'text': '{"type": "subscribe", "symbol": "aapl"}'})
+        while not self.feeds or "AAPL" not in self.feeds[0].symbols:
+            await asyncio.sleep(0.01)
+        self.feeds[0].publish("AAPL", 150.0, 10, 1000)
+
+        message = await communicator.receive_output(1)
+        self.assertEquals(message['type'], 'websocket.send')
+        self.assertIn('"p": 150.0', message['text'])
+
+        await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+        await communicator.wait(1)
+        self.assertEquals(self.hub.upstream_count(), 0)
+
+    async def test_sender_errors_are_logged(self):
+        communicator = self.connect([(b'host', b'testserver'), (b'cookie', self.cookie.encode())])
+        with mock.patch('finnhub_integration.trade_stream.TradeSubscription.get', side_effect=ValueError("broken")), \
+                self.assertLogs('dashboard.consumers', 'ERROR'):
+            await communicator.send_input({'type': 'websocket.connect'})
+            self.assertEquals(await communicator.receive_output(1), {'type': 'websocket.accept'})
+            await communicator.send_input({'type': 'websocket.disconnect', 'code': 1000})
+            await communicator.wait(1)
+
+    async def test_anonymous_user_is_refused(self):
+        communicator = self.connect([(b'host', b'testserver')])
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEquals(await communicator.receive_output(1), {'type': 'websocket.close', 'code': 4003})
+
+    async def test_cross_site_connection_is_refused(self):
+        communicator = self.connect([(b'host', b'testserver'), (b'origin', b'https://example.com'),
+                                     (b'cookie', self.cookie.encode())])
+        await communicator.send_input({'type': 'websocket.connect'})
+        self.assertEquals(await communicator.receive_output(1), {'type': 'websocket.close', 'code': 4003})
@@ -0,0 +1,303 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from finnhub.exceptions import FinnhubRequestException
+from dashboard.models import WatchlistSymbol
+from finnhub_integration import candle_store, symbol_index
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.client_registry import registry
+from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+CustomUser = get_user_model()
+
+DAY = 24 * 60 * 60
+
+
+class FinnhubViewTestCase(TestCase):
+    """
+    Logs in a user whose API key is considered valid, without reaching out to finnhub.io.
+    """
+
+    def setUp(self):
+        user = CustomUser.objects.create_user(username="testuser", password="password", email="testuser@example.com")
+        user.finnhub_api_key = "key"
+        user.save()
+        self.client.login(username="testuser", password="password")
+
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="AAPL", symbol_name="AAPL",
+            symbol_description="APPLE INC", symbol_type="Common Stock",
+        )
+        symbol_index.invalidate()
+
+        patcher = mock.patch.object(registry, 'check_key_valid', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+
+class DashboardViewTestClass(FinnhubViewTestCase):
+    def setUp(self):
+        super().setUp()
+        patcher = mock.patch.object(async_registry, 'check_key_valid', return_value=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch.object(FinnhubClient, 'aget_latest_news', return_value=[{'headline': "Markets rally", 'url': "",
+                                                                         'image': ""}])
+    def test_dashboard_shows_latest_news(self, aget_latest_news):
+        response = self.client.get(reverse('dashboard'))
+        self.assertContains(response, "Markets rally")
+
+    @mock.patch.object(FinnhubClient, 'aget_latest_news', return_value=[])
+    @mock.patch.object(FinnhubClient, 'aget_quote', return_value={'c': 151.25, 'dp': 1.5})
+    def test_dashboard_shows_watchlist(self, aget_quote, aget_latest_news):
+        WatchlistSymbol.objects.create(watchlist_user=CustomUser.objects.get(username="testuser"),
+                                       watchlist_symbol=self.symbol)
+        response = self.client.get(reverse('dashboard'))
+        self.assertEquals([item['symbol'] for item in response.context['watchlist']], [self.symbol])
+        self.assertContains(response, "151.25")
+        self.assertContains(response, "1.50%")
+        aget_quote.assert_called_once_with("AAPL")
+
+    @mock.patch.object(FinnhubClient, 'aget_latest_news', return_value=[])
+    @mock.patch.object(FinnhubClient, 'aget_quote', return_value={'c': 151.25})
+    @mock.patch.object(FinnhubClient, 'update_symbol_candles')
+    def test_add_and_remove_watched_symbols(self, update_symbol_candles, aget_quote, aget_latest_news):
+        response = self.client.post(reverse('dashboard'), {'watchlist_add': "aapl"})
+        self.assertEquals(response.context['message'], "AAPL added to your watchlist.")
+        self.assertEquals(len(response.context['watchlist']), 1)
+        update_symbol_candles.assert_called_once_with("AAPL")
+
+        response = self.client.post(reverse('dashboard'), {'watchlist_remove': "AAPL"})
+        self.assertEquals(response.context['watchlist'], [])
+
+    @mock.patch.object(FinnhubClient, 'asearch_symbol', side_effect=lambda symbol, context: context)
+    def test_search_results(self, asearch_symbol):
+        response = self.client.get(reverse('search_results'), {'search_symbol': "aapl"})
+        self.assertEquals(response.context['symbol'], "AAPL")
+        asearch_symbol.assert_called_once()
+
+    @mock.patch.object(FinnhubClient, 'asearch_symbol', side_effect=lambda symbol, context: context)
+    def test_search_by_company_name(self, asearch_symbol):
+        response = self.client.get(reverse('search_results'), {'search_symbol': "apple inc"})
+        self.assertEquals(response.context['symbol'], "AAPL")
+
+    @mock.patch.object(FinnhubClient, 'asearch_symbol', side_effect=lambda symbol, context: context)
+    def test_inexact_search_is_offered_suggestions(self, asearch_symbol):
+        for query in ("apple", "AAPK"):
+            response = self.client.get(reverse('search_results'), {'search_symbol': query})
+            self.assertEquals(response.context['symbol'], query.upper())
+            self.assertEquals(response.context['suggestions'],
+                              [{'symbol': "AAPL", 'description': "APPLE INC", 'exchange': "US"}])
+            self.assertContains(response, "?search_symbol=AAPL")
+        asearch_symbol.assert_not_called()
+
+    @mock.patch.object(FinnhubClient, 'asearch_symbol', side_effect=lambda symbol, context: context)
+    def test_search_without_suggestions(self, asearch_symbol):
+        response = self.client.get(reverse('search_results'), {'search_symbol': "zzzz"})
+        self.assertEquals(response.context['symbol'], "ZZZZ")
+        asearch_symbol.assert_called_once()
+
+    def test_invalid_key(self):
+        with mock.patch.object(async_registry, 'check_key_valid', return_value=False):
+            response = self.client.get(reverse('search_results'), {'search_symbol': "aapl"})
+        self.assertEquals(response.context['message'],
+                          "Your API is invalid. Please update it or register for a new one at finnhub.io.")
+
+
+@mock.patch.object(FinnhubClient, 'update_symbol_candles')
+class CandlesticksViewTestClass(FinnhubViewTestCase):
+    def setUp(self):
+        super().setUp()
+        candle_store.store_candles(self.symbol, 'D', {
+            't': [DAY * 10, DAY * 11],
+            'o': [1.5, 2.5],
+            'h': [2.0, 3.0],
+            'l': [1.0, 2.0],
+            'c': [1.75, 2.25],
+            'v': [100, 200],
+        })
+
+    def test_candles_are_columnar(self, update_symbol_candles):
+        response = self.client.get(reverse('candlesticks', args=["aapl"]))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json(), {
+            'symbol': "AAPL",
+            'resolution': 'D',
+            'day': [10, 11],
+            'o': [1.5, 2.5],
+            'h': [2.0, 3.0],
+            'l': [1.0, 2.0],
+            'c': [1.75, 2.25],
+            'v': [100, 200],
+        })
+        update_symbol_candles.assert_called_once_with("AAPL")
+
+    def test_unchanged_candles_are_not_modified(self, update_symbol_candles):
+        etag = self.client.get(reverse('candlesticks', args=["AAPL"]))['ETag']
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 304)
+
+    def test_new_candles_change_etag(self, update_symbol_candles):
+        etag = self.client.get(reverse('candlesticks', args=["AAPL"]))['ETag']
+        candle_store.store_candles(self.symbol, 'D', {'t': [DAY * 11], 'o': [2.5], 'h': [3.5], 'l': [2.0], 'c': [3.25], 'v': [300]})
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), HTTP_IF_NONE_MATCH=etag)
+        self.assertEquals(response.status_code, 200)
+
+    def test_candles_are_gzipped(self, update_symbol_candles):
+        # Responses shorter than 200 bytes are not worth compressing.
+        days = range(12, 112)
+        candle_store.store_candles(self.symbol, 'D', {
+            't': [DAY * day for day in days], 'o': [1.5] * 100, 'h': [2.0] * 100, 'l': [1.0] * 100, 'c': [1.75] * 100,
+            'v': [100] * 100,
+        })
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEquals(response['Content-Encoding'], "gzip")
+
+    def test_window(self, update_symbol_candles):
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'start': 11, 'end': 11})
+        self.assertEquals(response.json()['day'], [11])
+
+    def test_downsampled_to_target_bars(self, update_symbol_candles):
+        # Days 10 and 11 of the UNIX epoch are a Sunday and a Monday.
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'bars': 1})
+        self.assertEquals(response.json()['resolution'], 'M')
+        self.assertEquals(response.json()['h'], [3.0])
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'resolution': 'W'})
+        self.assertEquals(response.json()['day'], [10, 11])
+
+    def test_intraday_candles(self, update_symbol_candles):
+        candle_store.store_candles(self.symbol, '5', {'t': [300], 'o': [1.0], 'h': [2.0], 'l': [0.5], 'c': [1.5],
+                                                      'v': [10]})
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'resolution': '5'})
+        self.assertEquals(response.json()['t'], [300])
+        self.assertEquals(response.json()['c'], [1.5])
+        update_symbol_candles.assert_not_called()
+
+    def test_indicators(self, update_symbol_candles):
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'indicators': "ema_20,sma_20"})
+        self.assertEquals(response.json()['indicators'], {'ema_20': [1.75, 1.7976], 'sma_20': [None, None]})
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]), {'indicators': "all", 'bars': 1})
+        # The monthly bar gets the indicators of its last day.
+        self.assertEquals(response.json()['indicators']['ema_20'], [1.7976])
+
+    def test_stored_candles_are_served_when_finnhub_fails(self, update_symbol_candles):
+        update_symbol_candles.side_effect = FinnhubRequestException("Timed out waiting for the finnhub.io rate limit")
+        response = self.client.get(reverse('candlesticks', args=["AAPL"]))
+        self.assertEquals(response.status_code, 200)
+        self.assertEquals(response.json()['day'], [10, 11])
+
+    def test_every_request_uses_its_own_client(self, update_symbol_candles):
+        clients = []
+        original = FinnhubClient.check_account_ready
+
+        def check_account_ready(client, request):
+            clients.append(client)
+            return original(client, request)
+
+        with mock.patch.object(FinnhubClient, 'check_account_ready', check_account_ready):
+            self.client.get(reverse('candlesticks', args=["AAPL"]))
+            self.client.get(reverse('candlesticks', args=["AAPL"]))
+        self.assertIsNot(clients[0], clients[1])
+
+    def test_invalid_parameters(self, update_symbol_candles):
+        for params in ({'start': "x"}, {'bars': 0}, {'resolution': "Y"}, {'indicators': "sma_20,macd"}):
+            response = self.client.get(reverse('candlesticks', args=["AAPL"]), params)
+            self.assertEquals(response.status_code, 400)
+
+    def test_unknown_symbol(self, update_symbol_candles):
+        response = self.client.get(reverse('candlesticks', args=["NOTASYMBOL"]))
+        self.assertEquals(response.status_code, 404)
+
+    def test_invalid_key(self, update_symbol_candles):
+        with mock.patch.object(registry, 'check_key_valid', return_value=False):
+            response = self.client.get(reverse('candlesticks', args=["AAPL"]))
+        self.assertEquals(response.status_code, 403)
+
+
+class SymbolAutocompleteViewTestClass(FinnhubViewTestCase):
+    def test_suggestions(self):
+        response = self.client.get(reverse('symbol_autocomplete'), {'q': "app"})
+        self.assertEquals(response.json(), {'results': [
+            {'symbol': "AAPL", 'description': "APPLE INC", 'type': "Common Stock", 'exchange': "US"},
+        ]})
+        self.assertIn("max-age", response['Cache-Control'])
+
+    def test_no_suggestions(self):
+        response = self.client.get(reverse('symbol_autocomplete'), {'q': ""})
+        self.assertEquals(response.json(), {'results': []})
+
+    def test_invalid_limit(self):
+        response = self.client.get(reverse('symbol_autocomplete'), {'q': "app", 'limit': 0})
+        self.assertEquals(response.status_code, 400)
+
+    def test_logged_out(self):
+        self.client.logout()
+        response = self.client.get(reverse('symbol_autocomplete'), {'q': "app"})
+        self.assertEquals(response.status_code, 403)
+
+
+class SymbolComparisonViewTestClass(FinnhubViewTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=self.symbol.symbol_exchange_code, symbol_display_sym="MSFT", symbol_name="MSFT"
+        )
+        FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=self.symbol.symbol_exchange_code, symbol_display_sym="IBM", symbol_name="IBM"
+        )
+        today = int(time.time()) // DAY
+        days = [today - 3, today - 2, today - 1]
+        for symbol_obj, closes in ((self.symbol, [100.0, 110.0, 99.0]), (self.other, [50.0, 45.0, 49.5])):
+            candle_store.store_candles(symbol_obj, 'D', {
+                't': [day * DAY for day in days], 'o': closes, 'h': closes, 'l': closes, 'c': closes,
+                'v': [100] * 3,
+            })
+
+    def test_comparison(self):
+        response = self.client.get(reverse('symbol_comparison'), {'symbols': "aapl,MSFT,IBM,NOTASYMBOL"})
+        self.assertEquals(response.status_code, 200)
+        payload = response.json()
+        self.assertEquals(payload['symbols'], ["AAPL", "MSFT"])
+        self.assertEquals(payload['missing'], ["IBM", "NOTASYMBOL"])
+        self.assertEquals(payload['total_return'], [-0.01, -0.01])
+        self.assertEquals(payload['mean_daily_return'], [0.0, 0.0])
+        self.assertEquals(payload['correlation'], [[1.0, -1.0], [-1.0, 1.0]])
+        self.assertEquals(payload['end_day'] - payload['start_day'], 2)
+
+    def test_lookback(self):
+        response = self.client.get(reverse('symbol_comparison'), {'symbols': "AAPL", 'days': 2})
+        self.assertEquals(response.json()['total_return'], [-0.1])
+
+    def test_invalid_parameters(self):
+        for params in ({'symbols': ""}, {'symbols': "AAPL", 'days': "x"}, {'symbols': "AAPL", 'days': 0}):
+            response = self.client.get(reverse('symbol_comparison'), params)
+            self.assertEquals(response.status_code, 400)
+
+    def test_logged_out(self):
+        self.client.logout()
+        response = self.client.get(reverse('symbol_comparison'), {'symbols': "AAPL"})
+        self.assertEquals(response.status_code, 403)
+
+
+class MetricsViewTestClass(FinnhubViewTestCase):
+    def test_staff_metrics(self):
+        CustomUser.objects.filter(username="testuser").update(staff=True)
+        response = self.client.get(reverse('metrics'))
+        self.assertEquals(set(response.json()), {'timers', 'cache', 'rate_limits'})
+        self.assertIn('Server-Timing', response)
+
+    def test_metrics_are_staff_only(self):
+        # Requests from the server itself, e.g. through a local reverse proxy, aren't trusted either.
+        for remote_addr in ("127.0.0.1", "203.0.113.1"):
+            response = self.client.get(reverse('metrics'), REMOTE_ADDR=remote_addr)
+            self.assertEquals(response.status_code, 403)
+
+        self.client.logout()
+        response = self.client.get(reverse('metrics'))
+        self.assertEquals(response.status_code, 403)
@@ -0,0 +1,67 @@
+import time
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.test import SimpleTestCase, TestCase
+from dashboard import watchlist
+from dashboard.templatetags.dashboard_filters import sparkline_points
+from finnhub_integration import candle_store
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+CustomUser = get_user_model()
+
+
+class WatchlistTestClass(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(username="testuser", password="password",
+                                                   email="testuser@example.com")
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        self.symbols = [
+            FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=exchange, symbol_display_sym=name,
+                                                        symbol_name=name)
+            for name in ("AAPL", "MSFT")
+        ]
+
+    def test_add_and_remove_symbols(self):
+        self.assertEquals(watchlist.add_symbol(self.user, "msft"), (self.symbols[1], "MSFT added to your watchlist."))
+        watchlist.add_symbol(self.user, "AAPL")
+        self.assertEquals(watchlist.get_symbols(self.user), [self.symbols[1], self.symbols[0]])
+
+        watchlist.remove_symbol(self.user, "msft")
+        self.assertEquals(watchlist.get_symbols(self.user), [self.symbols[0]])
+
+    def test_watched_symbols_come_with_their_exchange(self):
+        watchlist.add_symbol(self.user, "AAPL")
+        with self.assertNumQueries(1):
+            self.assertEquals(watchlist.get_symbols(self.user)[0].symbol_exchange_code.exchange_code, "US")
+
+    def test_symbols_that_are_not_added(self):
+        watchlist.add_symbol(self.user, "AAPL")
+        self.assertEquals(watchlist.add_symbol(self.user, "AAPL"), (None, "AAPL is already on your watchlist."))
+        self.assertEquals(watchlist.add_symbol(self.user, "nope"), (None, "NOPE is not a listed symbol."))
+
+        FinnhubSupportedStockSymbols.objects.filter(symbol_name="MSFT").update(symbol_delisted=True)
+        self.assertIsNone(watchlist.add_symbol(self.user, "MSFT")[0])
+
+    @mock.patch.object(watchlist, 'MAX_SYMBOLS', 1)
+    def test_watchlist_size_is_limited(self):
+        watchlist.add_symbol(self.user, "AAPL")
+        self.assertEquals(watchlist.add_symbol(self.user, "MSFT"), (None, "You can watch at most 1 symbols."))
+
+    def test_sparklines(self):
+        now = int(time.time())
+        candle_store.store_candles(self.symbols[0], 'D', {
+            't': [now - 40 * candle_store.SECONDS_PER_DAY, now - 2 * candle_store.SECONDS_PER_DAY, now],
+            'o': [1.0, 2.0, 3.0], 'h': [1.0, 2.0, 3.0], 'l': [1.0, 2.0, 3.0], 'c': [1.0, 2.0, 3.0], 'v': [1, 1, 1],
+        })
+        self.assertEquals(watchlist.load_sparklines(self.symbols), {"AAPL": [2.0, 3.0], "MSFT": []})
+
+
+class SparklinePointsTestClass(SimpleTestCase):
+    def test_points(self):
+        self.assertEquals(sparkline_points([1.0, 3.0, 2.0], "100x30"), "0.0,30.0 50.0,0.0 100.0,15.0")
+
+    def test_flat_or_short_series(self):
+        self.assertEquals(sparkline_points([2.0, 2.0], "10x10"), "0.0,10.0 10.0,10.0")
+        self.assertEquals(sparkline_points([2.0]), "")
+        self.assertEquals(sparkline_points([]), "")
@@ -1,64 +1,311 @@
-from django.shortcuts import render
+import asyncio
+import logging
+import time
+import numpy as np
+import requests
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404, render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.decorators import method_decorator
+from django.views.decorators.gzip import gzip_page
 from django.views.generic.base import View
+from finnhub.exceptions import FinnhubAPIException, FinnhubRequestException
 from accounts.forms import UserAddFinnhubKeyForm
+from dashboard import watchlist
+from finnhub_integration import analytics, bar_aggregator, candle_store, downsampling, indicators, symbol_index
+from finnhub_integration.client_registry import registry
 from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.metrics import metrics
 from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
 
-import requests
 
+logger = logging.getLogger(__name__)
 
-class FinnhubMixin:
-    f = FinnhubClient()
-    
-    
-class DashboardView(FinnhubMixin, View):
-    template_name = "dashboard/dashboard.html"
 
-    def get(self, request):
-        context = {}
-        self.f.api_key = self.request.user.finnhub_api_key
-        self.f.initialize_client()
+class DashboardView(View):
+    """
+    Async, so that waiting on finnhub.io doesn't hold a worker thread when served over ASGI.
+    """
 
-        if self.f.check_account_ready(request):
-            context = {
-                'latest_news': self.f.get_latest_news()
-            }
-        return render(request, self.template_name, context=context)
-    
-    def post(self, request):
-        if self.f.check_account_ready(request):
-            context = {
-                'latest_news': self.f.get_latest_news()
-            }
+    template_name = "dashboard/dashboard.html"
+
+    async def get(self, request, message=None):
+        # A client per request, since the requests of different users interleave on the event loop.
+        f = FinnhubClient()
+        context = {"message": message}
+        if await f.acheck_account_ready(request):
+            symbol_objs = await sync_to_async(watchlist.get_symbols)(request.user)
+            # The watchlist's quotes are fetched along with the news, rather than one symbol after the other.
+            latest_news, (quotes, _) = await asyncio.gather(f.aget_latest_news(), f.aget_quotes(symbol_objs))
+            sparklines = await sync_to_async(watchlist.load_sparklines)(symbol_objs)
+            context.update({
+                'latest_news': latest_news,
+                'watchlist': [
+                    {
+                        'symbol': symbol_obj,
+                        'quote': quotes.get(symbol_obj.symbol_name),
+                        'sparkline': sparklines[symbol_obj.symbol_name],
+                    }
+                    for symbol_obj in symbol_objs
+                ],
+            })
         return render(request, self.template_name, context=context)
 
+    async def post(self, request):
+        f = FinnhubClient()
+        message = None
+        if await f.acheck_account_ready(request):
+            message = await sync_to_async(self._update_watchlist)(request, f)
+        return await self.get(request, message)
+
+    @staticmethod
+    def _update_watchlist(request, f: FinnhubClient):
+        if request.POST.get('watchlist_remove'):
+            return watchlist.remove_symbol(request.user, request.POST['watchlist_remove'])
+        if not request.POST.get('watchlist_add'):
+            return None
+
+        symbol_obj, message = watchlist.add_symbol(request.user, request.POST['watchlist_add'])
+        if symbol_obj is not None:
+            # Sparklines are drawn from the candle store, which only has the candles of the symbols viewed before.
+            try:
+                f.update_symbol_candles(symbol_obj.symbol_name)
+            except Exception as e:
+                logger.warning("Could not fetch the candles of %s: %r", symbol_obj.symbol_name, e)
+        return message
+
+
+class SearchResultsView(View):
+    """
+    Async, so that waiting on finnhub.io doesn't hold a worker thread when served over ASGI.
+    """
 
-class SearchResultsView(FinnhubMixin, View):
     template_name = "dashboard/search_results.html"
 
-    def get(self, request):
-        self.f.api_key = self.request.user.finnhub_api_key
-        self.f.initialize_client()
+    # Number of symbols suggested when a search isn't exactly a ticker or company name.
+    SUGGESTIONS = 10
 
-        if self.f.check_account_ready(request):
-            symbol = request.GET.get('search_symbol').upper()
-            context = {
-                "symbol": symbol,
-                "message": "Search successful!",
-                "api_key": request.user.finnhub_api_key,
-            }
-            context = self.f.search_symbol(symbol, context)
+    async def get(self, request):
+        f = FinnhubClient()
+        if await f.acheck_account_ready(request):
+            query = request.GET.get('search_symbol', '')
+            # Only exact tickers and company names are searched right away, anything else is offered suggestions.
+            symbol = await sync_to_async(symbol_index.resolve)(query)
+            suggestions = [] if symbol else await sync_to_async(symbol_index.suggest)(query, self.SUGGESTIONS)
+            if suggestions:
+                context = {
+                    "symbol": query.strip().upper(),
+                    "suggestions": [{"symbol": name, "description": description, "exchange": exchange}
+                                    for name, description, _, exchange in suggestions],
+                    "message": "No symbol exactly matches your search.",
+                }
+            else:
+                symbol = symbol or query.strip().upper()
+                context = {
+                    "symbol": symbol,
+                    "message": "Search successful!",
+                }
+                context = await f.asearch_symbol(symbol, context)
         else:
             context = {
                 "message": "Your API is invalid. Please update it or register for a new one at finnhub.io."
             }
         return render(request, self.template_name, context=context)
     
-    def post(self, request):
+    async def post(self, request):
         context = {}
         return render(request, self.template_name, context=context)
 
-    
+
+@method_decorator(gzip_page, name='dispatch')
+class CandlesticksView(View):
+    """
+    Serves a symbol's candles as compact columnar JSON, separately from the search results page so that the
+    browser can cache them. Unchanged series are answered with 304 Not Modified.
+
+    Optional query parameters:
+        - start, end: First and last day (since the UNIX epoch) of the window to serve, e.g. the zoomed-in one.
+        - resolution: 'D', 'W' or 'M' to serve daily, weekly or monthly bars, or '1' or '5' to serve the 1 or 5
+          minute bars aggregated from live trades.
+        - bars: Number of bars to serve at most when no resolution is given, picking the finest that fits.
+        - indicators: Comma separated technical indicators (see finnhub_integration/indicators.py) to serve along
+          with the candles, or 'all'. The indicators of weekly and monthly bars are those of their last day.
+    """
+
+    MAX_BARS = 5000
+
+    def get(self, request, symbol):
+        # A client per request, since a shared one would be given the key of whichever user came last.
+        f = FinnhubClient()
+        if not f.check_account_ready(request):
+            return JsonResponse({"message": "Your API is invalid."}, status=403)
+
+        try:
+            start = self._get_day(request, 'start')
+            end = self._get_day(request, 'end')
+            bars = int(request.GET.get('bars', downsampling.DEFAULT_TARGET_BARS))
+        except ValueError:
+            return JsonResponse({"message": "start, end and bars must be integers."}, status=400)
+        resolution = request.GET.get('resolution')
+        resolutions = (None,) + downsampling.RESOLUTIONS + tuple(bar_aggregator.INTRADAY_RESOLUTIONS)
+        if not 0 < bars <= self.MAX_BARS or resolution not in resolutions:
+            return JsonResponse({"message": "Invalid bars or resolution."}, status=400)
+        names = request.GET.get('indicators')
+        if names is not None:
+            names = indicators.INDICATORS if names == 'all' else tuple(names.split(','))
+            if not set(names) <= set(indicators.INDICATORS):
+                return JsonResponse({"message": "Unknown indicators."}, status=400)
+
+        symbol = symbol.upper()
+        symbol_obj = get_object_or_404(FinnhubSupportedStockSymbols, symbol_name=symbol)
+
+        if resolution in bar_aggregator.INTRADAY_RESOLUTIONS:
+            # Intraday bars change with every trade, so they are served without an ETag.
+            arrays = bar_aggregator.load_intraday_arrays(symbol_obj, resolution, start=start, end=end)
+            payload = {"symbol": symbol, "resolution": resolution, **candle_store.to_columnar(arrays, intraday=True)}
+            if names:
+                payload['indicators'] = indicators.to_payload(indicators.compute(arrays['c'])[0], names)
+            response = JsonResponse(payload)
+            patch_cache_control(response, private=True, max_age=10)
+            return response
+
+        try:
+            f.update_symbol_candles(symbol)
+        except (FinnhubAPIException, FinnhubRequestException, requests.RequestException) as e:
+            # The stored candles are served instead, lacking at most the bars since the last update.
+            logger.warning("Could not fetch the candles of %s: %r", symbol, e)
+
+        # Every window and resolution has its own URL, so the series' ETag can be shared by all of them.
+        etag = candle_store.get_etag(symbol_obj, 'D')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            arrays = candle_store.load_candle_arrays(symbol_obj, 'D', start=start, end=end)
+            if resolution is None:
+                arrays, resolution = downsampling.downsample_to(arrays, bars)
+            else:
+                arrays = downsampling.downsample(arrays, resolution)
+            payload = {"symbol": symbol, "resolution": resolution, **candle_store.to_columnar(arrays)}
+            if names:
+                # Computed over the whole daily series, so that the window's first values have their history.
+                values = indicators.at_bars(indicators.get_indicators(symbol_obj, 'D'), arrays['t'], end=end)
+                payload['indicators'] = indicators.to_payload(values, names)
+            response = JsonResponse(payload)
+            response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=60)
+        return response
+
+    @staticmethod
+    def _get_day(request, name):
+        """
+        @return: Timestamp of the first second of the 'start' day, or of the last second of the 'end' day, or None
+                 if the query parameter is missing.
+        """
+
+        day = request.GET.get(name)
+        if day is None:
+            return None
+        return int(day) * candle_store.SECONDS_PER_DAY + (candle_store.SECONDS_PER_DAY - 1 if name == 'end' else 0)
+
+
+class SymbolAutocompleteView(View):
+    """
+    Suggests symbols for the search box from the in-memory symbol index, without calling finnhub.io.
+
+    Query parameters:
+        - q: Ticker or words of the company name typed so far.
+        - limit: Number of suggestions to return at most, defaults to DEFAULT_LIMIT.
+    """
+
+    DEFAULT_LIMIT = 10
+    MAX_LIMIT = 50
+
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({"message": "You must be logged in."}, status=403)
+
+        try:
+            limit = int(request.GET.get('limit', self.DEFAULT_LIMIT))
+        except ValueError:
+            return JsonResponse({"message": "limit must be an integer."}, status=400)
+        if not 0 < limit <= self.MAX_LIMIT:
+            return JsonResponse({"message": "Invalid limit."}, status=400)
+
+        matches = symbol_index.get_index().search(request.GET.get('q', ''), limit=limit)
+        response = JsonResponse({"results": [
+            {"symbol": name, "description": description, "type": symbol_type, "exchange": exchange}
+            for name, description, symbol_type, exchange in matches
+        ]})
+        patch_cache_control(response, private=True, max_age=300)
+        return response
+
+
+@method_decorator(gzip_page, name='dispatch')
+class SymbolComparisonView(View):
+    """
+    Compares symbols over their daily closes in the local candle store, without calling finnhub.io: their total
+    return, mean daily return and annualised volatility, and the correlation matrix of their daily returns.
+    Symbols whose candles were never fetched are listed as missing.
+
+    Query parameters:
+        - symbols: Comma separated tickers.
+        - days: Number of days to look back, defaults to DEFAULT_DAYS.
+    """
+
+    DEFAULT_DAYS = 365
+    MAX_DAYS = 20 * 365
+    MAX_SYMBOLS = 500
+
+    def get(self, request):
+        if not request.user.is_authenticated:
+            return JsonResponse({"message": "You must be logged in."}, status=403)
+
+        try:
+            days = int(request.GET.get('days', self.DEFAULT_DAYS))
+        except ValueError:
+            return JsonResponse({"message": "days must be an integer."}, status=400)
+        names = list(dict.fromkeys(name.strip().upper() for name in request.GET.get('symbols', '').split(',')
+                                   if name.strip()))
+        if not 0 < days <= self.MAX_DAYS or not 0 < len(names) <= self.MAX_SYMBOLS:
+            return JsonResponse({"message": "Invalid days or symbols."}, status=400)
+
+        symbol_objs = {symbol_obj.symbol_name: symbol_obj
+                       for symbol_obj in FinnhubSupportedStockSymbols.objects.filter(symbol_name__in=names)}
+        found = [name for name in names if name in symbol_objs]
+        start = (int(time.time()) // candle_store.SECONDS_PER_DAY - days) * candle_store.SECONDS_PER_DAY
+        trading_days, statistics = analytics.compare_symbols([symbol_objs[name] for name in found], start=start)
+
+        # Symbols without a single close over the period have nothing to compare.
+        has_closes = ~np.isnan(statistics['total_return'])
+        compared = [name for name, present in zip(found, has_closes) if present]
+        response = JsonResponse({
+            "symbols": compared,
+            "missing": [name for name in names if name not in compared],
+            "start_day": int(trading_days[0]) if len(trading_days) else None,
+            "end_day": int(trading_days[-1]) if len(trading_days) else None,
+            **{key: analytics.to_json(statistics[key][has_closes])
+               for key in ('total_return', 'mean_daily_return', 'volatility')},
+            "correlation": analytics.to_json(statistics['correlation'][np.ix_(has_closes, has_closes)]),
+        })
+        patch_cache_control(response, private=True, max_age=60)
+        return response
+
+
+class MetricsView(View):
+    """
+    Serves the process' metrics (see finnhub_integration/metrics.py) and the state of its rate limiters as JSON.
+    Only staff are served.
+    """
+
+    def get(self, request):
+        if not request.user.is_staff:
+            return JsonResponse({"message": "Metrics are only served to staff."}, status=403)
+
+        response = JsonResponse({**metrics.snapshot(), 'rate_limits': registry.rate_limit_stats()})
+        patch_cache_control(response, no_store=True)
+        return response
+
+
 class UserSettingsView(View):
     template_name = "dashboard/settings.html"
 
@@ -76,7 +323,7 @@ class UserSettingsView(View):
 
         if add_key_form.is_valid():
             add_key_form.save()
-            print(request.user.finnhub_api_key)
+            logger.info("User %s updated their finnhub.io API key", request.user.pk)
             context['message'] = "API key updated!"
             context['add_api_key_form'] = add_key_form
             return render(request, self.template_name, context=context)
@@ -0,0 +1,70 @@
+"""
+Symbols watched by a user, shown with their last price and a sparkline of their recent closes on the dashboard.
+"""
+
+import time
+
+from dashboard.models import WatchlistSymbol
+from finnhub_integration import candle_store
+from finnhub_integration.models import FinnhubSupportedStockSymbols
+
+
+# Symbols a user may watch at once.
+MAX_SYMBOLS = 50
+
+# Days of daily closes drawn in a sparkline.
+SPARKLINE_DAYS = 30
+
+
+def get_symbols(user):
+    """
+    @return: The symbols watched by a user, with their exchanges, in the order they were added.
+    """
+
+    return [
+        item.watchlist_symbol for item in
+        WatchlistSymbol.objects.filter(watchlist_user=user).select_related(
+            'watchlist_symbol__symbol_exchange_code'
+        ).order_by('watchlist_added', 'id')
+    ]
+
+
+def add_symbol(user, symbol: str):
+    """
+    Add a listed symbol to a user's watchlist.
+
+    @return: A (symbol_obj, message) tuple, where symbol_obj is the added symbol, or None if it wasn't added.
+    """
+
+    symbol_obj = FinnhubSupportedStockSymbols.objects.filter(symbol_delisted=False).resolve(symbol.strip())
+    if symbol_obj is None:
+        return None, "{} is not a listed symbol.".format(symbol.strip().upper())
+    if WatchlistSymbol.objects.filter(watchlist_user=user).count() >= MAX_SYMBOLS:
+        return None, "You can watch at most {} symbols.".format(MAX_SYMBOLS)
+
+    _, created = WatchlistSymbol.objects.get_or_create(watchlist_user=user, watchlist_symbol=symbol_obj)
+    if not created:
+        return None, "{} is already on your watchlist.".format(symbol_obj.symbol_name)
+    return symbol_obj, "{} added to your watchlist.".format(symbol_obj.symbol_name)
+
+
+def remove_symbol(user, symbol: str):
+    """
+    Remove a symbol from a user's watchlist.
+
+    @return: A message for the user.
+    """
+
+    symbol = symbol.strip().upper()
+    WatchlistSymbol.objects.filter(watchlist_user=user, watchlist_symbol__symbol_name=symbol).delete()
+    return "{} removed from your watchlist.".format(symbol)
+
+
+def load_sparklines(symbol_objs: list):
+    """
+    @return: A dict of symbol_name to the list of its stored daily closes of the last SPARKLINE_DAYS days.
+    """
+
+    since = int(time.time()) - SPARKLINE_DAYS * candle_store.SECONDS_PER_DAY
+    closes = candle_store.load_recent_closes(symbol_objs, 'D', since)
+    return {symbol_obj.symbol_name: closes.get(symbol_obj.id, []) for symbol_obj in symbol_objs}
@@ -0,0 +1,101 @@
+"""
+Multi-symbol analytics over the candle store's daily closes: returns, volatility and correlations.
+
+The closes of every compared symbol are loaded in one query into a matrix of one row per day and one column per
+symbol (see candle_store.load_close_matrix), over which every statistic is computed at once. Symbols may have
+missing days, e.g. when they were listed later, so every statistic only uses the days it has closes for, and
+correlations use the days both symbols have returns for.
+"""
+
+import numpy as np
+
+from finnhub_integration import candle_store
+
+
+TRADING_DAYS = 252
+
+
+def daily_returns(closes: np.ndarray):
+    """
+    @param closes: Matrix of one row per day and one column per symbol, NaN where a symbol has no close.
+    @return: Matrix of the returns since the previous day, one row shorter, NaN where either close is missing.
+    """
+
+    return closes[1:] / closes[:-1] - 1
+
+
+def total_returns(closes: np.ndarray):
+    """
+    @return: The return of every column from its first to its last close, NaN if it has no close.
+    """
+
+    present = ~np.isnan(closes)
+    if not len(closes):
+        return np.full(closes.shape[1], np.nan)
+    columns = np.arange(closes.shape[1])
+    first = closes[present.argmax(axis=0), columns]
+    last = closes[len(closes) - 1 - present[::-1].argmax(axis=0), columns]
+    return np.where(present.any(axis=0), last / first - 1, np.nan)
+
+
+def correlation_matrix(returns: np.ndarray):
+    """
+    Pearson correlations of every pair of columns, over the rows where both are present. The sums over common
+    rows are matrix products of the zero-filled returns and of their presence mask.
+
+    @return: A symmetric matrix, NaN for pairs with fewer than 2 common rows or a constant column.
+    """
+
+    present = (~np.isnan(returns)).astype(np.float64)
+    x = np.nan_to_num(returns)
+    n = present.T @ present
+    sum_x = x.T @ present
+    sum_xx = (x * x).T @ present
+    sum_xy = x.T @ x
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        covariance = n * sum_xy - sum_x * sum_x.T
+        variance = n * sum_xx - sum_x ** 2
+        correlation = covariance / np.sqrt(variance * variance.T)
+    correlation[(n < 2) | ~np.isfinite(correlation)] = np.nan
+    return np.clip(correlation, -1, 1)
+
+
+def compare(closes: np.ndarray):
+    """
+    @param closes: Matrix of one row per day and one column per symbol, NaN where a symbol has no close.
+    @return: A dict of every column's 'total_return', 'mean_daily_return' and annualised 'volatility', and of the
+             'correlation' matrix of their daily returns.
+    """
+
+    returns = daily_returns(closes)
+    counts = (~np.isnan(returns)).sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(returns, axis=0) / counts
+        variance = np.nansum((returns - mean) ** 2, axis=0) / (counts - 1)
+    return {
+        'total_return': total_returns(closes),
+        'mean_daily_return': np.where(counts > 0, mean, np.nan),
+        'volatility': np.where(counts > 1, np.sqrt(variance) * np.sqrt(TRADING_DAYS), np.nan),
+        'correlation': correlation_matrix(returns),
+    }
+
+
+def compare_symbols(symbol_objs: list, start: int = None):
+    """
+    Compare the daily closes of symbols, stored from `start` on.
+
+    @return: A (days, statistics) tuple: the days (since the UNIX epoch) any symbol has a close on, and the
+             statistics of compare, in the order of symbol_objs.
+    """
+
+    days, closes = candle_store.load_close_matrix(symbol_objs, 'D', start=start)
+    return days, compare(closes)
+
+
+def to_json(values: np.ndarray, decimals: int = 4):
+    """
+    @return: Nested lists of the rounded values, with None where undefined.
+    """
+
+    return np.where(np.isnan(values), None, np.round(values, decimals)).tolist()
@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.conf import settings
 
 
 class FinnhubIntegrationConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'finnhub_integration'
+
+    def ready(self):
+        # Off by default, so that management commands and tests don't load the sentiment model.
+        if settings.FINNHUB_SENTIMENT_PRELOAD:
+            from finnhub_integration import sentiment
+            sentiment.preload()
@@ -0,0 +1,174 @@
+"""
+Async finnhub.io client for the ASGI views, built on httpx.
+
+While an AsyncFinnhubClient waits on finnhub.io, the event loop serves other requests, so a single ASGI worker
+can handle many concurrent searches without a thread per upstream call. Every API key gets one client per event
+loop, whose connections are reused by every request made with the key. The client shares its key's rate limiter
+with the key's pooled sync client (see client_registry.py), since both count towards the same quota.
+"""
+
+import asyncio
+import weakref
+import finnhub as fh
+import httpx
+from django.conf import settings
+from finnhub.exceptions import FinnhubAPIException, FinnhubRequestException
+
+from finnhub_integration.client_registry import PooledFinnhubClient, registry
+from finnhub_integration.key_validation import get_cached_key_validity, remember_key_validity
+from finnhub_integration.metrics import timed, upstream_name
+from finnhub_integration.rate_limit import ACQUIRE_TIMEOUTS, RateLimiter, backoff_delay, get_priority
+from finnhub_integration.transport import get_async_transport
+
+
+class AsyncFinnhubClient:
+    API_URL = fh.Client.API_URL
+    DEFAULT_TIMEOUT = fh.Client.DEFAULT_TIMEOUT
+
+    def __init__(self, api_key: str, rate_limiter: RateLimiter = None, transport: httpx.AsyncBaseTransport = None):
+        """
+        Construct an async client for an API key.
+
+        @param rate_limiter: Rate limiter shared with the other clients of the key, defaults to a new one.
+        @param transport: Optional httpx transport, e.g. httpx.MockTransport in tests.
+        """
+
+        self.api_key = api_key
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+        self._client = httpx.AsyncClient(
+            headers={"Accept": "application/json", "User-Agent": "finnhub/python"},
+            params={"token": api_key},
+            timeout=self.DEFAULT_TIMEOUT,
+            limits=httpx.Limits(max_connections=PooledFinnhubClient.POOL_SIZE,
+                                max_keepalive_connections=PooledFinnhubClient.POOL_SIZE),
+            transport=transport,
+        )
+
+    async def aclose(self):
+        await self._client.aclose()
+
+    async def _acquire_token(self):
+        priority = get_priority()
+        if not await self.rate_limiter.acquire_async(priority, ACQUIRE_TIMEOUTS[priority]):
+            raise FinnhubRequestException("Timed out waiting for the finnhub.io rate limit")
+
+    @staticmethod
+    def _handle_response(response: httpx.Response):
+        if not response.is_success:
+            raise FinnhubAPIException(response)
+
+        content_type = response.headers.get('Content-Type', '')
+        try:
+            if 'application/json' in content_type:
+                return response.json()
+            if 'text/csv' in content_type or 'text/plain' in content_type:
+                return response.text
+        except ValueError:
+            pass
+        raise FinnhubRequestException("Invalid Response: {}".format(response.text))
+
+    async def _get(self, path: str, params: dict = None):
+        retries = settings.FINNHUB_RATE_LIMIT['retries']
+        for attempt in range(retries + 1):
+            await self._acquire_token()
+            try:
+                with timed(upstream_name(path)):
+                    response = await self._client.get(self.API_URL + path, params=params)
+                    return self._handle_response(response)
+            except FinnhubAPIException as e:
+                # The key was revoked or has expired since it was last validated.
+                if e.status_code == 401:
+                    remember_key_validity(self.api_key, False)
+                if e.status_code == 429:
+                    self.rate_limiter.throttled += 1
+                if (e.status_code == 429 or e.status_code >= 500) and attempt < retries:
+                    self.rate_limiter.retries += 1
+                    await asyncio.sleep(backoff_delay(attempt))
+                    continue
+                raise
+
+    async def check_key_valid(self):
+        """
+        Sends a request to finnhub.io to validate the client's key.
+
+        @return: Returns True if the key is valid, False otherwise.
+        """
+
+        await self._acquire_token()
+        with timed(upstream_name("/")):
+            response = await self._client.get(self.API_URL + "/")
+        return response.status_code != 401
+
+    # The endpoints below mirror the signatures of finnhub.Client's.
+    async def company_profile2(self, **params):
+        return await self._get("/stock/profile2", params=params)
+
+    async def quote(self, symbol):
+        return await self._get("/quote", params={"symbol": symbol})
+
+    async def company_basic_financials(self, symbol, metric):
+        return await self._get("/stock/metric", params={"symbol": symbol, "metric": metric})
+
+    async def stock_candles(self, symbol, resolution, _from, to):
+        return await self._get("/stock/candle", params={"symbol": symbol, "resolution": resolution, "from": _from,
+                                                        "to": to})
+
+    async def company_news(self, symbol, _from, to):
+        return await self._get("/company-news", params={"symbol": symbol, "from": _from, "to": to})
+
+    async def general_news(self, category, min_id=0):
+        return await self._get("/news", params={"category": category, "minId": min_id})
+
+
+class AsyncFinnhubClientRegistry:
+    def __init__(self, transport: httpx.AsyncBaseTransport = None):
+        """
+        Construct an empty registry.
+
+        @param transport: Optional httpx transport given to every client, defaults to the FINNHUB_TRANSPORT one.
+        """
+
+        self.transport = transport
+        # httpx connections are bound to the event loop that opened them, hence a set of clients per loop.
+        self._clients = weakref.WeakKeyDictionary()
+
+    def get(self, api_key: str):
+        """
+        Return the async client of an API key on the running event loop, creating it on first use.
+        """
+
+        clients = self._clients.setdefault(asyncio.get_running_loop(), {})
+        client = clients.get(api_key)
+        if client is None:
+            transport = self.transport or get_async_transport(PooledFinnhubClient.POOL_SIZE)
+            client = clients[api_key] = AsyncFinnhubClient(api_key, transport=transport)
+        client.rate_limiter = registry.rate_limiter(api_key)
+        return client
+
+    async def check_key_valid(self, api_key: str):
+        """
+        Validate an API key, answering from the validation cache when possible.
+
+        @return: Returns True if the key is valid, False otherwise.
+        """
+
+        if not api_key:
+            return False
+
+        valid = get_cached_key_validity(api_key)
+        if valid is None:
+            valid = await self.get(api_key).check_key_valid()
+            remember_key_validity(api_key, valid)
+        return valid
+
+    async def aclose(self):
+        """
+        Close every client of the running event loop.
+        """
+
+        clients = self._clients.pop(asyncio.get_running_loop(), {})
+        for client in clients.values():
+            await client.aclose()
+
+
+async_registry = AsyncFinnhubClientRegistry()
@@ -0,0 +1,252 @@
+"""
+Aggregation of live trades into intraday OHLCV bars.
+
+Trades relayed by the trade hub (see trade_stream.py) are folded into rolling 1 and 5 minute bars per symbol,
+kept in fixed-size ring buffers. Bars that changed since the last flush are written to the candle store in
+batches, from where they serve intraday charts and the last price shown on the search page.
+"""
+
+import logging
+import threading
+import time
+import numpy as np
+from django.conf import settings
+
+from finnhub_integration import candle_store
+from finnhub_integration.models import FinnhubSupportedStockSymbols
+
+
+logger = logging.getLogger(__name__)
+
+# Bars kept in memory per resolution (in minutes), i.e. a day of them.
+INTRADAY_RESOLUTIONS = {'1': 24 * 60, '5': 24 * 12}
+
+# Columns of a bar in a ring buffer.
+T, O, H, L, C, V = range(6)
+
+
+class BarRing:
+    def __init__(self, capacity: int):
+        """
+        Construct an empty ring buffer of at most `capacity` bars, the oldest of which are overwritten first.
+        """
+
+        self.capacity = capacity
+        self._bars = np.zeros((capacity, 6), dtype=np.float64)
+        self._next = 0
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def find(self, timestamp: int):
+        """
+        @return: The bar starting at the given timestamp (a writable row), or None if it isn't kept.
+        """
+
+        for i in range(1, self._size + 1):
+            bar = self._bars[(self._next - i) % self.capacity]
+            if bar[T] == timestamp:
+                return bar
+            if bar[T] < timestamp:
+                return None
+        return None
+
+    def last(self):
+        return self._bars[(self._next - 1) % self.capacity] if self._size else None
+
+    def append(self, timestamp: int, price: float, volume: float):
+        self._bars[self._next] = (timestamp, price, price, price, price, volume)
+        self._next = (self._next + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def to_arrays(self):
+        """
+        @return: The kept bars, oldest first, in the shape of candle_store.load_candle_arrays.
+        """
+
+        bars = np.roll(self._bars, -self._next, axis=0)[self.capacity - self._size:]
+        arrays = {key: bars[:, column].copy() for key, column in zip('tohlcv', range(6))}
+        arrays['t'] = arrays['t'].astype(np.int64)
+        return arrays
+
+
+class BarAggregator:
+    def __init__(self, resolutions: dict = None):
+        """
+        @param resolutions: Mapping of resolution (in minutes) to the number of bars kept in memory, defaults to
+                            INTRADAY_RESOLUTIONS.
+        """
+
+        self.resolutions = INTRADAY_RESOLUTIONS if resolutions is None else resolutions
+        self._rings = {}
+        self._last_prices = {}
+        self._dirty = set()
+        self._symbol_objs = {}
+        self._lock = threading.Lock()
+
+    def add_trades(self, trades: list):
+        """
+        Fold finnhub.io-style trades ({'s', 'p', 'v', 't'} dicts, 't' in milliseconds) into the bars.
+        """
+
+        with self._lock:
+            for trade in trades:
+                self._add_trade(trade['s'], trade['p'], trade['v'], trade['t'] // 1000)
+
+    def _add_trade(self, symbol: str, price: float, volume: float, timestamp: int):
+        last = self._last_prices.get(symbol)
+        # Trades may arrive out of order, and only the newest one sets the close.
+        newest = last is None or timestamp >= last[1]
+        if newest:
+            self._last_prices[symbol] = (price, timestamp)
+
+        for resolution, capacity in self.resolutions.items():
+            period = int(resolution) * 60
+            start = timestamp - timestamp % period
+            ring = self._rings.get((symbol, resolution))
+            if ring is None:
+                ring = self._rings[(symbol, resolution)] = BarRing(capacity)
+
+            last_bar = ring.last()
+            if last_bar is None or start > last_bar[T]:
+                ring.append(start, price, volume)
+            else:
+                bar = ring.find(start)
+                if bar is None:
+                    # Too late for a bar that isn't kept anymore.
+                    continue
+                bar[H] = max(bar[H], price)
+                bar[L] = min(bar[L], price)
+                bar[V] += volume
+                if newest:
+                    bar[C] = price
+            self._dirty.add((symbol, resolution, start))
+
+    def last_price(self, symbol: str):
+        """
+        @return: The (price, timestamp) of the symbol's most recent trade, or None if none was seen.
+        """
+
+        with self._lock:
+            return self._last_prices.get(symbol)
+
+    def get_bars(self, symbol: str, resolution: str):
+        """
+        @return: The symbol's bars kept in memory, in the shape of candle_store.load_candle_arrays.
+        """
+
+        with self._lock:
+            ring = self._rings.get((symbol, resolution))
+            return (ring or BarRing(1)).to_arrays()
+
+    def drain(self):
+        """
+        @return: The bars that changed since the last drain, as Finnhub-style candles per (symbol, resolution).
+        """
+
+        batches = {}
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            for symbol, resolution, start in sorted(dirty):
+                bar = self._rings[(symbol, resolution)].find(start)
+                if bar is None:
+                    continue
+                candles = batches.setdefault((symbol, resolution), {key: [] for key in 'tohlcv'})
+                for key, value in zip('tohlcv', bar):
+                    candles[key].append(value)
+        return batches
+
+    def flush(self):
+        """
+        Write the bars that changed since the last flush to the candle store.
+
+        @return: The number of bars written.
+        """
+
+        written = 0
+        batches = self.drain()
+        try:
+            for (symbol, resolution), candles in list(batches.items()):
+                symbol_obj = self._get_symbol_obj(symbol)
+                if symbol_obj is not None:
+                    candles['t'] = [int(t) for t in candles['t']]
+                    written += candle_store.store_candles(symbol_obj, resolution, candles)
+                del batches[(symbol, resolution)]
+        except Exception:
+            # The bars that weren't written are written with the next flush.
+            with self._lock:
+                for (symbol, resolution), candles in batches.items():
+                    self._dirty.update((symbol, resolution, start) for start in candles['t'])
+            raise
+        return written
+
+    def _get_symbol_obj(self, symbol: str):
+        if symbol not in self._symbol_objs:
+            self._symbol_objs[symbol] = FinnhubSupportedStockSymbols.objects.filter(symbol_name=symbol).first()
+            if self._symbol_objs[symbol] is None:
+                logger.warning("Trades of unknown symbol %s are not stored", symbol)
+        return self._symbol_objs[symbol]
+
+
+bar_aggregator = BarAggregator()
+
+
+def load_intraday_arrays(symbol_obj: FinnhubSupportedStockSymbols, resolution: str, start: int = None,
+                         end: int = None):
+    """
+    Read a symbol's intraday bars, oldest first, from the candle store completed with the bars kept in memory
+    that are yet to be stored.
+
+    @return: A dict of parallel 't' (int64) and 'o', 'h', 'l', 'c' and 'v' (float64) arrays.
+    """
+
+    stored = candle_store.load_candle_arrays(symbol_obj, resolution, start=start, end=end)
+    live = bar_aggregator.get_bars(symbol_obj.symbol_name, resolution)
+    if not len(live['t']):
+        return stored
+
+    # Bars kept in memory are at least as recent as their stored copies.
+    keep_stored = stored['t'] < live['t'][0]
+    keep_live = np.ones(len(live['t']), dtype=bool)
+    if start is not None:
+        keep_live &= live['t'] >= start
+    if end is not None:
+        keep_live &= live['t'] <= end
+    return {key: np.concatenate([stored[key][keep_stored], live[key][keep_live]]) for key in stored}
+
+
+def get_live_price(symbol_obj: FinnhubSupportedStockSymbols):
+    """
+    @return: The symbol's last traded price if it traded in the last settings.FINNHUB_LIVE_PRICE_MAX_AGE seconds,
+             either from the trades aggregated in memory or from the stored 1 minute bars, otherwise None.
+    """
+
+    since = int(time.time()) - settings.FINNHUB_LIVE_PRICE_MAX_AGE
+    last_price = bar_aggregator.last_price(symbol_obj.symbol_name)
+    if last_price is not None and last_price[1] >= since:
+        return last_price[0]
+    return candle_store.get_recent_close(symbol_obj, '1', since)
+
+
+def get_live_prices(symbol_objs: list):
+    """
+    Batched get_live_price: the symbols missing from the trades aggregated in memory are read from the stored
+    1 minute bars in a single query.
+
+    @return: A dict of symbol_name to last traded price, for the symbols that traded recently.
+    """
+
+    since = int(time.time()) - settings.FINNHUB_LIVE_PRICE_MAX_AGE
+    prices, missing = {}, []
+    for symbol_obj in symbol_objs:
+        last_price = bar_aggregator.last_price(symbol_obj.symbol_name)
+        if last_price is not None and last_price[1] >= since:
+            prices[symbol_obj.symbol_name] = last_price[0]
+        else:
+            missing.append(symbol_obj)
+
+    if missing:
+        closes = candle_store.load_recent_closes(missing, '1', since)
+        prices.update({obj.symbol_name: closes[obj.id][-1] for obj in missing if obj.id in closes})
+    return prices
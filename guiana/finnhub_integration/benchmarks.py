@@ -0,0 +1,316 @@
+"""
+Benchmarks of the hot paths: symbol searches, symbol ingestion and news sentiment scoring.
+
+Every benchmark runs against a local finnhub.io stub (see stub.py) instead of the network, so runs only differ by
+the code and the machine they run on. Their results are gathered in a JSON report, which compare_reports diffs
+against a report of an earlier run, e.g. one made before a change.
+
+Run them with `python manage.py benchmark`, which sets up a throwaway test database first.
+"""
+
+import asyncio
+import contextlib
+import datetime
+import os
+import platform
+import time
+import django
+import numpy as np
+from asgiref.sync import async_to_sync, sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import AsyncClient, override_settings
+from django.urls import reverse
+
+from finnhub_integration import news_store, sentiment, symbol_index
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.client_registry import registry
+from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.metrics import metrics
+from finnhub_integration.models import (FinnhubCompanyNews, FinnhubNewsSentiment, FinnhubStockCandles,
+                                        FinnhubSupportedExchanges, FinnhubSupportedStockSymbols)
+from finnhub_integration.response_cache import response_cache
+from finnhub_integration.stub import FinnhubStub
+
+
+REPORT_VERSION = 1
+
+BENCHMARK_API_KEY = 'benchmark'
+
+SECTIONS = ('search', 'ingestion', 'sentiment')
+
+
+@contextlib.contextmanager
+def stubbed_finnhub(stub: FinnhubStub):
+    """
+    Serve the finnhub.io calls of the clients made within the block from a stub. finnhub.io's rate limit doesn't
+    apply to the stub, so it is lifted.
+    """
+
+    adapter, transport = registry.adapter, async_registry.transport
+    registry.clear()
+    registry.adapter, async_registry.transport = stub.requests_adapter(), stub.httpx_transport()
+    unlimited = {**settings.FINNHUB_RATE_LIMIT, 'calls': 10 ** 9, 'period': 1, 'burst': 10 ** 9}
+    try:
+        with override_settings(FINNHUB_RATE_LIMIT=unlimited):
+            yield
+    finally:
+        registry.clear()
+        registry.adapter, async_registry.transport = adapter, transport
+
+
+def reset_state():
+    """
+    Forget every cached response, stored candle and news, so that every run starts cold.
+    """
+
+    response_cache.clear()
+    cache.clear()
+    FinnhubCompanyNews.objects.all().delete()
+    FinnhubNewsSentiment.objects.all().delete()
+    FinnhubStockCandles.objects.all().delete()
+    FinnhubSupportedStockSymbols.objects.update(symbol_news_updated=None)
+    metrics.reset()
+
+
+def summarize_latencies(latencies: list, elapsed: float):
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'throughput_rps': round(len(latencies) / elapsed, 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'p50_ms': round(float(np.percentile(latencies, 50)), 2),
+        'p95_ms': round(float(np.percentile(latencies, 95)), 2),
+        'p99_ms': round(float(np.percentile(latencies, 99)), 2),
+        'max_ms': round(float(latencies.max()), 2),
+    }
+
+
+def summarize_timers():
+    """
+    @return: The calls and mean latency of every instrumented operation since the last reset, showing where the
+             time went.
+    """
+
+    return {
+        name: {'calls': timer['calls'], 'mean_ms': timer['latency']['mean_ms']}
+        for name, timer in metrics.snapshot()['timers'].items()
+    }
+
+
+def load_symbols(stub: FinnhubStub):
+    """
+    Store the stub's exchange and symbols.
+
+    @return: The stored exchange.
+    """
+
+    exchange, _ = FinnhubSupportedExchanges.objects.get_or_create(exchange_code=stub.exchange_code)
+    f = FinnhubClient()
+    f.api_key = BENCHMARK_API_KEY
+    f.initialize_client()
+    f.download_symbols(stub.exchange_code)
+    return exchange
+
+
+def get_benchmark_user():
+    user = get_user_model().objects.filter(username='benchmark').first()
+    if user is None:
+        user = get_user_model().objects.create_user(username='benchmark', password='benchmark',
+                                                    email='benchmark@example.com')
+    user.finnhub_api_key = BENCHMARK_API_KEY
+    user.save()
+    return user
+
+
+async def _run_searches(user, symbols: list, concurrency: int, requests: int):
+    client = AsyncClient()
+    await sync_to_async(client.force_login)(user)
+    url = reverse('search_results')
+    pending = iter(range(requests))
+    latencies, errors = [], 0
+
+    async def search():
+        nonlocal errors
+        # The workers share the iterator, so that `concurrency` searches are always in flight.
+        for i in pending:
+            start = time.perf_counter()
+            response = await client.get(url, {'search_symbol': symbols[i % len(symbols)]})
+            latencies.append(time.perf_counter() - start)
+            errors += response.status_code != 200 or bool(response.context and response.context.get('fetch_errors'))
+
+    start = time.perf_counter()
+    try:
+        await asyncio.gather(*(search() for _ in range(concurrency)))
+    finally:
+        await async_registry.aclose()
+    return latencies, time.perf_counter() - start, errors
+
+
+def benchmark_search(stub: FinnhubStub, concurrency_levels: tuple = (1, 4, 16), requests: int = 32):
+    """
+    Measure the latency of end-to-end SearchResultsView requests, issued by `concurrency` clients at once, each
+    searching for a different symbol with cold caches.
+
+    @return: The latency percentiles and throughput of every concurrency level.
+    """
+
+    load_symbols(stub)
+    user = get_benchmark_user()
+    symbols = [symbol['symbol'] for symbol in stub.symbols()]
+    # Loaded once per process, ahead of the first request.
+    sentiment.get_pipeline()
+
+    results = {}
+    for concurrency in concurrency_levels:
+        reset_state()
+        symbol_index.invalidate()
+        symbol_index.get_index()
+        latencies, elapsed, errors = async_to_sync(_run_searches)(user, symbols, concurrency, requests)
+        results[str(concurrency)] = {**summarize_latencies(latencies, elapsed), 'errors': errors,
+                                     'timers': summarize_timers()}
+    return results
+
+
+def benchmark_ingestion(stub: FinnhubStub):
+    """
+    Measure FinnhubClient.download_symbols syncing the stub's symbols into an empty table, then again without
+    changes, and then after a tenth of them changed.
+
+    @return: The rows processed per second of every pass.
+    """
+
+    FinnhubSupportedStockSymbols.objects.filter(symbol_exchange_code__exchange_code=stub.exchange_code).delete()
+    FinnhubSupportedExchanges.objects.get_or_create(exchange_code=stub.exchange_code)
+    f = FinnhubClient()
+    f.api_key = BENCHMARK_API_KEY
+    f.initialize_client()
+
+    results = {}
+    revision = stub.revision
+    for name in ('insert', 'unchanged', 'update'):
+        if name == 'update':
+            stub.revise()
+        metrics.reset()
+        start = time.perf_counter()
+        written = f.download_symbols(stub.exchange_code)
+        elapsed = time.perf_counter() - start
+        results[name] = {'rows': stub.symbol_count, 'written': written, 'seconds': round(elapsed, 4),
+                         'rows_per_second': round(stub.symbol_count / elapsed, 1), 'timers': summarize_timers()}
+    stub.revision = revision
+    return results
+
+
+def benchmark_sentiment(stub: FinnhubStub, articles: int = 500):
+    """
+    Measure scoring news summaries with the sentiment pipeline alone, and FinnhubClient.get_symbol_news fetching,
+    scoring and storing the news of symbols whose stored news are stale.
+
+    @return: The articles processed per second of both.
+    """
+
+    # The search benchmark has already loaded the shared pipeline.
+    sentiment.reset_pipeline()
+    start = time.perf_counter()
+    nlp = sentiment.get_pipeline()
+    load_seconds = time.perf_counter() - start
+
+    symbols = [symbol['symbol'] for symbol in stub.symbols()]
+    symbol_count = max(1, -(-articles // stub.news_per_symbol))
+    _from, to = news_store.news_date_range()
+    summaries = [
+        news['summary'] for symbol in symbols[:symbol_count]
+        for news in stub.respond('/company-news', {'symbol': symbol, 'from': _from, 'to': to})[1]
+    ][:articles]
+
+    start = time.perf_counter()
+    sentiment.score_texts(nlp, summaries)
+    elapsed = time.perf_counter() - start
+    results = {
+        'pipeline_load_seconds': round(load_seconds, 4),
+        'score_texts': {'articles': len(summaries), 'seconds': round(elapsed, 4),
+                        'articles_per_second': round(len(summaries) / elapsed, 1)},
+    }
+
+    load_symbols(stub)
+    reset_state()
+    f = FinnhubClient()
+    f.api_key = BENCHMARK_API_KEY
+    f.initialize_client()
+    start = time.perf_counter()
+    stored = sum(len(f.get_symbol_news(symbol)[0]) for symbol in symbols[:symbol_count])
+    elapsed = time.perf_counter() - start
+    results['get_symbol_news'] = {'symbols': symbol_count, 'articles': stored, 'seconds': round(elapsed, 4),
+                                  'articles_per_second': round(stored / elapsed, 1), 'timers': summarize_timers()}
+    return results
+
+
+def environment():
+    return {
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'sentiment_model': settings.FINNHUB_SENTIMENT_MODEL,
+    }
+
+
+def run_benchmarks(sections: tuple = SECTIONS, symbols: int = 1000, news: int = 20, latency: float = 0.05,
+                   concurrency_levels: tuple = (1, 4, 16), requests: int = 32, articles: int = 500):
+    """
+    Run benchmarks against a local finnhub.io stub.
+
+    @param sections: Benchmarks to run, among SECTIONS.
+    @param symbols: Number of symbols listed by the stub.
+    @param news: Number of articles of every company_news response.
+    @param latency: Seconds every stub response is delayed by, as finnhub.io's would be.
+    @return: The report, a JSON serialisable dict.
+    """
+
+    config = {'symbols': symbols, 'news': news, 'latency': latency, 'concurrency_levels': list(concurrency_levels),
+              'requests': requests, 'articles': articles}
+    report = {
+        'version': REPORT_VERSION,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(timespec='seconds'),
+        'environment': environment(),
+        'config': config,
+        'results': {},
+    }
+
+    stub = FinnhubStub(symbol_count=symbols, news_per_symbol=news, latency=latency)
+    with stubbed_finnhub(stub):
+        if 'search' in sections:
+            report['results']['search'] = benchmark_search(stub, concurrency_levels, requests)
+        if 'ingestion' in sections:
+            report['results']['ingestion'] = benchmark_ingestion(stub)
+        if 'sentiment' in sections:
+            report['results']['sentiment'] = benchmark_sentiment(stub, articles)
+    return report
+
+
+def _flatten(results: dict, prefix: str = ''):
+    flat = {}
+    for key, value in results.items():
+        if isinstance(value, dict):
+            flat.update(_flatten(value, prefix + key + '.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[prefix + key] = value
+    return flat
+
+
+def compare_reports(baseline: dict, report: dict):
+    """
+    Diff the results of two reports.
+
+    @return: A list of (metric, baseline value, new value, relative change) tuples for the metrics found in both
+             reports, the relative change being None when the baseline value is 0.
+    """
+
+    old, new = _flatten(baseline.get('results', {})), _flatten(report.get('results', {}))
+    return [
+        (name, old[name], new[name], (new[name] - old[name]) / old[name] if old[name] else None)
+        for name in sorted(old.keys() & new.keys())
+    ]
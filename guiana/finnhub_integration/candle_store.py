@@ -0,0 +1,208 @@
+"""
+Local OHLCV store for stock candles.
+
+Each symbol's history is kept in FinnhubStockCandles, so only the bars after the last stored one need to be
+fetched from finnhub.io. The rest of the series is served from the database, either as lists or as NumPy
+arrays for vectorised processing.
+"""
+
+import datetime
+import time
+import numpy as np
+from django.db.models import Count, Max
+
+from finnhub_integration.models import FinnhubStockCandles, FinnhubSupportedStockSymbols
+
+
+# Candles are stored from this date onwards when a symbol is fetched for the first time.
+EARLIEST_TIMESTAMP = int(datetime.datetime(2010, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+CANDLE_FIELDS = ('candle_timestamp', 'candle_open', 'candle_high', 'candle_low', 'candle_close', 'candle_volume')
+
+
+def get_last_timestamp(symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D'):
+    """
+    @return: Timestamp of the symbol's most recent stored bar, or None if nothing is stored yet.
+    """
+
+    return FinnhubStockCandles.objects.filter(
+        candle_symbol=symbol_obj, candle_resolution=resolution
+    ).aggregate(last=Max('candle_timestamp'))['last']
+
+
+def store_candles(symbol_obj: FinnhubSupportedStockSymbols, resolution: str, candles: dict):
+    """
+    Insert or update bars in the store.
+
+    @param candles: Finnhub-style candles, i.e. a dict of parallel 't', 'o', 'h', 'l', 'c' and 'v' lists.
+    @return: The number of bars written.
+    """
+
+    rows = [
+        FinnhubStockCandles(
+            candle_symbol=symbol_obj,
+            candle_resolution=resolution,
+            candle_timestamp=t,
+            candle_open=o,
+            candle_high=h,
+            candle_low=l,
+            candle_close=c,
+            candle_volume=v,
+        )
+        for t, o, h, l, c, v in zip(candles['t'], candles['o'], candles['h'], candles['l'], candles['c'], candles['v'])
+    ]
+    # Django 4.1 uses unique_fields as column names in the ON CONFLICT clause, hence 'candle_symbol_id'.
+    FinnhubStockCandles.objects.bulk_create(
+        rows,
+        update_conflicts=True,
+        unique_fields=['candle_symbol_id', 'candle_resolution', 'candle_timestamp'],
+        update_fields=list(CANDLE_FIELDS[1:]),
+    )
+    return len(rows)
+
+
+def update_candles(client, symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D'):
+    """
+    Fetch the bars that are newer than the symbol's last stored bar and add them to the store.
+    The last stored bar is fetched again, since it may have been stored before it closed.
+
+    @param client: An initialized finnhub.io client.
+    @return: The number of bars written.
+    """
+
+    last_timestamp = get_last_timestamp(symbol_obj, resolution)
+    start = EARLIEST_TIMESTAMP if last_timestamp is None else last_timestamp
+    candles = client.stock_candles(symbol_obj.symbol_name, resolution, int(start), int(time.time()))
+
+    # Finnhub responds with {'s': 'no_data'} when there are no bars in the requested range.
+    if candles.get('s') != 'ok':
+        return 0
+    return store_candles(symbol_obj, resolution, candles)
+
+
+def get_recent_close(symbol_obj: FinnhubSupportedStockSymbols, resolution: str, since: int):
+    """
+    @return: The close of the symbol's most recent stored bar if it started at `since` or later, otherwise None.
+    """
+
+    return FinnhubStockCandles.objects.filter(
+        candle_symbol=symbol_obj, candle_resolution=resolution, candle_timestamp__gte=since
+    ).order_by('-candle_timestamp').values_list('candle_close', flat=True).first()
+
+
+def load_recent_closes(symbol_objs: list, resolution: str, since: int):
+    """
+    Read the closes of several symbols' stored bars that started at `since` or later, in a single query.
+
+    @return: A dict of symbol id to the list of its closes, oldest first. Symbols without such bars are missing.
+    """
+
+    closes = {}
+    rows = FinnhubStockCandles.objects.filter(
+        candle_symbol__in=symbol_objs, candle_resolution=resolution, candle_timestamp__gte=since
+    ).order_by('candle_symbol', 'candle_timestamp').values_list('candle_symbol', 'candle_close')
+    for symbol_id, close in rows:
+        closes.setdefault(symbol_id, []).append(close)
+    return closes
+
+
+def load_close_matrix(symbol_objs: list, resolution: str = 'D', start: int = None):
+    """
+    Read the closes of several symbols' stored bars in a single query, aligned by day.
+
+    @param start: Optional timestamp of the first bar to include.
+    @return: A (days, closes) tuple: the days (since the UNIX epoch) any of the symbols has a bar on, ascending,
+             and a float64 matrix of one row per day and one column per symbol, in the order of symbol_objs,
+             NaN where a symbol has no bar.
+    """
+
+    queryset = FinnhubStockCandles.objects.filter(candle_symbol__in=symbol_objs, candle_resolution=resolution)
+    if start is not None:
+        queryset = queryset.filter(candle_timestamp__gte=start)
+    rows = np.array(list(queryset.values_list('candle_symbol', 'candle_timestamp', 'candle_close')),
+                    dtype=np.float64).reshape(-1, 3)
+
+    symbol_ids = np.array([symbol_obj.pk for symbol_obj in symbol_objs], dtype=np.int64)
+    order = np.argsort(symbol_ids)
+    columns = order[np.searchsorted(symbol_ids[order], rows[:, 0].astype(np.int64))]
+    days, day_rows = np.unique(rows[:, 1].astype(np.int64) // SECONDS_PER_DAY, return_inverse=True)
+
+    closes = np.full((len(days), len(symbol_objs)), np.nan)
+    closes[day_rows.reshape(-1), columns] = rows[:, 2]
+    return days, closes
+
+
+def load_candles(symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D', start: int = None, end: int = None):
+    """
+    Read a symbol's stored bars, oldest first.
+
+    @param start: Optional timestamp of the first bar to include.
+    @param end: Optional timestamp of the last bar to include.
+    @return: A dict of parallel 't', 'o', 'h', 'l', 'c' and 'v' lists.
+    """
+
+    queryset = FinnhubStockCandles.objects.filter(candle_symbol=symbol_obj, candle_resolution=resolution)
+    if start is not None:
+        queryset = queryset.filter(candle_timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(candle_timestamp__lte=end)
+
+    rows = list(queryset.order_by('candle_timestamp').values_list(*CANDLE_FIELDS))
+    columns = list(zip(*rows)) if rows else [()] * len(CANDLE_FIELDS)
+    return {key: list(column) for key, column in zip(('t', 'o', 'h', 'l', 'c', 'v'), columns)}
+
+
+def load_candle_arrays(symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D', start: int = None,
+                       end: int = None):
+    """
+    Read a symbol's stored bars, oldest first, as NumPy arrays.
+
+    @return: A dict of parallel 't' (int64) and 'o', 'h', 'l', 'c' and 'v' (float64) arrays.
+    """
+
+    queryset = FinnhubStockCandles.objects.filter(candle_symbol=symbol_obj, candle_resolution=resolution)
+    if start is not None:
+        queryset = queryset.filter(candle_timestamp__gte=start)
+    if end is not None:
+        queryset = queryset.filter(candle_timestamp__lte=end)
+
+    rows = np.array(list(queryset.order_by('candle_timestamp').values_list(*CANDLE_FIELDS)), dtype=np.float64)
+    rows = rows.reshape(-1, len(CANDLE_FIELDS))
+    arrays = {key: rows[:, i] for i, key in enumerate(('t', 'o', 'h', 'l', 'c', 'v'))}
+    arrays['t'] = arrays['t'].astype(np.int64)
+    return arrays
+
+
+def to_columnar(arrays: dict, decimals: int = 4, intraday: bool = False):
+    """
+    Convert candle arrays into a compact, JSON serialisable columnar payload.
+
+    @param intraday: Whether bars are timestamped in seconds ('t') rather than in days ('day').
+    @return: A dict of parallel lists: 'day' (days since the UNIX epoch of each bar) or 't' (UNIX timestamp of
+             each bar), and 'o', 'h', 'l', 'c', 'v' rounded to the given number of decimals.
+    """
+
+    if intraday:
+        payload = {'t': arrays['t'].tolist()}
+    else:
+        payload = {'day': (arrays['t'] // SECONDS_PER_DAY).tolist()}
+    for key in ('o', 'h', 'l', 'c'):
+        payload[key] = np.round(arrays[key], decimals).tolist()
+    payload['v'] = arrays['v'].astype(np.int64).tolist()
+    return payload
+
+
+def get_etag(symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D'):
+    """
+    @return: An ETag that changes whenever bars are added to or updated in a symbol's series.
+    """
+
+    summary = FinnhubStockCandles.objects.filter(candle_symbol=symbol_obj, candle_resolution=resolution).aggregate(
+        last=Max('candle_timestamp'), count=Count('id')
+    )
+    last_close = FinnhubStockCandles.objects.filter(
+        candle_symbol=symbol_obj, candle_resolution=resolution, candle_timestamp=summary['last']
+    ).values_list('candle_close', flat=True).first()
+    return '"%s-%s-%s-%s-%s"' % (symbol_obj.symbol_name, resolution, summary['count'], summary['last'], last_close)
@@ -0,0 +1,205 @@
+"""
+Process-wide registry of pooled finnhub.io clients, keyed by API key.
+
+Every client keeps its own keep-alive HTTP session, so repeated requests made with the same key
+reuse open connections instead of paying for a new TLS handshake per upstream call. Every key
+also has its own rate limiter, since finnhub.io enforces its quotas per key. The rate limiters
+outlive the clients evicted as idle, so that a key doesn't get a full bucket again just by idling.
+"""
+
+import threading
+import time
+import weakref
+import finnhub as fh
+from django.conf import settings
+from finnhub.exceptions import FinnhubAPIException, FinnhubRequestException
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+from finnhub_integration.key_validation import get_cached_key_validity, remember_key_validity
+from finnhub_integration.metrics import timed, upstream_name
+from finnhub_integration.rate_limit import ACQUIRE_TIMEOUTS, RateLimiter, backoff_delay, get_priority
+from finnhub_integration.transport import get_adapter
+
+
+class PooledFinnhubClient(fh.Client):
+    # Number of keep-alive connections kept open to finnhub.io per API key. This should be at
+    # least the number of calls a single symbol search fans out concurrently.
+    POOL_SIZE = 16
+
+    @staticmethod
+    def _init_session(api_key, proxies):
+        session = fh.Client._init_session(api_key, proxies)
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=PooledFinnhubClient.POOL_SIZE)
+        session.mount('https://', adapter)
+        return session
+
+    def __init__(self, api_key, proxies=None, adapter: BaseAdapter = None, rate_limiter: RateLimiter = None):
+        """
+        @param adapter: Optional requests adapter serving the calls instead of finnhub.io, e.g. a local stub.
+        @param rate_limiter: Rate limiter shared with the other clients of the key, defaults to a new one.
+        """
+
+        super().__init__(api_key, proxies)
+        if adapter is not None:
+            self._session.mount('https://', adapter)
+        self.rate_limiter = RateLimiter() if rate_limiter is None else rate_limiter
+
+    def _acquire_token(self):
+        priority = get_priority()
+        if not self.rate_limiter.acquire(priority, ACQUIRE_TIMEOUTS[priority]):
+            raise FinnhubRequestException("Timed out waiting for the finnhub.io rate limit")
+
+    def _request(self, method, path, **kwargs):
+        retries = settings.FINNHUB_RATE_LIMIT['retries']
+        for attempt in range(retries + 1):
+            self._acquire_token()
+            try:
+                with timed(upstream_name(path)):
+                    return super()._request(method, path, **kwargs)
+            except FinnhubAPIException as e:
+                # The key was revoked or has expired since it was last validated.
+                if e.status_code == 401:
+                    remember_key_validity(self.api_key, False)
+                if e.status_code == 429:
+                    self.rate_limiter.throttled += 1
+                if (e.status_code == 429 or e.status_code >= 500) and attempt < retries:
+                    self.rate_limiter.retries += 1
+                    time.sleep(backoff_delay(attempt))
+                    continue
+                raise
+
+    def check_key_valid(self):
+        """
+        Sends a request to finnhub.io over the pooled session to validate the client's key.
+
+        @return: Returns True if the key is valid, False otherwise.
+        """
+
+        self._acquire_token()
+        with timed(upstream_name("/")):
+            r = self._session.get(self.API_URL + "/", timeout=self.DEFAULT_TIMEOUT)
+        return r.status_code != 401
+
+
+def _close_session(session):
+    session.close()
+
+
+class FinnhubClientRegistry:
+    # Seconds a client may stay unused before it is evicted. Its connections are closed once nobody holds it.
+    IDLE_TIMEOUT = 300
+
+    def __init__(self, idle_timeout: float = None, adapter: BaseAdapter = None):
+        """
+        Construct an empty registry.
+
+        @param idle_timeout: Seconds before an unused client is evicted, defaults to IDLE_TIMEOUT.
+        @param adapter: Optional requests adapter given to every client, defaults to the FINNHUB_TRANSPORT one.
+        @return: returns nothing
+        """
+
+        self.idle_timeout = self.IDLE_TIMEOUT if idle_timeout is None else idle_timeout
+        self.adapter = adapter
+        self._clients = {}
+        # Evicted clients that are still held elsewhere, which are reused rather than opening a second session.
+        self._evicted = weakref.WeakValueDictionary()
+        self._rate_limiters = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._clients)
+
+    def get(self, api_key: str):
+        """
+        Return the pooled client for an API key, creating it on first use.
+
+        @param api_key: a registered API key from finnhub.io
+        @return: A PooledFinnhubClient shared by every caller using the same key.
+        """
+
+        now = time.monotonic()
+        with self._lock:
+            self._evict_idle(now)
+            entry = self._clients.get(api_key)
+            if entry is None:
+                client = self._evicted.pop(api_key, None)
+                if client is None:
+                    adapter = self.adapter or get_adapter(PooledFinnhubClient.POOL_SIZE)
+                    client = PooledFinnhubClient(api_key=api_key, adapter=adapter,
+                                                 rate_limiter=self._get_rate_limiter(api_key))
+                    weakref.finalize(client, _close_session, client._session)
+                entry = self._clients[api_key] = [client, now]
+            entry[1] = now
+            return entry[0]
+
+    def rate_limiter(self, api_key: str):
+        """
+        @return: The rate limiter of an API key, shared by all its clients, sync and async.
+        """
+
+        with self._lock:
+            return self._get_rate_limiter(api_key)
+
+    def _get_rate_limiter(self, api_key: str):
+        limiter = self._rate_limiters.get(api_key)
+        if limiter is None:
+            limiter = self._rate_limiters[api_key] = RateLimiter()
+        return limiter
+
+    def check_key_valid(self, api_key: str):
+        """
+        Validate an API key, answering from the validation cache when possible.
+
+        @param api_key: a registered API key from finnhub.io
+        @return: Returns True if the key is valid, False otherwise.
+        """
+
+        if not api_key:
+            return False
+
+        valid = get_cached_key_validity(api_key)
+        if valid is None:
+            valid = self.get(api_key).check_key_valid()
+            remember_key_validity(api_key, valid)
+        return valid
+
+    def rate_limit_stats(self):
+        """
+        @return: The rate limiter stats of every API key, keyed by a shortened form of the key.
+        """
+
+        with self._lock:
+            limiters = dict(self._rate_limiters)
+        return {api_key[:4] + '...': limiter.stats() for api_key, limiter in limiters.items()}
+
+    def discard(self, api_key: str):
+        """
+        Close and forget the client of an API key, e.g. after the key has been revoked. Its rate limiter is kept.
+        """
+
+        with self._lock:
+            entry = self._clients.pop(api_key, None)
+            client = entry[0] if entry is not None else self._evicted.pop(api_key, None)
+        if client is not None:
+            client.close()
+
+    def clear(self):
+        """
+        Close every pooled client, and forget the rate limiters.
+        """
+
+        with self._lock:
+            clients = [client for client, _ in self._clients.values()] + list(self._evicted.values())
+            self._clients, self._rate_limiters = {}, {}
+            self._evicted.clear()
+        for client in clients:
+            client.close()
+
+    def _evict_idle(self, now: float):
+        expired = [key for key, (_, last_used) in self._clients.items() if now - last_used > self.idle_timeout]
+        for key in expired:
+            # The client's session is closed when it is garbage collected, unless it is used again meanwhile.
+            self._evicted[key] = self._clients.pop(key)[0]
+
+
+registry = FinnhubClientRegistry()
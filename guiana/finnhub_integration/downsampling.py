@@ -0,0 +1,81 @@
+"""
+OHLC-preserving downsampling of daily candles.
+
+Daily bars are merged into weekly ('W') or calendar monthly ('M') bars: each merged bar opens at the open of its
+first daily bar, closes at the close of its last one, spans their highest high and lowest low, and sums their
+volume. Unlike picking representative points (e.g. LTTB), this keeps every price extreme of the series visible
+in the chart.
+"""
+
+import numpy as np
+
+from finnhub_integration.candle_store import SECONDS_PER_DAY
+
+
+RESOLUTIONS = ('D', 'W', 'M')
+
+# Number of bars the chart is sent when the request doesn't ask for a specific count.
+DEFAULT_TARGET_BARS = 500
+
+
+def _bucket_ids(t: np.ndarray, resolution: str):
+    days = t // SECONDS_PER_DAY
+    if resolution == 'D':
+        return days
+    if resolution == 'W':
+        # The UNIX epoch was a Thursday, and weeks start on Mondays.
+        return (days + 3) // 7
+    if resolution == 'M':
+        return t.astype('datetime64[s]').astype('datetime64[M]').astype(np.int64)
+    raise ValueError("Unsupported resolution %r, expected one of %s" % (resolution, ', '.join(RESOLUTIONS)))
+
+
+def aggregate(arrays: dict, bucket_ids: np.ndarray):
+    """
+    Merge consecutive bars that share a bucket id into one bar.
+
+    @param arrays: Candle arrays as returned by candle_store.load_candle_arrays, oldest first.
+    @param bucket_ids: Non-decreasing bucket id of every bar.
+    @return: Candle arrays with one bar per bucket, timestamped with the bucket's first bar.
+    """
+
+    if len(bucket_ids) == 0:
+        return arrays
+
+    starts = np.flatnonzero(np.r_[True, bucket_ids[1:] != bucket_ids[:-1]])
+    ends = np.r_[starts[1:], len(bucket_ids)] - 1
+    return {
+        't': arrays['t'][starts],
+        'o': arrays['o'][starts],
+        'h': np.maximum.reduceat(arrays['h'], starts),
+        'l': np.minimum.reduceat(arrays['l'], starts),
+        'c': arrays['c'][ends],
+        'v': np.add.reduceat(arrays['v'], starts),
+    }
+
+
+def downsample(arrays: dict, resolution: str):
+    """
+    Merge daily bars into bars of the given resolution ('D', 'W' or 'M').
+    """
+
+    if resolution == 'D':
+        return arrays
+    return aggregate(arrays, _bucket_ids(arrays['t'], resolution))
+
+
+def downsample_to(arrays: dict, bars: int = DEFAULT_TARGET_BARS):
+    """
+    Downsample daily bars to the finest resolution that yields at most `bars` bars. Should monthly bars still be
+    too many, every k consecutive monthly bars are merged, e.g. into quarterly ('3M') bars.
+
+    @return: The downsampled arrays and their resolution.
+    """
+
+    for resolution in RESOLUTIONS:
+        sampled = downsample(arrays, resolution)
+        if len(sampled['t']) <= bars:
+            return sampled, resolution
+
+    step = -(-len(sampled['t']) // bars)
+    return aggregate(sampled, np.arange(len(sampled['t'])) // step), '%dM' % step
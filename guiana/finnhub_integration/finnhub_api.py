@@ -2,19 +2,36 @@
 Integrates finnhub.io methods into Guiana for stock symbol data processing, analysing and visualisation.
 """
 
+import asyncio
+import contextvars
 import datetime
+import logging
 import pytz
 import time
-import finnhub as fh
-import requests
-import csv
-import spacy
-from spacytextblob.spacytextblob import SpacyTextBlob
-
+from asgiref.sync import sync_to_async
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.utils import timezone
+
+from finnhub_integration import bar_aggregator, candle_store, ingestion, news_store, sentiment
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.client_registry import registry
+from finnhub_integration.metrics import timed
 from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+from finnhub_integration.response_cache import cached_endpoint, response_cache
+
+
+logger = logging.getLogger(__name__)
+
+# Shared by every FinnhubClient so that concurrent searches reuse the same worker threads
+# instead of spawning a new pool per request.
+_fetch_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='finnhub-fetch')
 
 
 class FinnhubClient:
+    # Upper bound (in seconds) a single upstream call may take during a concurrent fetch.
+    FETCH_TIMEOUT = 10
+
     def __init__(self):
         """
         Construct a new finnhub.io Client instance.
@@ -24,10 +41,15 @@ class FinnhubClient:
 
         self.api_key = None
         self.client = None
-        self.API_URL = "https://finnhub.io/api/v1/?token="
+        self.aclient = None
+
+    @property
+    def nlp(self):
+        """
+        The process-wide sentiment pipeline, which is only loaded once news are first scored.
+        """
 
-        self.nlp = spacy.load('en_core_web_lg')
-        self.nlp.add_pipe('spacytextblob')
+        return sentiment.get_pipeline()
     
         
     def update_key(self, key: str):
@@ -47,32 +69,48 @@ class FinnhubClient:
         
     def check_key_valid(self, key):
         """
-        Sends a request to finnhub.io to validate the provided key.
+        Validate the provided key. The result is cached, so finnhub.io is only asked again once the
+        cached result expires or an upstream call is rejected with a 401.
+
         @return: Returns True if the key is valid, False otherwise.
         """
-        
-        url = self.API_URL + key
-        
-        # Check if exception is raised for any endpoint
-        r = requests.get(url)
-        return r.status_code != 401
+
+        return registry.check_key_valid(key)
 
     
     def initialize_client(self):
         """
-        Establish a connection to the Finnhub API using the current api key.
+        Fetch the pooled client of the current api key from the process-wide registry.
 
         @return: returns nothing
         """
 
-        self.client = fh.Client(api_key=self.api_key)
+        self.client = registry.get(self.api_key)
 
         
     def check_account_ready(self, request):
         if request.user.is_authenticated and self.check_key_valid(request.user.finnhub_api_key):
+            self.api_key = request.user.finnhub_api_key
             self.initialize_client()
             return True
         return False
+
+    async def acheck_account_ready(self, request):
+        """
+        Async counterpart of check_account_ready, which also sets up the async client of the user's key.
+        """
+
+        # Loading the user hits the database, which can't be done from the event loop.
+        if not await sync_to_async(lambda: request.user.is_authenticated)():
+            return False
+
+        api_key = request.user.finnhub_api_key
+        if not await async_registry.check_key_valid(api_key):
+            return False
+        self.api_key = api_key
+        self.initialize_client()
+        self.aclient = async_registry.get(api_key)
+        return True
     
     
     # Helper functions
@@ -118,20 +156,18 @@ class FinnhubClient:
 
     # System functions used to scrape data from finnhub
     # These functions should be moved to a task scheduler in the future
-    def download_symbols(self):
-        symbols = self.client.stock_symbols('US')
-        symbol_exchange = FinnhubSupportedExchanges.objects.get(exchange_code='US')
-
-        for symbol in symbols:
-            symbol_obj = FinnhubSupportedStockSymbols.objects.create(
-                symbol_exchange_code = symbol_exchange,
-                symbol_currency = symbol['currency'],
-                symbol_description = symbol['description'],
-                symbol_type = symbol['type'],
-                symbol_display_sym = symbol['displaySymbol'],
-                symbol_name = symbol['symbol']
-            )
-            symbol_obj.save()
+    def download_symbols(self, exchange_code: str = 'US'):
+        """
+        Sync the stock symbols of an exchange with finnhub.io. Only new, changed and delisted symbols are
+        written.
+
+        @return: A dict with the number of 'inserted', 'updated' and 'delisted' symbols.
+        """
+
+        symbols = self.client.stock_symbols(exchange_code)
+        with timed('db.sync_symbols'):
+            symbol_exchange = FinnhubSupportedExchanges.objects.get(exchange_code=exchange_code)
+            return ingestion.sync_symbols(symbol_exchange, symbols)
 
             
     # TODO: Convert this function to scheduled function (via celery)
@@ -139,88 +175,266 @@ class FinnhubClient:
         """
         Import a list of supported exchanges from finnhub.io.
 
-        @return: returns nothing
+        @return: The number of exchanges written.
         """
 
-        with open('../Finnhub Exchanges.csv', newline='') as f:
-            reader = csv.reader(f)
-            next(reader)    # To skip the labels row
-            
-            for row in reader:
-                # ['code', 'name', 'mic', 'timezone', 'hour', 'close_date', 'country', 'source', '']
-                new_exchange = FinnhubSupportedExchanges.objects.create(
-                    exchange_code = row[0],
-                    exchange_name = row[1],
-                    exchange_timezone = row[3],
-                    exchange_country = row[6]
-                )
-                new_exchange.save()
-                print('New exchange data saved to db')
+        return ingestion.upsert_exchanges(ingestion.read_supported_exchanges())
 
 
     # General functions
+    @cached_endpoint('general_news')
     def get_latest_news(self):
         # https://finnhub.io/docs/api/market-news
         return self.client.general_news('general', min_id=0)[:10]
+
+    @cached_endpoint('general_news')
+    async def aget_latest_news(self):
+        return (await self.aclient.general_news('general', min_id=0))[:10]
     
 
     # Symbol-specific functions
-    def search_symbol(self, symbol: str, context: dict):
-        if FinnhubSupportedStockSymbols.objects.filter(symbol_name=symbol).exists():
-            found_symbol_obj = FinnhubSupportedStockSymbols.objects.get(symbol_name=symbol)
-            general_info = self.get_symbol_info(symbol)
-            last_quote = self.get_symbol_last_quote(symbol)
-            all_news, polarity_av, subjectivity_av = self.get_symbol_news(symbol)
-
-            context['sym_obj'] = found_symbol_obj
-            context['sym'] = symbol
-            context['sym_country'] = general_info['country']
-            context['sym_currency'] = general_info['currency']
-            context['sym_exchange'] = general_info['exchange']
-            context['sym_name'] = general_info['name']
-            context['sym_url'] = general_info['weburl']
-            context['sym_industry'] = general_info['finnhubIndustry']
-            context['sym_marketCap'] = general_info['marketCapitalization']
-            context['sym_logo'] = general_info['logo']
-            context['sym_last_close'] = last_quote['c']
-            context['sym_ytd_close'] = self.get_ytd_close(symbol)
-            context['candlesticks'] = self.get_symbol_candlesticks(symbol)
-            context['financials'] = self.get_symbol_financials(symbol)
-            context['news'] = all_news
-            context['news_polarity'] = polarity_av
-            context['news_subjectivity'] = subjectivity_av
+    def fetch_concurrently(self, calls: dict, timeout: float = None):
+        """
+        Run independent upstream calls in parallel on the shared fetch pool.
+
+        @param calls: Mapping of result name to a (function, *args) tuple.
+        @param timeout: Seconds each call may take, defaults to FETCH_TIMEOUT.
+        @return: A (results, errors) tuple. Calls that raised or timed out are missing from
+                 results and have their exception recorded in errors instead.
+        """
+
+        timeout = self.FETCH_TIMEOUT if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        # Each call runs in a copy of the caller's context, so that it keeps its priority and request timings.
+        futures = {
+            name: _fetch_executor.submit(contextvars.copy_context().run, *call) for name, call in calls.items()
+        }
+        results, errors = {}, {}
+
+        for name, future in futures.items():
+            try:
+                results[name] = future.result(timeout=max(0, deadline - time.monotonic()))
+            except Exception as e:
+                future.cancel()
+                errors[name] = e
+                logger.warning("Finnhub call '%s' failed: %r", name, e)
+        return results, errors
+
+    def fetch_sequentially(self, calls: dict):
+        """
+        Run upstream calls one after another. Has the same return shape as fetch_concurrently.
+        """
+
+        results, errors = {}, {}
+        for name, (function, *args) in calls.items():
+            try:
+                results[name] = function(*args)
+            except Exception as e:
+                errors[name] = e
+                logger.warning("Finnhub call '%s' failed: %r", name, e)
+        return results, errors
+
+    async def afetch_concurrently(self, calls: dict, timeout: float = None):
+        """
+        Run independent upstream calls concurrently on the event loop. Has the same return shape as
+        fetch_concurrently.
+
+        @param calls: Mapping of result name to a (coroutine function, *args) tuple.
+        @param timeout: Seconds each call may take, defaults to FETCH_TIMEOUT.
+        """
+
+        timeout = self.FETCH_TIMEOUT if timeout is None else timeout
+        outcomes = await asyncio.gather(
+            *(asyncio.wait_for(function(*args), timeout) for function, *args in calls.values()),
+            return_exceptions=True,
+        )
+        results, errors = {}, {}
+
+        for name, outcome in zip(calls, outcomes):
+            if isinstance(outcome, Exception):
+                errors[name] = outcome
+                logger.warning("Finnhub call '%s' failed: %r", name, outcome)
+            else:
+                results[name] = outcome
+        return results, errors
+
+    @timed('db.find_symbol')
+    def _find_searched_symbol(self, symbol: str):
+        symbols = FinnhubSupportedStockSymbols.objects
+        # The exchange shown on the search page comes with the symbol, rather than in a query of its own.
+        found_symbol_obj = symbols.filter(symbol_delisted=False).resolve(symbol)
+        if found_symbol_obj is not None:
+            # Recently searched symbols get their news refreshed in the background by the news worker.
+            symbols.filter(pk=found_symbol_obj.pk).update(symbol_last_searched=timezone.now())
+        return found_symbol_obj
+
+    def search_symbol(self, symbol: str, context: dict, concurrent: bool = True):
+        found_symbol_obj = self._find_searched_symbol(symbol)
+        if found_symbol_obj is None:
+            return context
+
+        calls = {
+            'info': (self.get_symbol_info, symbol),
+            'last_quote': (self.get_symbol_last_quote, found_symbol_obj),
+            'news': (self.get_symbol_news, symbol),
+            'ytd_close': (self.get_ytd_close, symbol),
+            'financials': (self.get_symbol_financials, symbol),
+        }
+        if concurrent:
+            results, errors = self.fetch_concurrently(calls)
+        else:
+            results, errors = self.fetch_sequentially(calls)
+        return self._fill_search_context(context, found_symbol_obj, symbol, results, errors)
+
+    async def asearch_symbol(self, symbol: str, context: dict):
+        """
+        Async counterpart of search_symbol, which waits on finnhub.io without holding a thread.
+        """
+
+        # Not thread sensitive, so that concurrent searches don't queue up on the one shared sync thread.
+        found_symbol_obj = await sync_to_async(self._find_searched_symbol, thread_sensitive=False)(symbol)
+        if found_symbol_obj is None:
+            return context
+
+        results, errors = await self.afetch_concurrently({
+            'info': (self.aget_symbol_info, symbol),
+            'last_quote': (self.aget_symbol_last_quote, found_symbol_obj),
+            'news': (self.aget_symbol_news, symbol),
+            'ytd_close': (self.aget_ytd_close, symbol),
+            'financials': (self.aget_symbol_financials, symbol),
+        })
+        return self._fill_search_context(context, found_symbol_obj, symbol, results, errors)
+
+    def _fill_search_context(self, context: dict, found_symbol_obj, symbol: str, results: dict, errors: dict):
+        general_info = results.get('info', {})
+        last_quote = results.get('last_quote', {})
+        all_news, polarity_av, subjectivity_av = results.get('news', ([], None, None))
+
+        context['sym_obj'] = found_symbol_obj
+        context['sym'] = symbol
+        context['sym_country'] = general_info.get('country')
+        context['sym_currency'] = general_info.get('currency')
+        context['sym_exchange'] = general_info.get('exchange')
+        context['sym_name'] = general_info.get('name')
+        context['sym_url'] = general_info.get('weburl')
+        context['sym_industry'] = general_info.get('finnhubIndustry')
+        context['sym_marketCap'] = general_info.get('marketCapitalization')
+        context['sym_logo'] = general_info.get('logo')
+        context['sym_last_close'] = last_quote.get('c')
+        context['sym_ytd_close'] = results.get('ytd_close')
+        context['financials'] = results.get('financials', {})
+        context['news'] = all_news
+        context['news_polarity'] = polarity_av
+        context['news_subjectivity'] = subjectivity_av
+        context['fetch_errors'] = list(errors)
         return context
 
     
     # Auxiliary function to get a symbol's company's general information
+    @cached_endpoint('company_profile')
     def get_symbol_info(self, symbol: str):
         return self.client.company_profile2(symbol=symbol)
 
+    @cached_endpoint('company_profile')
+    async def aget_symbol_info(self, symbol: str):
+        return await self.aclient.company_profile2(symbol=symbol)
+
     
-    # Auxiliary function to get a symbol's quotes from 2010 onwards
+    # Auxiliary function to keep a symbol's locally stored quotes from 2010 onwards up to date
+    @cached_endpoint('candles')
+    def update_symbol_candles(self, symbol: str):
+        """
+        Fetch the bars since the last stored one into the local candle store. Calls are cached, so finnhub.io
+        is asked at most once per 'candles' TTL for each symbol.
+
+        @return: Timestamp of the symbol's most recent stored bar.
+        """
+
+        symbol_obj = FinnhubSupportedStockSymbols.objects.get(symbol_name=symbol)
+        candle_store.update_candles(self.client, symbol_obj, 'D')
+        return candle_store.get_last_timestamp(symbol_obj, 'D')
+
+
+    # Auxiliary function to get a symbol's daily quotes from 2010 onwards
     def get_symbol_candlesticks(self, symbol: str):
-        RESOLUTION = 'D'
-        start_date = time.mktime(
-            datetime.datetime.strptime('01/01/2010', '%d/%m/%Y').timetuple()  # Timestamp of 1 Jan, 2000.
-        )
-        end_date = time.time()  # Current timestamp.
-        
-        candlesticks_json = self.client.stock_candles(symbol, RESOLUTION, int(start_date), int(end_date))
-        candlesticks_json['t'] = [datetime.datetime.fromtimestamp(x).strftime('%Y-%m-%d') for x in candlesticks_json['t']]
-        
-        # Process candlesticks for plotting with Apache ECharts
-        processed = {
-            't': candlesticks_json['t'],
-            'data': [list(i) for i in zip(candlesticks_json['o'], candlesticks_json['c'], candlesticks_json['l'], candlesticks_json['h'])]
-        }
-        return processed
+        """
+        Get a symbol's daily candles in the compact columnar form served to the candlesticks chart.
+
+        @return: A dict of parallel 'day' (days since the UNIX epoch), 'o', 'h', 'l', 'c' and 'v' lists.
+        """
+
+        self.update_symbol_candles(symbol)
+        symbol_obj = FinnhubSupportedStockSymbols.objects.get(symbol_name=symbol)
+        return candle_store.to_columnar(candle_store.load_candle_arrays(symbol_obj, 'D'))
 
     
-    def get_symbol_last_quote(self, symbol: str):
-        return self.client.quote(symbol)
+    def get_symbol_last_quote(self, symbol_obj: FinnhubSupportedStockSymbols):
+        """
+        Get a symbol's last price ('c'). It's taken from the symbol's live trades when it traded recently, and
+        only asked to finnhub.io's quote endpoint otherwise.
+        """
+
+        live_price = bar_aggregator.get_live_price(symbol_obj)
+        if live_price is not None:
+            return {'c': live_price}
+        return self.client.quote(symbol_obj.symbol_name)
+
+    async def aget_symbol_last_quote(self, symbol_obj: FinnhubSupportedStockSymbols):
+        live_price = await sync_to_async(bar_aggregator.get_live_price, thread_sensitive=False)(symbol_obj)
+        if live_price is not None:
+            return {'c': live_price}
+        return await self.aclient.quote(symbol_obj.symbol_name)
+
+    @cached_endpoint('quote')
+    async def aget_quote(self, symbol: str):
+        # https://finnhub.io/docs/api/quote
+        return await self.aclient.quote(symbol)
+
+    async def aget_cached_quote(self, symbol: str):
+        """
+        Get a symbol's quote from the response cache only. A missing or expired quote is fetched in the background.
+
+        @return: The cached quote, or None if there's none yet.
+        """
+
+        return await response_cache.aget_cached('quote', (symbol,), lambda: self.aclient.quote(symbol))
+
+    async def aget_quotes(self, symbol_objs: list):
+        """
+        Get the last price ('c') of several symbols at once, e.g. those of a watchlist. Symbols that traded
+        recently are priced from their live trades, and the others are quoted concurrently through the response
+        cache.
+
+        Only as many symbols as the key's rate limiter lets through at once (its burst) are quoted from
+        finnhub.io, so that a large watchlist doesn't queue on the rate limiter until its calls time out. The
+        others are only served from the cache, and fetched in the background for the next views.
+
+        @return: A (quotes, errors) tuple, where quotes maps symbol_name to a finnhub.io-style quote.
+        """
+
+        live_prices = await sync_to_async(bar_aggregator.get_live_prices, thread_sensitive=False)(symbol_objs)
+        names = [symbol_obj.symbol_name for symbol_obj in symbol_objs if symbol_obj.symbol_name not in live_prices]
+        burst = settings.FINNHUB_RATE_LIMIT['burst']
+        quotes, errors = await self.afetch_concurrently({name: (self.aget_quote, name) for name in names[:burst]})
+        for name in names[burst:]:
+            quote = await self.aget_cached_quote(name)
+            if quote is not None:
+                quotes[name] = quote
+        quotes.update({symbol: {'c': price} for symbol, price in live_prices.items()})
+        return quotes, errors
 
         
     def get_ytd_close(self, symbol: str):
+        yesterday, today = self._ytd_range()
+        ytd_quote = self.client.stock_candles(symbol=symbol, resolution='D', _from=yesterday, to=today)
+        return ytd_quote['c'][0]
+
+    async def aget_ytd_close(self, symbol: str):
+        yesterday, today = self._ytd_range()
+        ytd_quote = await self.aclient.stock_candles(symbol=symbol, resolution='D', _from=yesterday, to=today)
+        return ytd_quote['c'][0]
+
+    def _ytd_range(self):
         weekday_int = datetime.datetime.today().weekday()
         today = int(datetime.datetime.now(pytz.timezone('US/Central')).timestamp())
 
@@ -231,13 +445,19 @@ class FinnhubClient:
             yesterday = today - 3 * 24 * 60 * 60
         else:
             yesterday = today - 24 * 60 * 60
-        ytd_quote = self.client.stock_candles(symbol=symbol, resolution='D', _from=yesterday, to=today)
-        return ytd_quote['c'][0]
+        return yesterday, today
     
 
+    @cached_endpoint('basic_financials')
     def get_symbol_financials(self, symbol: str):
         # https://finnhub.io/docs/api/company-basic-financials
-        financials = self.client.company_basic_financials(symbol, 'all')['metric']
+        return self._summarize_financials(self.client.company_basic_financials(symbol, 'all')['metric'])
+
+    @cached_endpoint('basic_financials')
+    async def aget_symbol_financials(self, symbol: str):
+        return self._summarize_financials((await self.aclient.company_basic_financials(symbol, 'all'))['metric'])
+
+    def _summarize_financials(self, financials: dict):
         metrics = {
             "52-week range": str(financials["52WeekLow"]) + " - " + str(financials["52WeekHigh"]),
             "Beta (5Y, monthly)": financials["beta"],
@@ -250,31 +470,46 @@ class FinnhubClient:
 
     def get_symbol_news(self, symbol: str):
         """
-        Fetch one week worth of related news of a symbol.
+        Fetch one week worth of related news of a symbol, along with their sentiment.
+        The news are read from the local news store, which is kept up to date by the news worker
+        for recently searched symbols. They are only fetched from finnhub.io if the store is stale.
         Resource: https://finnhub.io/docs/api/company-news
 
-        @returns: List of related news
+        @returns: List of related news, their average polarity and their average subjectivity
         """
 
-        now = self.calc_now_timestamp()
-        now_date = self.calc_date_from_timestamp(now, "%Y-%m-%d")
-        week_ago = self.calc_date_delta_from_timestamp(now, 7, "%Y-%m-%d")
-        all_news = self.client.company_news(symbol, _from=week_ago, to=now_date)
-        polarities, subjectivities = 0, 0
-        
+        symbol_obj = FinnhubSupportedStockSymbols.objects.get(symbol_name=symbol)
+        if not news_store.is_fresh(symbol_obj):
+            news_store.update_news(self.client, symbol_obj)
+        return self._load_symbol_news(symbol_obj)
+
+    async def aget_symbol_news(self, symbol: str):
+        """
+        Async counterpart of get_symbol_news. Only the database and the sentiment scoring run in a thread, which
+        isn't the shared sync thread, so that the scoring of concurrent searches runs in parallel.
+        """
+
+        symbol_obj = await sync_to_async(FinnhubSupportedStockSymbols.objects.get, thread_sensitive=False)(
+            symbol_name=symbol)
+        if not news_store.is_fresh(symbol_obj):
+            _from, to = news_store.news_date_range()
+            all_news = await self.aclient.company_news(symbol, _from=_from, to=to)
+            await sync_to_async(news_store.store_news, thread_sensitive=False)(symbol_obj, all_news)
+        return await sync_to_async(self._load_symbol_news, thread_sensitive=False)(symbol_obj)
+
+    @timed('db.load_news')
+    def _load_symbol_news(self, symbol_obj):
+        all_news = news_store.load_news(symbol_obj)
         for news in all_news:
             news['upload_timedelta'] = self.calc_time_delta_from_now(news['datetime'])
-            news_polarity, news_subjectivity = self.news_sentiment_analysis(news['summary'])
-            news['polarity'] = round(news_polarity, 2)
-            news['subjectivity'] = round(news_subjectivity, 2)
-            polarities += news_polarity
-            subjectivities += news_subjectivity
-        polarities_avg = round(polarities / len(all_news), 4)
-        subjectivities_avg = round(subjectivities / len(all_news), 4)
+            news['polarity'] = round(news['polarity'], 2)
+            news['subjectivity'] = round(news['subjectivity'], 2)
+
+        polarities_avg, subjectivities_avg = news_store.load_news_averages(symbol_obj)
+        if all_news:
+            polarities_avg, subjectivities_avg = round(polarities_avg, 4), round(subjectivities_avg, 4)
         return all_news, polarities_avg, subjectivities_avg
     
     def news_sentiment_analysis(self, summary: str):
-        analysis = self.nlp(summary)
-        news_sentiment = analysis._.blob.sentiment
-        polarity, subjectivity = news_sentiment.polarity, news_sentiment.subjectivity
+        polarity, subjectivity = sentiment.score_texts(self.nlp, [summary])[0]
         return polarity, subjectivity
\ No newline at end of file
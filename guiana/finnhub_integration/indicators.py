@@ -0,0 +1,211 @@
+"""
+Technical indicators of the candle store's daily closes, computed over NumPy arrays.
+
+Rolling indicators (moving averages, Bollinger bands and volatility) are computed over sliding windows of the
+closes, and exponential ones (EMA and RSI) in closed form, so that no indicator loops over the bars in Python.
+
+A symbol's indicators are computed over its whole history once, and cached in Django's cache along with what
+is needed to extend them: the last closes of the rolling windows and the state of the exponential averages.
+When bars are appended to the store, only the new bars are read and computed. The last cached bar is always
+computed again, since it may have been stored before it closed (see candle_store.update_candles).
+"""
+
+import numpy as np
+from django.core.cache import cache
+
+from finnhub_integration import candle_store
+from finnhub_integration.models import FinnhubStockCandles, FinnhubSupportedStockSymbols
+
+
+INDICATORS = ('sma_20', 'sma_50', 'ema_20', 'rsi_14', 'bb_upper', 'bb_middle', 'bb_lower', 'volatility_20')
+
+SMA_WINDOWS = (20, 50)
+EMA_SPAN = 20
+RSI_PERIOD = 14
+BOLLINGER_WINDOW = 20
+BOLLINGER_WIDTH = 2
+VOLATILITY_WINDOW = 20
+TRADING_DAYS = 252
+
+# Number of previous closes needed to extend every indicator by one bar.
+LOOKBACK = max(max(SMA_WINDOWS), BOLLINGER_WINDOW, VOLATILITY_WINDOW + 1) - 1
+
+CACHE_KEY = 'finnhub:indicators:{}:{}'
+CACHE_TIMEOUT = 7 * 24 * 60 * 60
+
+
+def _rolling(values: np.ndarray, window: int, reduce):
+    """
+    @return: reduce() of every window of values ending at each value, NaN where fewer than `window` values end
+             there.
+    """
+
+    result = np.full(len(values), np.nan)
+    if len(values) >= window:
+        result[window - 1:] = reduce(np.lib.stride_tricks.sliding_window_view(values, window), axis=1)
+    return result
+
+
+def _ewm(values: np.ndarray, alpha: float, previous: float):
+    """
+    Exponentially weighted average: y[i] = (1 - alpha) * y[i - 1] + alpha * values[i], y[-1] being `previous`.
+
+    It is computed in closed form, y[i] = p[i] * (previous + alpha * sum(values[:i + 1] / p[:i + 1])) where
+    p[i] = (1 - alpha) ** (i + 1), over blocks short enough for the powers not to underflow.
+    """
+
+    result = np.empty(len(values))
+    decay = 1 - alpha
+    block = max(1, int(100 / -np.log10(decay)))
+    for start in range(0, len(values), block):
+        chunk = values[start:start + block]
+        powers = decay ** np.arange(1, len(chunk) + 1)
+        result[start:start + len(chunk)] = powers * (previous + alpha * np.cumsum(chunk / powers))
+        previous = result[start + len(chunk) - 1]
+    return result
+
+
+def compute(closes: np.ndarray, state: dict = None):
+    """
+    Compute the indicators of closes, continuing a series whose state is given.
+
+    @param closes: Closes, oldest first.
+    @param state: State of the series the closes follow, as returned by an earlier call, or None for a new series.
+    @return: A (dict of indicator name to an array parallel to closes, state after the closes) tuple. Indicators
+             are NaN until enough closes were seen.
+    """
+
+    closes = np.asarray(closes, dtype=np.float64)
+    if state is None:
+        state = {'tail': np.empty(0), 'count': 0, 'ema': None, 'gain': None, 'loss': None}
+    tail = state['tail']
+    # Rolling windows are computed over the previous closes too, whose own results are dropped.
+    series = np.concatenate([tail, closes])
+    skip = len(tail)
+
+    values = {}
+    for window in SMA_WINDOWS:
+        values['sma_{}'.format(window)] = _rolling(series, window, np.mean)[skip:]
+    middle = _rolling(series, BOLLINGER_WINDOW, np.mean)[skip:]
+    width = BOLLINGER_WIDTH * _rolling(series, BOLLINGER_WINDOW, np.std)[skip:]
+    values['bb_upper'], values['bb_middle'], values['bb_lower'] = middle + width, middle, middle - width
+
+    returns = np.diff(np.log(series), prepend=np.nan)
+    volatility = _rolling(returns[1:], VOLATILITY_WINDOW, lambda windows, axis: np.std(windows, axis=axis, ddof=1))
+    values['volatility_20'] = np.r_[np.nan, volatility][skip:skip + len(closes)] * np.sqrt(TRADING_DAYS)
+
+    # The first close of a series seeds the EMA.
+    ema = _ewm(closes, 2 / (EMA_SPAN + 1), closes[0] if state['ema'] is None and len(closes) else state['ema'])
+    values['ema_20'] = ema
+
+    # Wilder's RSI: the average gain and loss are smoothed with alpha = 1 / RSI_PERIOD, seeded by the first change.
+    changes = np.diff(series, prepend=np.nan)[skip:]
+    first = 1 if state['count'] == 0 else 0
+    gains, losses = np.clip(changes[first:], 0, None), np.clip(-changes[first:], 0, None)
+    gain, loss = state['gain'], state['loss']
+    rsi = np.full(len(closes), np.nan)
+    if len(gains):
+        alpha = 1 / RSI_PERIOD
+        average_gains = _ewm(gains, alpha, gains[0] if gain is None else gain)
+        average_losses = _ewm(losses, alpha, losses[0] if loss is None else loss)
+        total = average_gains + average_losses
+        rsi[first:] = np.divide(100 * average_gains, total, out=np.full(len(total), 50.0), where=total > 0)
+        gain, loss = average_gains[-1], average_losses[-1]
+    # Bar i has i changes behind it, and the RSI is only shown once RSI_PERIOD of them were averaged.
+    rsi[:max(0, RSI_PERIOD - state['count'])] = np.nan
+    values['rsi_14'] = rsi
+
+    state = {
+        'tail': series[-LOOKBACK:] if LOOKBACK else np.empty(0),
+        'count': state['count'] + len(closes),
+        'ema': ema[-1] if len(closes) else state['ema'],
+        'gain': gain,
+        'loss': loss,
+    }
+    return values, state
+
+
+def _compute_entry(t: np.ndarray, closes: np.ndarray, state: dict = None):
+    # The state is kept as of the bar before the last one, for the last bar to be computed again later.
+    values, previous_state = compute(closes[:-1], state)
+    last_values, _ = compute(closes[-1:], previous_state)
+    return {
+        't': t,
+        'last_close': closes[-1] if len(closes) else None,
+        'values': {name: np.r_[values[name], last_values[name]] for name in INDICATORS},
+        'state': previous_state,
+    }
+
+
+def _extend(symbol_obj: FinnhubSupportedStockSymbols, resolution: str, entry: dict):
+    """
+    @return: The cached entry extended with the bars stored since, or None if bars before its last one changed.
+    """
+
+    last_timestamp = int(entry['t'][-1])
+    arrays = candle_store.load_candle_arrays(symbol_obj, resolution, start=last_timestamp)
+    if not len(arrays['t']) or arrays['t'][0] != last_timestamp:
+        return None
+    stored_before = FinnhubStockCandles.objects.filter(
+        candle_symbol=symbol_obj, candle_resolution=resolution, candle_timestamp__lt=last_timestamp
+    ).count()
+    if stored_before != len(entry['t']) - 1:
+        return None
+    if len(arrays['t']) == 1 and arrays['c'][0] == entry['last_close']:
+        return entry
+
+    update = _compute_entry(arrays['t'], arrays['c'], entry['state'])
+    return {
+        **update,
+        't': np.r_[entry['t'][:-1], update['t']],
+        'values': {name: np.r_[entry['values'][name][:-1], update['values'][name]] for name in INDICATORS},
+    }
+
+
+def get_indicators(symbol_obj: FinnhubSupportedStockSymbols, resolution: str = 'D'):
+    """
+    Get the indicators of every stored bar of a symbol, extending the cached ones with the bars stored since.
+
+    @return: A dict of 't' (timestamp of each bar) and of every indicator's values, parallel arrays oldest first.
+    """
+
+    key = CACHE_KEY.format(symbol_obj.pk, resolution)
+    cached = cache.get(key)
+    entry = _extend(symbol_obj, resolution, cached) if cached is not None and len(cached['t']) else None
+    # Nothing cached yet, or bars before the last cached one changed: start over.
+    if entry is None:
+        arrays = candle_store.load_candle_arrays(symbol_obj, resolution)
+        entry = _compute_entry(arrays['t'], arrays['c'])
+    if entry is not cached:
+        cache.set(key, entry, CACHE_TIMEOUT)
+    return {'t': entry['t'], **entry['values']}
+
+
+def at_bars(indicators: dict, t: np.ndarray, end: int = None):
+    """
+    Pick the indicators of served bars, which may be downsampled: the values of a weekly or monthly bar are those
+    of its last daily bar, i.e. the one its close is taken from.
+
+    @param t: Timestamps of the served bars, which start at stored bars.
+    @param end: Timestamp the served bars end at, if they were cut short.
+    @return: A dict of every indicator's values at the served bars.
+    """
+
+    times = indicators['t']
+    if not len(times):
+        return {name: np.full(len(t), np.nan) for name in INDICATORS}
+    ends = np.searchsorted(times, t[1:], side='left') - 1
+    last = np.searchsorted(times, times[-1] if end is None else end, side='right') - 1
+    indexes = np.r_[ends, last][:len(t)].astype(np.int64)
+    return {name: indicators[name][indexes] for name in INDICATORS}
+
+
+def to_payload(values: dict, names: tuple = INDICATORS, decimals: int = 4):
+    """
+    @return: A JSON serialisable dict of the named indicators' values, rounded, with None where undefined.
+    """
+
+    return {
+        name: np.where(np.isnan(values[name]), None, np.round(values[name], decimals)).tolist()
+        for name in names
+    }
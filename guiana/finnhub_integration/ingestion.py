@@ -0,0 +1,208 @@
+"""
+Bulk ingestion of finnhub.io reference data (supported exchanges and stock symbols).
+
+Rows are written with batched upserts inside a single transaction, so a full refresh takes a handful of
+queries instead of one or two per row, and can safely be rerun over existing data.
+
+Display symbols are unique too. A display symbol listed for several symbols goes to the symbol it is the name
+of, or else to the first one listed, and the others are stored without one. A display symbol taken over from a
+stored symbol, e.g. after a rename, is cleared from the stored symbol first.
+"""
+
+import csv
+from django.conf import settings
+from django.db import transaction
+
+from finnhub_integration import symbol_index
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+
+BATCH_SIZE = 2000
+
+EXCHANGES_CSV_PATH = settings.BASE_DIR.parent / 'Finnhub Exchanges.csv'
+
+
+def read_supported_exchanges(path=EXCHANGES_CSV_PATH):
+    """
+    Read the list of supported exchanges exported from finnhub.io.
+
+    @return: A list of unsaved FinnhubSupportedExchanges instances.
+    """
+
+    with open(path, newline='') as f:
+        reader = csv.reader(f)
+        next(reader)    # To skip the labels row
+
+        # ['code', 'name', 'mic', 'timezone', 'hour', 'close_date', 'country', 'source', '']
+        return [
+            FinnhubSupportedExchanges(
+                exchange_code=row[0],
+                exchange_name=row[1],
+                exchange_timezone=row[3],
+                exchange_country=row[6],
+            )
+            for row in reader
+        ]
+
+
+def build_symbol(symbol: dict, exchange: FinnhubSupportedExchanges):
+    """
+    Convert a symbol returned by finnhub.io's stock_symbols endpoint into an unsaved model instance.
+    """
+
+    return FinnhubSupportedStockSymbols(
+        symbol_exchange_code=exchange,
+        symbol_currency=symbol['currency'],
+        symbol_description=symbol['description'],
+        symbol_type=symbol['type'],
+        symbol_display_sym=symbol['displaySymbol'],
+        symbol_name=symbol['symbol'],
+    )
+
+
+def upsert_exchanges(exchanges: list, batch_size: int = BATCH_SIZE):
+    """
+    Insert exchanges, updating the existing ones with the same exchange_code.
+
+    @return: The number of exchanges written.
+    """
+
+    with transaction.atomic():
+        FinnhubSupportedExchanges.objects.bulk_create(
+            exchanges,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['exchange_code'],
+            update_fields=['exchange_name', 'exchange_timezone', 'exchange_country'],
+        )
+    return len(exchanges)
+
+
+def _display_symbol_owners(symbols):
+    """
+    @param symbols: (symbol_name, display symbol) pairs.
+    @return: A dict of every display symbol to the name of the symbol it goes to.
+    """
+
+    owners = {}
+    for name, display in symbols:
+        if display is None:
+            continue
+        if display not in owners or (display == name and owners[display] != display):
+            owners[display] = name
+    return owners
+
+
+def _release_display_symbols(owners: dict, batch_size: int):
+    """
+    Clear the display symbols of the stored symbols whose display symbol goes to another symbol.
+    """
+
+    displays = list(owners)
+    released = []
+    for i in range(0, len(displays), batch_size):
+        rows = FinnhubSupportedStockSymbols.objects.filter(
+            symbol_display_sym__in=displays[i:i + batch_size]
+        ).values_list('id', 'symbol_name', 'symbol_display_sym')
+        released += [pk for pk, name, display in rows if owners[display] != name]
+    for i in range(0, len(released), batch_size):
+        FinnhubSupportedStockSymbols.objects.filter(id__in=released[i:i + batch_size]).update(symbol_display_sym=None)
+
+
+def upsert_symbols(symbols: list, batch_size: int = BATCH_SIZE):
+    """
+    Insert stock symbols, updating the existing ones with the same symbol_name.
+
+    @return: The number of symbols written.
+    """
+
+    owners = _display_symbol_owners((symbol.symbol_name, symbol.symbol_display_sym) for symbol in symbols)
+    for symbol in symbols:
+        if owners.get(symbol.symbol_display_sym) != symbol.symbol_name:
+            symbol.symbol_display_sym = None
+
+    with transaction.atomic():
+        _release_display_symbols(owners, batch_size)
+        # Django 4.1 uses unique_fields and update_fields as column names, hence 'symbol_exchange_code_id'.
+        FinnhubSupportedStockSymbols.objects.bulk_create(
+            symbols,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=['symbol_name'],
+            update_fields=['symbol_exchange_code_id', 'symbol_currency', 'symbol_description', 'symbol_type',
+                           'symbol_display_sym', 'symbol_delisted'],
+        )
+    symbol_index.invalidate()
+    return len(symbols)
+
+
+# Fields compared between finnhub.io and the stored symbols to detect updates.
+SYNCED_SYMBOL_FIELDS = ('symbol_exchange_code_id', 'symbol_currency', 'symbol_description', 'symbol_type',
+                        'symbol_display_sym', 'symbol_delisted')
+
+
+def _symbol_values(symbol: dict, exchange: FinnhubSupportedExchanges, display: str):
+    return (exchange.id, symbol['currency'], symbol['description'], symbol['type'], display, False)
+
+
+def _load_stored_symbols(exchange: FinnhubSupportedExchanges, names: set, batch_size: int):
+    """
+    Load the stored symbols of an exchange, along with the stored symbols of other exchanges that finnhub.io
+    now lists under this exchange.
+
+    @return: A dict of symbol_name to (id, *SYNCED_SYMBOL_FIELDS) tuples.
+    """
+
+    fields = ('id', 'symbol_name') + SYNCED_SYMBOL_FIELDS
+    stored = {
+        row[1]: (row[0],) + row[2:]
+        for row in FinnhubSupportedStockSymbols.objects.filter(symbol_exchange_code=exchange).values_list(*fields)
+    }
+
+    moved = list(names - stored.keys())
+    for i in range(0, len(moved), batch_size):
+        for row in FinnhubSupportedStockSymbols.objects.filter(symbol_name__in=moved[i:i + batch_size]).values_list(*fields):
+            stored[row[1]] = (row[0],) + row[2:]
+    return stored
+
+
+def sync_symbols(exchange: FinnhubSupportedExchanges, symbols: list, batch_size: int = BATCH_SIZE):
+    """
+    Bring the stored symbols of an exchange in line with the list returned by finnhub.io's stock_symbols
+    endpoint. Only the symbols that were added, changed or delisted since the last sync are written.
+
+    @return: A dict with the number of 'inserted', 'updated' and 'delisted' symbols.
+    """
+
+    upstream = {symbol['symbol']: symbol for symbol in symbols}
+    stored = _load_stored_symbols(exchange, set(upstream), batch_size)
+    owners = _display_symbol_owners((name, symbol['displaySymbol']) for name, symbol in upstream.items())
+
+    inserts, updates = [], []
+    for name, symbol in upstream.items():
+        display = symbol['displaySymbol'] if owners.get(symbol['displaySymbol']) == name else None
+        values = _symbol_values(symbol, exchange, display)
+        if name not in stored:
+            inserts.append(build_symbol({**symbol, 'displaySymbol': display}, exchange))
+        elif stored[name][1:] != values:
+            updates.append(FinnhubSupportedStockSymbols(id=stored[name][0], symbol_name=name,
+                                                        **dict(zip(SYNCED_SYMBOL_FIELDS, values))))
+
+    # An empty listing is far more likely to be an upstream hiccup than an exchange delisting every symbol.
+    delisted = []
+    if upstream:
+        delisted = [
+            row[0] for name, row in stored.items()
+            if name not in upstream and row[1] == exchange.id and not row[-1]
+        ]
+
+    with transaction.atomic():
+        _release_display_symbols(owners, batch_size)
+        FinnhubSupportedStockSymbols.objects.bulk_create(inserts, batch_size=batch_size)
+        FinnhubSupportedStockSymbols.objects.bulk_update(updates, SYNCED_SYMBOL_FIELDS, batch_size=batch_size)
+        for i in range(0, len(delisted), batch_size):
+            FinnhubSupportedStockSymbols.objects.filter(id__in=delisted[i:i + batch_size]).update(symbol_delisted=True)
+
+    if inserts or updates or delisted:
+        symbol_index.invalidate()
+    return {'inserted': len(inserts), 'updated': len(updates), 'delisted': len(delisted)}
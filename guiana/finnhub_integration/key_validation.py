@@ -0,0 +1,35 @@
+"""
+Caches the outcome of finnhub.io API key validation in Django's cache framework.
+
+Valid keys are remembered for VALID_KEY_TTL seconds and rejected keys for INVALID_KEY_TTL seconds, so
+page views do not need a round trip to finnhub.io just to find out whether the user's key still works.
+"""
+
+import hashlib
+from django.core.cache import cache
+
+
+VALID_KEY_TTL = 60 * 60
+INVALID_KEY_TTL = 5 * 60
+
+
+def _cache_key(api_key: str):
+    # API keys are secrets, so only their digest is used as the cache key.
+    return 'finnhub:key-valid:' + hashlib.sha256(api_key.encode()).hexdigest()
+
+
+def get_cached_key_validity(api_key: str):
+    """
+    @return: True or False if the key's validity is cached, None otherwise.
+    """
+
+    return cache.get(_cache_key(api_key))
+
+
+def remember_key_validity(api_key: str, valid: bool):
+    timeout = VALID_KEY_TTL if valid else INVALID_KEY_TTL
+    cache.set(_cache_key(api_key), valid, timeout=timeout)
+
+
+def forget_key_validity(api_key: str):
+    cache.delete(_cache_key(api_key))
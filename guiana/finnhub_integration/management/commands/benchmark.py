@@ -0,0 +1,72 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+
+from finnhub_integration import benchmarks
+
+
+class Command(BaseCommand):
+    help = ("Benchmark symbol searches, symbol ingestion and news sentiment scoring against a local finnhub.io "
+            "stub, in a throwaway test database, and write the results as a JSON report.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--only', action='append', choices=benchmarks.SECTIONS, dest='sections',
+                            help="Benchmark to run, can be repeated. Defaults to all of them.")
+        parser.add_argument('--symbols', type=int, default=1000, help="Number of symbols listed by the stub.")
+        parser.add_argument('--news', type=int, default=20, help="Number of articles per company news response.")
+        parser.add_argument('--latency', type=float, default=50,
+                            help="Milliseconds every stub response is delayed by, as finnhub.io's would be.")
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                            help="Numbers of concurrent searches to measure.")
+        parser.add_argument('--requests', type=int, default=32, help="Number of searches per concurrency level.")
+        parser.add_argument('--articles', type=int, default=500, help="Number of articles scored.")
+        parser.add_argument('--sentiment-model', help="spaCy model to score news with, e.g. 'blank:en'. Defaults "
+                                                      "to the FINNHUB_SENTIMENT_MODEL setting.")
+        parser.add_argument('--output', help="File to write the report to, instead of the standard output.")
+        parser.add_argument('--compare', help="Report of an earlier run to compare the results with.")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError("Could not read the report to compare with: %s" % e)
+
+        overrides = {}
+        if options['sentiment_model']:
+            overrides['FINNHUB_SENTIMENT_MODEL'] = options['sentiment_model']
+
+        setup_test_environment(debug=False)
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            with override_settings(**overrides):
+                report = benchmarks.run_benchmarks(
+                    sections=tuple(options['sections'] or benchmarks.SECTIONS),
+                    symbols=options['symbols'],
+                    news=options['news'],
+                    latency=options['latency'] / 1000,
+                    concurrency_levels=tuple(options['concurrency']),
+                    requests=options['requests'],
+                    articles=options['articles'],
+                )
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+            self.stdout.write("Report written to %s" % options['output'])
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            self.stdout.write("\n%-60s %14s %14s %9s" % ("metric", "baseline", "new", "change"))
+            for name, old, new, change in benchmarks.compare_reports(baseline, report):
+                self.stdout.write("%-60s %14s %14s %9s" % (
+                    name, old, new, "" if change is None else "%+.1f%%" % (change * 100),
+                ))
@@ -0,0 +1,57 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from finnhub.exceptions import FinnhubAPIException
+
+from finnhub_integration import ingestion
+from finnhub_integration.client_registry import registry
+from finnhub_integration.models import FinnhubSupportedExchanges
+from finnhub_integration.rate_limit import PRIORITY_BULK, request_priority
+
+
+class Command(BaseCommand):
+    help = "Bulk import finnhub.io supported exchanges (from the exported CSV) or stock symbols (from the API)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('dataset', choices=['exchanges', 'symbols'])
+        parser.add_argument('--exchange', default='US', help="Exchange code to import symbols of.")
+        parser.add_argument('--csv', default=ingestion.EXCHANGES_CSV_PATH, help="Path of the exchanges CSV.")
+        parser.add_argument('--batch-size', type=int, default=ingestion.BATCH_SIZE)
+        parser.add_argument('--api-key', default=os.environ.get('FINNHUB_API_KEY'),
+                            help="finnhub.io API key, defaults to the FINNHUB_API_KEY environment variable.")
+
+    def handle(self, *args, **options):
+        # Bulk imports only use the quota left over by searches and the news worker.
+        with request_priority(PRIORITY_BULK):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        start = time.perf_counter()
+
+        if options['dataset'] == 'exchanges':
+            rows = ingestion.read_supported_exchanges(options['csv'])
+            count = ingestion.upsert_exchanges(rows, options['batch_size'])
+        else:
+            count = self.import_symbols(options)
+
+        elapsed = time.perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            "Imported %d %s in %.2fs (%.0f rows/s)" % (count, options['dataset'], elapsed, count / max(elapsed, 1e-9))
+        ))
+
+    def import_symbols(self, options):
+        if not options['api_key']:
+            raise CommandError("A finnhub.io API key is required, pass --api-key or set FINNHUB_API_KEY.")
+
+        try:
+            exchange = FinnhubSupportedExchanges.objects.get(exchange_code=options['exchange'])
+        except FinnhubSupportedExchanges.DoesNotExist:
+            raise CommandError("Unknown exchange '%s', import the exchanges first." % options['exchange'])
+
+        try:
+            symbols = registry.get(options['api_key']).stock_symbols(exchange.exchange_code)
+        except FinnhubAPIException as e:
+            raise CommandError("Could not download symbols: %s" % e)
+
+        rows = [ingestion.build_symbol(symbol, exchange) for symbol in symbols]
+        return ingestion.upsert_symbols(rows, options['batch_size'])
@@ -0,0 +1,29 @@
+import os
+from django.core.management.base import BaseCommand, CommandError
+
+from finnhub_integration.client_registry import registry
+from finnhub_integration.news_worker import NewsWorker
+
+
+class Command(BaseCommand):
+    help = "Fetch and score the news of recently searched symbols in the background."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Poll once and exit instead of running forever.")
+        parser.add_argument('--threads', type=int, default=2, help="Number of threads fetching and scoring news.")
+        parser.add_argument('--interval', type=float, help="Seconds between two polls.")
+        parser.add_argument('--api-key', default=os.environ.get('FINNHUB_API_KEY'),
+                            help="finnhub.io API key, defaults to the FINNHUB_API_KEY environment variable.")
+
+    def handle(self, *args, **options):
+        if not options['api_key']:
+            raise CommandError("A finnhub.io API key is required, pass --api-key or set FINNHUB_API_KEY.")
+        if options['threads'] < 1:
+            raise CommandError("--threads must be at least 1.")
+
+        worker = NewsWorker(registry.get(options['api_key']), threads=options['threads'], interval=options['interval'])
+        if options['once']:
+            count = worker.run_once()
+            self.stdout.write("Refreshed the news of %d symbols" % count)
+        else:
+            worker.run_forever()
@@ -0,0 +1,47 @@
+import os
+import time
+from django.core.management.base import BaseCommand, CommandError
+from finnhub.exceptions import FinnhubAPIException
+
+from finnhub_integration import ingestion
+from finnhub_integration.client_registry import registry
+from finnhub_integration.models import FinnhubSupportedExchanges
+from finnhub_integration.rate_limit import PRIORITY_BULK, request_priority
+
+
+class Command(BaseCommand):
+    help = "Sync stored stock symbols with finnhub.io, writing only new, changed and delisted symbols."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exchange', action='append', dest='exchanges',
+                            help="Exchange code to sync, can be repeated. Defaults to every supported exchange.")
+        parser.add_argument('--api-key', default=os.environ.get('FINNHUB_API_KEY'),
+                            help="finnhub.io API key, defaults to the FINNHUB_API_KEY environment variable.")
+
+    def handle(self, *args, **options):
+        # Bulk imports only use the quota left over by searches and the news worker.
+        with request_priority(PRIORITY_BULK):
+            self._handle(**options)
+
+    def _handle(self, **options):
+        if not options['api_key']:
+            raise CommandError("A finnhub.io API key is required, pass --api-key or set FINNHUB_API_KEY.")
+
+        client = registry.get(options['api_key'])
+        exchanges = FinnhubSupportedExchanges.objects.order_by('exchange_code')
+        if options['exchanges']:
+            exchanges = exchanges.filter(exchange_code__in=options['exchanges'])
+
+        for exchange in exchanges:
+            start = time.perf_counter()
+            try:
+                symbols = client.stock_symbols(exchange.exchange_code)
+            except FinnhubAPIException as e:
+                self.stderr.write("%s: could not download symbols: %s" % (exchange.exchange_code, e))
+                continue
+
+            result = ingestion.sync_symbols(exchange, symbols)
+            self.stdout.write("%s: %d inserted, %d updated, %d delisted in %.2fs" % (
+                exchange.exchange_code, result['inserted'], result['updated'], result['delisted'],
+                time.perf_counter() - start,
+            ))
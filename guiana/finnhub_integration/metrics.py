@@ -0,0 +1,217 @@
+"""
+In-process metrics of the hot paths: finnhub.io calls, the response cache, sentiment scoring and database access.
+
+Every timed operation has a name, e.g. 'upstream.quote', 'nlp.sentiment' or 'db.find_symbol', under which its
+calls, errors, 429 responses and a latency histogram are kept. The response cache counts its fresh hits, stale
+hits and misses per endpoint. The totals are served as JSON by the metrics endpoint (see dashboard/views.py), and
+the timings of every request are also reported in its Server-Timing header by server_timing_middleware, so that
+the browser's developer tools show which part of a search is slow. Like the metrics endpoint, the header is only
+sent to staff, or to everyone when DEBUG is on.
+
+Metrics are kept per process: every worker reports its own.
+"""
+
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import threading
+import time
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.utils.decorators import sync_and_async_middleware
+
+
+# Upper bounds (in milliseconds) of the latency histograms' buckets, the last bucket being unbounded.
+LATENCY_BUCKETS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+CACHE_OUTCOMES = ('hit', 'stale', 'miss')
+
+
+class Histogram:
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float):
+        """
+        @return: The upper bound of the bucket of the q-quantile, or the largest observed value if it falls in the
+                 unbounded bucket. None if nothing was observed.
+        """
+
+        if not self.count:
+            return None
+        rank, seen = q * self.count, 0
+        for bound, count in zip(self.buckets, self.counts):
+            seen += count
+            if seen >= rank:
+                return bound
+        return round(self.max, 3)
+
+    def to_dict(self):
+        bounds = ['<=' + str(bound) for bound in self.buckets] + ['+Inf']
+        return {
+            'count': self.count,
+            'mean_ms': round(self.total / self.count, 3) if self.count else None,
+            'max_ms': round(self.max, 3),
+            'p50_ms': self.quantile(0.5),
+            'p95_ms': self.quantile(0.95),
+            'p99_ms': self.quantile(0.99),
+            'buckets': dict(zip(bounds, self.counts)),
+        }
+
+
+class Metrics:
+    def __init__(self):
+        self._timers = {}
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def observe(self, name: str, seconds: float, error: bool = False, throttled: bool = False):
+        """
+        Record a call of a timed operation, also adding it to the timings of the current request.
+        """
+
+        with self._lock:
+            timer = self._timers.get(name)
+            if timer is None:
+                timer = self._timers[name] = {'calls': 0, 'errors': 0, 'throttled': 0, 'latency': Histogram()}
+            timer['calls'] += 1
+            timer['errors'] += error
+            timer['throttled'] += throttled
+            timer['latency'].observe(seconds * 1000)
+
+        timings = _request_timings.get()
+        if timings is not None:
+            total, calls = timings.get(name, (0.0, 0))
+            timings[name] = (total + seconds, calls + 1)
+
+    def count_cache(self, endpoint: str, outcome: str):
+        """
+        Count a response cache lookup of an endpoint, whose outcome is one of CACHE_OUTCOMES.
+        """
+
+        with self._lock:
+            counts = self._cache.setdefault(endpoint, dict.fromkeys(CACHE_OUTCOMES, 0))
+            counts[outcome] += 1
+
+    def snapshot(self):
+        """
+        @return: A JSON serialisable copy of the metrics.
+        """
+
+        with self._lock:
+            timers = {
+                name: {'calls': timer['calls'], 'errors': timer['errors'], 'throttled': timer['throttled'],
+                       'latency': timer['latency'].to_dict()}
+                for name, timer in sorted(self._timers.items())
+            }
+            cache = {}
+            for endpoint, counts in sorted(self._cache.items()):
+                lookups = sum(counts.values())
+                # Stale hits are answered from the cache too, while being revalidated in the background.
+                cache[endpoint] = {**counts, 'hit_ratio': round((counts['hit'] + counts['stale']) / lookups, 4)}
+        return {'timers': timers, 'cache': cache}
+
+    def reset(self):
+        with self._lock:
+            self._timers.clear()
+            self._cache.clear()
+
+
+metrics = Metrics()
+
+# Total seconds and number of calls of every timed operation of the current request, by name.
+_request_timings = contextvars.ContextVar('finnhub_request_timings', default=None)
+
+
+@contextlib.contextmanager
+def timed(name: str):
+    """
+    Time the block as a call of the named operation. Exceptions raised by the block count as errors, and
+    finnhub.io's 429 Too Many Requests responses are also counted apart.
+    """
+
+    start = time.perf_counter()
+    error = throttled = False
+    try:
+        yield
+    except Exception as e:
+        error = True
+        throttled = getattr(e, 'status_code', None) == 429
+        raise
+    finally:
+        metrics.observe(name, time.perf_counter() - start, error=error, throttled=throttled)
+
+
+def upstream_name(path: str):
+    """
+    @return: The name finnhub.io calls of an API path are timed under, e.g. 'upstream.stock.profile2'.
+    """
+
+    return 'upstream' + (path.rstrip('/').replace('/', '.') or '.root')
+
+
+def format_server_timing(timings: dict, total: float):
+    """
+    @return: A Server-Timing header value with the timings of a request, in milliseconds.
+    """
+
+    entries = [
+        '{};dur={:.1f};desc="{} call{}"'.format(name, seconds * 1000, calls, '' if calls == 1 else 's')
+        for name, (seconds, calls) in sorted(timings.items())
+    ]
+    entries.append('total;dur={:.1f}'.format(total * 1000))
+    return ', '.join(entries)
+
+
+def _shows_server_timing(request):
+    # The user is set by the authentication middleware, which runs within this one.
+    user = getattr(request, 'user', None)
+    return settings.DEBUG or (user is not None and user.is_staff)
+
+
+@sync_and_async_middleware
+def server_timing_middleware(get_response):
+    """
+    Report the time a request spent in every timed operation in its Server-Timing header. Calls made
+    concurrently overlap, so their durations may add up to more than the total.
+    """
+
+    def finish(response, timings: dict, start: float):
+        response['Server-Timing'] = format_server_timing(timings, time.perf_counter() - start)
+        return response
+
+    if asyncio.iscoroutinefunction(get_response):
+        async def middleware(request):
+            start, timings = time.perf_counter(), {}
+            token = _request_timings.set(timings)
+            try:
+                response = await get_response(request)
+                # Loading the user may query the session and the user tables.
+                if await sync_to_async(_shows_server_timing)(request):
+                    finish(response, timings, start)
+                return response
+            finally:
+                _request_timings.reset(token)
+    else:
+        def middleware(request):
+            start, timings = time.perf_counter(), {}
+            token = _request_timings.set(timings)
+            try:
+                response = get_response(request)
+                if _shows_server_timing(request):
+                    finish(response, timings, start)
+                return response
+            finally:
+                _request_timings.reset(token)
+    return middleware
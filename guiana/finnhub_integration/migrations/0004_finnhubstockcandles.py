@@ -0,0 +1,32 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:30
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finnhub_integration', '0003_finnhubsupportedstocksymbols'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinnhubStockCandles',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('candle_resolution', models.CharField(max_length=2)),
+                ('candle_timestamp', models.BigIntegerField()),
+                ('candle_open', models.FloatField()),
+                ('candle_high', models.FloatField()),
+                ('candle_low', models.FloatField()),
+                ('candle_close', models.FloatField()),
+                ('candle_volume', models.FloatField()),
+                ('candle_symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finnhub_integration.finnhubsupportedstocksymbols')),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='finnhubstockcandles',
+            constraint=models.UniqueConstraint(fields=('candle_symbol', 'candle_resolution', 'candle_timestamp'), name='unique_symbol_resolution_timestamp'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finnhub_integration', '0004_finnhubstockcandles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='finnhubsupportedstocksymbols',
+            name='symbol_delisted',
+            field=models.BooleanField(default=False),
+        ),
+    ]
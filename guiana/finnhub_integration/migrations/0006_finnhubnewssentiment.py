@@ -0,0 +1,23 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finnhub_integration', '0005_finnhubsupportedstocksymbols_symbol_delisted'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FinnhubNewsSentiment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sentiment_key', models.CharField(max_length=80, unique=True)),
+                ('sentiment_model_version', models.CharField(max_length=100)),
+                ('sentiment_polarity', models.FloatField()),
+                ('sentiment_subjectivity', models.FloatField()),
+            ],
+        ),
+    ]
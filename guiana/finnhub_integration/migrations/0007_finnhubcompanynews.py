@@ -0,0 +1,49 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:37
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finnhub_integration', '0006_finnhubnewssentiment'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='finnhubsupportedstocksymbols',
+            name='symbol_last_searched',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='finnhubsupportedstocksymbols',
+            name='symbol_news_updated',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='FinnhubCompanyNews',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('news_id', models.BigIntegerField()),
+                ('news_datetime', models.BigIntegerField()),
+                ('news_headline', models.TextField(blank=True, null=True)),
+                ('news_summary', models.TextField(blank=True, null=True)),
+                ('news_source', models.CharField(blank=True, max_length=100, null=True)),
+                ('news_url', models.TextField(blank=True, null=True)),
+                ('news_image', models.TextField(blank=True, null=True)),
+                ('news_category', models.CharField(blank=True, max_length=100, null=True)),
+                ('news_polarity', models.FloatField()),
+                ('news_subjectivity', models.FloatField()),
+                ('news_symbol', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='finnhub_integration.finnhubsupportedstocksymbols')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='finnhubcompanynews',
+            index=models.Index(fields=['news_symbol', 'news_datetime'], name='news_symbol_datetime_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='finnhubcompanynews',
+            constraint=models.UniqueConstraint(fields=('news_symbol', 'news_id'), name='unique_symbol_news_id'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.2 on 2026-10-18 15:58
+
+from django.db import migrations, models
+import django.db.models.functions.text
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finnhub_integration', '0007_finnhubcompanynews'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='finnhubsupportedstocksymbols',
+            index=models.Index(fields=['symbol_exchange_code', 'symbol_type'], name='symbol_exchange_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='finnhubsupportedstocksymbols',
+            index=models.Index(django.db.models.functions.text.Upper('symbol_name'), name='symbol_upper_name_idx'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Upper
 
 
 class FinnhubSupportedExchanges(models.Model):
@@ -8,6 +9,20 @@ class FinnhubSupportedExchanges(models.Model):
     exchange_country = models.CharField(max_length=100, blank=False, null=True, unique=False)
 
 
+class FinnhubSupportedStockSymbolsQuerySet(models.QuerySet):
+    def resolve(self, symbol: str):
+        """
+        Look a symbol up by name, case-insensitively, fetching its exchange in the same query.
+
+        @return: The symbol, or None if there's no such symbol.
+        """
+
+        # Filtering on Upper('symbol_name') is answered by the symbol_upper_name_idx index.
+        return self.select_related('symbol_exchange_code').alias(upper_name=Upper('symbol_name')).filter(
+            upper_name=symbol.upper()
+        ).first()
+
+
 class FinnhubSupportedStockSymbols(models.Model):
     symbol_exchange_code = models.ForeignKey(FinnhubSupportedExchanges, on_delete=models.CASCADE)
     symbol_currency = models.CharField(max_length=100, blank=False, null=True, unique=False)
@@ -16,4 +31,79 @@ class FinnhubSupportedStockSymbols(models.Model):
 
     # Normally symbol_display_sym should be the same as symbol_name
     symbol_display_sym = models.CharField(max_length=100, blank=True, null=True, unique=True)
-    symbol_name = models.CharField(max_length=100, blank=True, null=True, unique=True)
\ No newline at end of file
+    symbol_name = models.CharField(max_length=100, blank=True, null=True, unique=True)
+
+    # Set when the symbol is no longer listed by finnhub.io. Delisted symbols are kept, so that their stored
+    # candles are not lost.
+    symbol_delisted = models.BooleanField(default=False)
+
+    # When the symbol was last searched for, used to pick the symbols whose news are fetched in the background
+    symbol_last_searched = models.DateTimeField(blank=True, null=True, unique=False)
+
+    # When the symbol's news were last fetched and scored
+    symbol_news_updated = models.DateTimeField(blank=True, null=True, unique=False)
+
+    objects = FinnhubSupportedStockSymbolsQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['symbol_exchange_code', 'symbol_type'], name='symbol_exchange_type_idx'),
+            models.Index(Upper('symbol_name'), name='symbol_upper_name_idx'),
+        ]
+
+
+class FinnhubStockCandles(models.Model):
+    candle_symbol = models.ForeignKey(FinnhubSupportedStockSymbols, on_delete=models.CASCADE)
+
+    # Finnhub resolution of the bar, e.g. 'D' for daily or '1' for one-minute bars
+    candle_resolution = models.CharField(max_length=2, blank=False, null=False, unique=False)
+
+    # UNIX timestamp (in seconds) of the start of the bar
+    candle_timestamp = models.BigIntegerField(blank=False, null=False, unique=False)
+    candle_open = models.FloatField(blank=False, null=False, unique=False)
+    candle_high = models.FloatField(blank=False, null=False, unique=False)
+    candle_low = models.FloatField(blank=False, null=False, unique=False)
+    candle_close = models.FloatField(blank=False, null=False, unique=False)
+    candle_volume = models.FloatField(blank=False, null=False, unique=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['candle_symbol', 'candle_resolution', 'candle_timestamp'],
+                name='unique_symbol_resolution_timestamp',
+            ),
+        ]
+
+
+class FinnhubNewsSentiment(models.Model):
+    # Finnhub article id when known ('id:<id>'), otherwise the digest of the article's summary ('sha256:<digest>')
+    sentiment_key = models.CharField(max_length=80, blank=False, null=False, unique=True)
+
+    # Identifies the pipeline that computed the scores, so that scores of a previous model are recomputed
+    sentiment_model_version = models.CharField(max_length=100, blank=False, null=False, unique=False)
+    sentiment_polarity = models.FloatField(blank=False, null=False, unique=False)
+    sentiment_subjectivity = models.FloatField(blank=False, null=False, unique=False)
+
+
+class FinnhubCompanyNews(models.Model):
+    news_symbol = models.ForeignKey(FinnhubSupportedStockSymbols, on_delete=models.CASCADE)
+    news_id = models.BigIntegerField(blank=False, null=False, unique=False)
+
+    # UNIX timestamp (in seconds) of the publication of the article
+    news_datetime = models.BigIntegerField(blank=False, null=False, unique=False)
+    news_headline = models.TextField(blank=True, null=True, unique=False)
+    news_summary = models.TextField(blank=True, null=True, unique=False)
+    news_source = models.CharField(max_length=100, blank=True, null=True, unique=False)
+    news_url = models.TextField(blank=True, null=True, unique=False)
+    news_image = models.TextField(blank=True, null=True, unique=False)
+    news_category = models.CharField(max_length=100, blank=True, null=True, unique=False)
+    news_polarity = models.FloatField(blank=False, null=False, unique=False)
+    news_subjectivity = models.FloatField(blank=False, null=False, unique=False)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['news_symbol', 'news_id'], name='unique_symbol_news_id'),
+        ]
+        indexes = [
+            models.Index(fields=['news_symbol', 'news_datetime'], name='news_symbol_datetime_idx'),
+        ]
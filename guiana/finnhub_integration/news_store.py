@@ -0,0 +1,140 @@
+"""
+Local store of company news and their sentiment scores.
+
+News are fetched and scored ahead of time by the news worker (see news_worker.py) for the symbols users search
+for, so that symbol searches only need to read them from the database.
+"""
+
+import datetime
+import hashlib
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Avg
+from django.utils import timezone
+
+from finnhub_integration import sentiment_store
+from finnhub_integration.models import FinnhubCompanyNews, FinnhubSupportedStockSymbols
+
+
+# Days of news fetched and kept for every symbol.
+NEWS_DAYS = 7
+
+NEWS_FIELDS = ('news_id', 'news_datetime', 'news_headline', 'news_summary', 'news_source', 'news_url',
+               'news_image', 'news_category', 'news_polarity', 'news_subjectivity')
+
+
+def _news_id(news: dict):
+    if news.get('id'):
+        return news['id']
+    # Articles without an id get a stable one derived from their url.
+    return int(hashlib.sha256(news.get('url', '').encode()).hexdigest()[:15], 16)
+
+
+def is_fresh(symbol_obj: FinnhubSupportedStockSymbols):
+    """
+    @return: True if the symbol's stored news are recent enough to be served without fetching them again.
+    """
+
+    max_age = datetime.timedelta(seconds=settings.FINNHUB_NEWS_MAX_AGE)
+    return symbol_obj.symbol_news_updated is not None and timezone.now() - symbol_obj.symbol_news_updated < max_age
+
+
+def news_date_range():
+    """
+    @return: The (from, to) dates of the company_news request covering the last NEWS_DAYS days.
+    """
+
+    today = timezone.now().date()
+    return str(today - datetime.timedelta(days=NEWS_DAYS)), str(today)
+
+
+def update_news(client, symbol_obj: FinnhubSupportedStockSymbols, nlp=None):
+    """
+    Fetch the last NEWS_DAYS days of news of a symbol from finnhub.io, score them and store them.
+
+    @param client: An initialized finnhub.io client.
+    @param nlp: Pipeline built by sentiment.load_pipeline, or None for the shared pipeline.
+    @return: The number of articles stored.
+    """
+
+    _from, to = news_date_range()
+    return store_news(symbol_obj, client.company_news(symbol_obj.symbol_name, _from=_from, to=to), nlp)
+
+
+def store_news(symbol_obj: FinnhubSupportedStockSymbols, all_news: list, nlp=None):
+    """
+    Score a symbol's news, as fetched from finnhub.io's company_news, and store them.
+
+    @param nlp: Pipeline built by sentiment.load_pipeline, or None for the shared pipeline.
+    @return: The number of articles stored.
+    """
+
+    scores = sentiment_store.score_articles(all_news, nlp)
+
+    rows = {}
+    for news, (polarity, subjectivity) in zip(all_news, scores):
+        news_id = _news_id(news)
+        rows[news_id] = FinnhubCompanyNews(
+            news_symbol=symbol_obj,
+            news_id=news_id,
+            news_datetime=news['datetime'],
+            news_headline=news.get('headline'),
+            news_summary=news.get('summary'),
+            news_source=news.get('source'),
+            news_url=news.get('url'),
+            news_image=news.get('image'),
+            news_category=news.get('category'),
+            news_polarity=polarity,
+            news_subjectivity=subjectivity,
+        )
+
+    now = timezone.now()
+    with transaction.atomic():
+        # Django 4.1 uses unique_fields as column names in the ON CONFLICT clause, hence 'news_symbol_id'.
+        FinnhubCompanyNews.objects.bulk_create(
+            list(rows.values()),
+            update_conflicts=True,
+            unique_fields=['news_symbol_id', 'news_id'],
+            update_fields=list(NEWS_FIELDS[1:]),
+        )
+        FinnhubSupportedStockSymbols.objects.filter(pk=symbol_obj.pk).update(symbol_news_updated=now)
+    symbol_obj.symbol_news_updated = now
+    return len(rows)
+
+
+def _news_queryset(symbol_obj: FinnhubSupportedStockSymbols):
+    since = timezone.now() - datetime.timedelta(days=NEWS_DAYS)
+    return FinnhubCompanyNews.objects.filter(news_symbol=symbol_obj, news_datetime__gte=int(since.timestamp()))
+
+
+def load_news(symbol_obj: FinnhubSupportedStockSymbols):
+    """
+    Read a symbol's stored news, newest first, in the shape of finnhub.io's company_news response with the
+    article's 'polarity' and 'subjectivity' added.
+    """
+
+    return [
+        {field[len('news_'):]: value for field, value in zip(NEWS_FIELDS, row)}
+        for row in _news_queryset(symbol_obj).order_by('-news_datetime').values_list(*NEWS_FIELDS)
+    ]
+
+
+def load_news_averages(symbol_obj: FinnhubSupportedStockSymbols):
+    """
+    @return: The average (polarity, subjectivity) of a symbol's stored news, or (None, None) without news.
+    """
+
+    averages = _news_queryset(symbol_obj).aggregate(polarity=Avg('news_polarity'),
+                                                    subjectivity=Avg('news_subjectivity'))
+    return averages['polarity'], averages['subjectivity']
+
+
+def purge_old_news():
+    """
+    Delete the stored news that are older than NEWS_DAYS days.
+
+    @return: The number of articles deleted.
+    """
+
+    since = timezone.now() - datetime.timedelta(days=NEWS_DAYS)
+    return FinnhubCompanyNews.objects.filter(news_datetime__lt=int(since.timestamp())).delete()[0]
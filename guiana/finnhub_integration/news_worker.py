@@ -0,0 +1,115 @@
+"""
+Background worker that keeps the news of recently searched symbols fetched and scored.
+
+Symbols due for a refresh are put on a local in-process queue and handled by a few threads, so no external
+broker is needed. The worker is run with the run_news_worker management command.
+"""
+
+import datetime
+import logging
+import queue
+import threading
+import time
+from django.conf import settings
+from django.db import close_old_connections, connections
+from django.utils import timezone
+
+from finnhub_integration import news_store, sentiment
+from finnhub_integration.models import FinnhubSupportedStockSymbols
+from finnhub_integration.rate_limit import PRIORITY_BACKGROUND, request_priority
+
+
+logger = logging.getLogger(__name__)
+
+
+class NewsWorker:
+    def __init__(self, client, threads: int = 2, interval: float = None, lookback: float = None):
+        """
+        @param client: An initialized finnhub.io client.
+        @param threads: Number of threads fetching and scoring news, at least 1.
+        @param interval: Seconds between two polls, defaults to settings.FINNHUB_NEWS_WORKER_INTERVAL.
+        @param lookback: Seconds since their last search for symbols to be kept up to date, defaults to
+                         settings.FINNHUB_NEWS_WORKER_LOOKBACK.
+        """
+
+        if threads < 1:
+            # Without threads, nothing would drain the queue run_once waits on.
+            raise ValueError("A news worker needs at least 1 thread, not %d." % threads)
+
+        self.client = client
+        self.threads = threads
+        self.interval = settings.FINNHUB_NEWS_WORKER_INTERVAL if interval is None else interval
+        self.lookback = settings.FINNHUB_NEWS_WORKER_LOOKBACK if lookback is None else lookback
+        self.queue = queue.Queue()
+
+    def tracked_symbols(self):
+        """
+        @return: The symbols whose news are kept up to date.
+        """
+
+        since = timezone.now() - datetime.timedelta(seconds=self.lookback)
+        return FinnhubSupportedStockSymbols.objects.filter(symbol_delisted=False, symbol_last_searched__gte=since)
+
+    def due_symbols(self):
+        """
+        @return: The tracked symbols whose stored news will be stale before the next poll.
+        """
+
+        stale_before = timezone.now() - datetime.timedelta(seconds=settings.FINNHUB_NEWS_MAX_AGE - self.interval)
+        return [
+            symbol_obj for symbol_obj in self.tracked_symbols()
+            if symbol_obj.symbol_news_updated is None or symbol_obj.symbol_news_updated < stale_before
+        ]
+
+    def run_once(self):
+        """
+        Refresh the news of every due symbol, then purge old news.
+
+        @return: The number of symbols refreshed.
+        """
+
+        symbols = self.due_symbols()
+        for symbol_obj in symbols:
+            self.queue.put(symbol_obj)
+
+        workers = [threading.Thread(target=self._work, daemon=True) for _ in range(min(self.threads, len(symbols)))]
+        for worker in workers:
+            worker.start()
+        self.queue.join()
+        for worker in workers:
+            self.queue.put(None)
+        for worker in workers:
+            worker.join()
+
+        news_store.purge_old_news()
+        return len(symbols)
+
+    def run_forever(self):
+        # Load the sentiment model before the first poll instead of in the middle of it.
+        sentiment.preload()
+        while True:
+            start = time.monotonic()
+            count = self.run_once()
+            logger.info("Refreshed the news of %d symbols in %.2fs", count, time.monotonic() - start)
+            close_old_connections()
+            time.sleep(max(0, self.interval - (time.monotonic() - start)))
+
+    def _work(self):
+        try:
+            with request_priority(PRIORITY_BACKGROUND):
+                self._drain_queue()
+        finally:
+            # Every thread has its own database connection.
+            connections.close_all()
+
+    def _drain_queue(self):
+        while True:
+            symbol_obj = self.queue.get()
+            try:
+                if symbol_obj is None:
+                    return
+                news_store.update_news(self.client, symbol_obj)
+            except Exception as e:
+                logger.warning("Could not refresh the news of %s: %r", symbol_obj.symbol_name, e)
+            finally:
+                self.queue.task_done()
@@ -0,0 +1,183 @@
+"""
+Client-side rate limiting of finnhub.io calls.
+
+All calls made with the same API key share a token bucket sized after the key's quota (FINNHUB_RATE_LIMIT in
+settings). When the bucket is empty, callers queue up by priority: symbol searches made on behalf of a user go
+first, the news worker next, and bulk symbol imports last. Calls rejected with a 429 or a 5xx are retried with
+jittered exponential backoff.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import random
+import threading
+import time
+from django.conf import settings
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_BULK = 2
+
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: 'interactive', PRIORITY_BACKGROUND: 'background', PRIORITY_BULK: 'bulk'}
+
+# Seconds a call may wait for a token before giving up, per priority. Lower priority calls wait for as long as
+# it takes.
+ACQUIRE_TIMEOUTS = {PRIORITY_INTERACTIVE: 10, PRIORITY_BACKGROUND: None, PRIORITY_BULK: None}
+
+_priority = contextvars.ContextVar('finnhub_priority', default=PRIORITY_INTERACTIVE)
+
+
+def get_priority():
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def request_priority(priority: int):
+    """
+    Make the finnhub.io calls of the current thread (or task) within the block use the given priority.
+    """
+
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def backoff_delay(attempt: int, base: float = None, cap: float = None):
+    """
+    @return: A random delay in seconds before retry number attempt (0-based), using "full jitter" exponential
+             backoff.
+    """
+
+    base = settings.FINNHUB_RATE_LIMIT['backoff_base'] if base is None else base
+    cap = settings.FINNHUB_RATE_LIMIT['backoff_cap'] if cap is None else cap
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    def __init__(self, calls: int = None, period: float = None, burst: int = None):
+        """
+        Construct a token bucket refilled with `calls` tokens every `period` seconds, holding at most `burst`
+        tokens. Defaults come from settings.FINNHUB_RATE_LIMIT.
+        """
+
+        limits = settings.FINNHUB_RATE_LIMIT
+        self.rate = (limits['calls'] if calls is None else calls) / (limits['period'] if period is None else period)
+        self.capacity = limits['burst'] if burst is None else burst
+
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._waiters = []
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+
+        self.acquired = {priority: 0 for priority in PRIORITY_NAMES}
+        self.rejected = {priority: 0 for priority in PRIORITY_NAMES}
+        self.wait_time = {priority: 0.0 for priority in PRIORITY_NAMES}
+        self.throttled = 0
+        self.retries = 0
+
+    def _refill(self, now: float):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self, priority: int = None, timeout: float = None):
+        """
+        Take a token, waiting behind the callers of the same or a higher priority if the bucket is empty.
+
+        @param priority: One of the PRIORITY_* constants, defaults to the priority of the current context.
+        @param timeout: Seconds to wait at most, or None to wait for as long as it takes.
+        @return: True if a token was taken, False if the timeout expired first.
+        """
+
+        priority = get_priority() if priority is None else priority
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+        waiter = (priority, next(self._sequence))
+
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    self._refill(now)
+                    if self._waiters[0] == waiter and self._tokens >= 1:
+                        self._tokens -= 1
+                        self.acquired[priority] += 1
+                        self.wait_time[priority] += now - start
+                        return True
+
+                    if deadline is not None and now >= deadline:
+                        self.rejected[priority] += 1
+                        return False
+
+                    wait = (1 - self._tokens) / self.rate if self._tokens < 1 else None
+                    if deadline is not None:
+                        wait = deadline - now if wait is None else min(wait, deadline - now)
+                    self._condition.wait(wait)
+            finally:
+                self._waiters.remove(waiter)
+                heapq.heapify(self._waiters)
+                # The next caller in line may be able to take a token now.
+                self._condition.notify_all()
+
+    async def acquire_async(self, priority: int = None, timeout: float = None):
+        """
+        Async counterpart of acquire for calls made from an event loop. Rather than queueing up, it polls the
+        bucket while sleeping, so it never blocks the loop's thread. A token is only taken when no thread of
+        the same or a higher priority is waiting for one.
+
+        @return: True if a token was taken, False if the timeout expired first.
+        """
+
+        priority = get_priority() if priority is None else priority
+        start = time.monotonic()
+        deadline = None if timeout is None else start + timeout
+
+        while True:
+            with self._condition:
+                now = time.monotonic()
+                self._refill(now)
+                ahead = self._waiters and self._waiters[0][0] <= priority
+                if not ahead and self._tokens >= 1:
+                    self._tokens -= 1
+                    self.acquired[priority] += 1
+                    self.wait_time[priority] += now - start
+                    return True
+
+                if deadline is not None and now >= deadline:
+                    self.rejected[priority] += 1
+                    return False
+
+                # Sleep until the next token is due, or for a token's worth of time if threads are ahead in line.
+                wait = (1 - self._tokens) / self.rate if self._tokens < 1 else 1 / self.rate
+                if deadline is not None:
+                    wait = min(wait, deadline - now)
+            await asyncio.sleep(wait)
+
+    def queue_depth(self):
+        """
+        @return: The number of callers waiting for a token, per priority name.
+        """
+
+        with self._condition:
+            depth = {name: 0 for name in PRIORITY_NAMES.values()}
+            for priority, _ in self._waiters:
+                depth[PRIORITY_NAMES[priority]] += 1
+            return depth
+
+    def stats(self):
+        return {
+            'tokens': round(self._tokens, 2),
+            'queue_depth': self.queue_depth(),
+            'acquired': {PRIORITY_NAMES[p]: count for p, count in self.acquired.items()},
+            'rejected': {PRIORITY_NAMES[p]: count for p, count in self.rejected.items()},
+            'wait_time': {PRIORITY_NAMES[p]: round(seconds, 3) for p, seconds in self.wait_time.items()},
+            'throttled': self.throttled,
+            'retries': self.retries,
+        }
@@ -0,0 +1,288 @@
+"""
+Two-tier cache for finnhub.io responses.
+
+Responses are first looked up in a small in-process LRU and then in Django's cache framework, which may
+be shared between processes. Every endpoint has its own TTLs (see FINNHUB_CACHE_TTLS in settings):
+    - fresh: seconds a response is served without asking finnhub.io again.
+    - stale: further seconds a response may still be served while it is refreshed in the background.
+
+Concurrent misses for the same key are coalesced, so only one upstream request is made for them. Coroutine
+getters (see async_client.py) are cached the same way, sharing the cached responses of their sync counterparts.
+"""
+
+import asyncio
+import functools
+import inspect
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.core.cache import cache
+
+from finnhub_integration.metrics import metrics
+from finnhub_integration.rate_limit import PRIORITY_BACKGROUND, request_priority
+
+
+# TTLs of endpoints missing from settings.FINNHUB_CACHE_TTLS: their responses aren't cached.
+NO_TTLS = {'fresh': 0, 'stale': 0}
+
+
+def get_endpoint_ttls(endpoint: str):
+    """
+    @return: The endpoint's (fresh, stale) TTLs in seconds, from settings.FINNHUB_CACHE_TTLS.
+    """
+
+    ttls = {**NO_TTLS, **getattr(settings, 'FINNHUB_CACHE_TTLS', {}).get(endpoint, {})}
+    return ttls['fresh'], ttls['stale']
+
+
+class _Flight:
+    """
+    An upstream fetch in progress that other callers can wait on.
+    """
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.value = None
+        self.error = None
+
+
+class TieredResponseCache:
+    # Number of responses kept in the in-process LRU tier.
+    MAX_ENTRIES = 512
+
+    def __init__(self, max_entries: int = None):
+        self.max_entries = self.MAX_ENTRIES if max_entries is None else max_entries
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._async_inflight = {}
+        self._async_tasks = set()
+        self._lock = threading.Lock()
+        self._revalidator = ThreadPoolExecutor(max_workers=4, thread_name_prefix='finnhub-revalidate')
+
+    @staticmethod
+    def make_key(endpoint: str, args: tuple):
+        return 'finnhub:' + ':'.join([endpoint] + [str(arg) for arg in args])
+
+    def get_or_fetch(self, endpoint: str, args: tuple, fetch):
+        """
+        Return the cached response for an endpoint call, fetching it when missing or expired.
+
+        @param endpoint: Name of the endpoint, used to look up its TTLs.
+        @param args: Arguments identifying the response, e.g. the symbol.
+        @param fetch: Function without arguments that fetches the response from upstream.
+        """
+
+        key = self.make_key(endpoint, args)
+        entry = self._lookup(key)
+        now = time.time()
+
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                metrics.count_cache(endpoint, 'hit')
+                return value
+            if now < stale_until:
+                metrics.count_cache(endpoint, 'stale')
+                self._revalidate(endpoint, key, fetch)
+                return value
+        metrics.count_cache(endpoint, 'miss')
+        return self._fetch_coalesced(endpoint, key, fetch)
+
+    async def aget_or_fetch(self, endpoint: str, args: tuple, fetch):
+        """
+        Async counterpart of get_or_fetch.
+
+        @param fetch: Coroutine function without arguments that fetches the response from upstream.
+        """
+
+        key = self.make_key(endpoint, args)
+        entry = await self._alookup(key)
+        now = time.time()
+
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                metrics.count_cache(endpoint, 'hit')
+                return value
+            if now < stale_until:
+                metrics.count_cache(endpoint, 'stale')
+                self._arevalidate(endpoint, key, fetch)
+                return value
+        metrics.count_cache(endpoint, 'miss')
+        return await self._afetch_coalesced(endpoint, key, fetch)
+
+    async def aget_cached(self, endpoint: str, args: tuple, fetch):
+        """
+        Return the cached response for an endpoint call without waiting on upstream. Missing and expired responses
+        are fetched in the background, at background priority, for later calls.
+
+        @param fetch: Coroutine function without arguments that fetches the response from upstream.
+        @return: The cached response, stale ones included, or None if there's none.
+        """
+
+        key = self.make_key(endpoint, args)
+        entry = await self._alookup(key)
+        now = time.time()
+
+        if entry is not None:
+            value, fresh_until, stale_until = entry
+            if now < fresh_until:
+                metrics.count_cache(endpoint, 'hit')
+                return value
+            if now < stale_until:
+                metrics.count_cache(endpoint, 'stale')
+                self._arevalidate(endpoint, key, fetch)
+                return value
+        metrics.count_cache(endpoint, 'miss')
+        self._arevalidate(endpoint, key, fetch)
+        return None
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._entries)
+            self._entries.clear()
+        cache.delete_many(keys)
+
+    def _lookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = cache.get(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    async def _alookup(self, key: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+
+        entry = await cache.aget(key)
+        if entry is not None:
+            self._remember(key, entry)
+        return entry
+
+    def _remember(self, key: str, entry: tuple):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def _store(self, endpoint: str, key: str, value):
+        fresh, stale = get_endpoint_ttls(endpoint)
+        now = time.time()
+        entry = (value, now + fresh, now + fresh + stale)
+        self._remember(key, entry)
+        cache.set(key, entry, timeout=fresh + stale)
+
+    async def _astore(self, endpoint: str, key: str, value):
+        fresh, stale = get_endpoint_ttls(endpoint)
+        now = time.time()
+        entry = (value, now + fresh, now + fresh + stale)
+        self._remember(key, entry)
+        await cache.aset(key, entry, timeout=fresh + stale)
+
+    def _fetch_coalesced(self, endpoint: str, key: str, fetch):
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = _Flight()
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.value
+
+        try:
+            flight.value = fetch()
+            self._store(endpoint, key, flight.value)
+            return flight.value
+        except Exception as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            flight.event.set()
+
+    def _revalidate(self, endpoint: str, key: str, fetch):
+        with self._lock:
+            if key in self._inflight:
+                return
+
+        def refresh():
+            try:
+                # Nobody is waiting on the refresh, so it shouldn't hold up searches.
+                with request_priority(PRIORITY_BACKGROUND):
+                    self._fetch_coalesced(endpoint, key, fetch)
+            except Exception:
+                # The stale response keeps being served until it expires or a refresh succeeds.
+                pass
+
+        self._revalidator.submit(refresh)
+
+
+    async def _afetch_and_store(self, endpoint: str, key: str, fetch):
+        value = await fetch()
+        await self._astore(endpoint, key, value)
+        return value
+
+    async def _afetch_coalesced(self, endpoint: str, key: str, fetch):
+        # Tasks belong to their event loop, so async callers are only coalesced with the ones of the same loop.
+        flight_key = (asyncio.get_running_loop(), key)
+        flight = self._async_inflight.get(flight_key)
+        if flight is None:
+            flight = asyncio.ensure_future(self._afetch_and_store(endpoint, key, fetch))
+            self._async_inflight[flight_key] = flight
+            flight.add_done_callback(lambda _: self._async_inflight.pop(flight_key, None))
+        # Shielded, so that a caller being cancelled doesn't cancel the fetch for everyone else.
+        return await asyncio.shield(flight)
+
+    def _arevalidate(self, endpoint: str, key: str, fetch):
+        if (asyncio.get_running_loop(), key) in self._async_inflight:
+            return
+
+        async def refresh():
+            try:
+                with request_priority(PRIORITY_BACKGROUND):
+                    await self._afetch_coalesced(endpoint, key, fetch)
+            except Exception:
+                pass
+
+        # The event loop only keeps weak references to its tasks.
+        task = asyncio.get_running_loop().create_task(refresh())
+        self._async_tasks.add(task)
+        task.add_done_callback(self._async_tasks.discard)
+
+
+response_cache = TieredResponseCache()
+
+
+def cached_endpoint(endpoint: str):
+    """
+    Decorate a FinnhubClient getter, sync or async, so that its responses go through the shared response cache.
+    The getter's positional arguments identify the cached response.
+    """
+
+    def decorator(method):
+        if inspect.iscoroutinefunction(method):
+            @functools.wraps(method)
+            async def async_wrapper(self, *args):
+                return await response_cache.aget_or_fetch(endpoint, args, lambda: method(self, *args))
+            return async_wrapper
+
+        @functools.wraps(method)
+        def wrapper(self, *args):
+            return response_cache.get_or_fetch(endpoint, args, lambda: method(self, *args))
+        return wrapper
+    return decorator
@@ -0,0 +1,120 @@
+"""
+Batched sentiment analysis of news summaries with spaCy and spacytextblob.
+
+TextBlob's polarity and subjectivity are computed from the raw text only, so the default FINNHUB_SENTIMENT_MODEL
+is the blank 'blank:en' pipeline, which yields the same scores as a trained model without loading its vectors
+(some 600 MB for en_core_web_lg). When a trained model is configured anyway, every trained component (tagger,
+parser, NER, ...) is excluded from its pipeline.
+
+The pipeline is loaded on first use and shared by the whole process. spaCy itself is only imported at that
+point too, so web requests and management commands that never score news don't pay for it. Pre-forking
+servers can call preload() (or set FINNHUB_SENTIMENT_PRELOAD) to load it once before forking workers.
+"""
+
+import threading
+from django.conf import settings
+
+from finnhub_integration.metrics import timed
+
+
+# Trained components of the en_core_web_* models, none of which TextBlob needs.
+UNUSED_COMPONENTS = ['tok2vec', 'tagger', 'morphologizer', 'parser', 'attribute_ruler', 'lemmatizer', 'ner', 'senter']
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def sentiment_scores(doc):
+    """
+    Keep only the (polarity, subjectivity) floats of the TextBlob sentiment. Unlike TextBlob objects they can
+    be sent back from the worker processes used when scoring with n_process > 1.
+    """
+
+    sentiment = doc._.blob.sentiment
+    doc._.sentiment_scores = (sentiment.polarity, sentiment.subjectivity)
+    doc._.blob = None
+    return doc
+
+
+def _register_components():
+    from spacy.language import Language
+    from spacy.tokens import Doc
+    from spacytextblob.spacytextblob import SpacyTextBlob  # Registers the 'spacytextblob' factory.
+
+    if not Doc.has_extension('sentiment_scores'):
+        Doc.set_extension('sentiment_scores', default=None)
+    if 'sentiment_scores' not in Language.factories:
+        Language.component('sentiment_scores', func=sentiment_scores)
+
+
+def load_pipeline(model_name: str = None):
+    """
+    Load a spaCy pipeline that only computes TextBlob sentiment.
+
+    @param model_name: Name of an installed spaCy model, or 'blank:<lang>' for a blank pipeline. Defaults to
+                       settings.FINNHUB_SENTIMENT_MODEL.
+    """
+
+    import spacy
+
+    _register_components()
+    model_name = model_name or settings.FINNHUB_SENTIMENT_MODEL
+    if model_name.startswith('blank:'):
+        nlp = spacy.blank(model_name.split(':', 1)[1])
+    else:
+        nlp = spacy.load(model_name, exclude=UNUSED_COMPONENTS)
+    nlp.add_pipe('spacytextblob')
+    nlp.add_pipe('sentiment_scores')
+    return nlp
+
+
+def get_pipeline():
+    """
+    @return: The process-wide sentiment pipeline, loading it on first use.
+    """
+
+    global _pipeline
+    if _pipeline is None:
+        with _pipeline_lock:
+            if _pipeline is None:
+                _pipeline = load_pipeline()
+    return _pipeline
+
+
+def reset_pipeline():
+    """
+    Forget the shared pipeline, so that the next get_pipeline call loads it again.
+    """
+
+    global _pipeline
+    with _pipeline_lock:
+        _pipeline = None
+
+
+def preload():
+    """
+    Load the shared pipeline ahead of the first request, e.g. from a server's pre-fork hook.
+    """
+
+    get_pipeline()
+
+
+def score_texts(nlp, texts: list, batch_size: int = None, n_process: int = None):
+    """
+    Score texts in batches with nlp.pipe.
+
+    @param nlp: Pipeline built by load_pipeline, or None for the shared pipeline.
+    @param batch_size: Number of texts per batch, defaults to settings.FINNHUB_SENTIMENT_BATCH_SIZE.
+    @param n_process: Number of worker processes, defaults to settings.FINNHUB_SENTIMENT_N_PROCESS.
+    @return: A list with the (polarity, subjectivity) of each text, in order.
+    """
+
+    if not texts:
+        return []
+
+    nlp = nlp or get_pipeline()
+    batch_size = batch_size or settings.FINNHUB_SENTIMENT_BATCH_SIZE
+    n_process = n_process or settings.FINNHUB_SENTIMENT_N_PROCESS
+    with timed('nlp.sentiment'):
+        # Scores come back from worker processes as lists, so they are turned back into tuples.
+        return [tuple(doc._.sentiment_scores) for doc in nlp.pipe(texts, batch_size=batch_size, n_process=n_process)]
@@ -0,0 +1,82 @@
+"""
+Persistent store of news sentiment scores.
+
+Finnhub articles keep their id across requests, so once an article has been scored its polarity and
+subjectivity are reused by every later search, for any user. Scores are tagged with the version of the
+pipeline that computed them and are recomputed when the pipeline changes.
+"""
+
+import hashlib
+from importlib import metadata
+from django.conf import settings
+from django.db import transaction
+
+from finnhub_integration import sentiment
+from finnhub_integration.models import FinnhubNewsSentiment
+
+
+def model_version():
+    """
+    @return: A tag identifying the configured sentiment model and the TextBlob release scoring with it.
+    """
+
+    model_name = settings.FINNHUB_SENTIMENT_MODEL
+    try:
+        model_name += '-' + metadata.version(model_name)
+    except (metadata.PackageNotFoundError, ValueError):
+        pass
+    return '%s+textblob-%s' % (model_name, metadata.version('textblob'))
+
+
+def article_key(news: dict):
+    """
+    @return: The key an article's scores are stored under.
+    """
+
+    if news.get('id'):
+        return 'id:%s' % news['id']
+    # Finnhub sometimes omits the summary, so fall back to the article's url and headline.
+    text = news.get('summary') or '%s\n%s' % (news.get('url', ''), news.get('headline', ''))
+    return 'sha256:' + hashlib.sha256(text.encode()).hexdigest()
+
+
+def score_articles(all_news: list, nlp=None):
+    """
+    Score Finnhub news articles, only running the NLP pipeline on articles that have not been scored by the
+    current model yet.
+
+    @param all_news: Articles as returned by finnhub.io's company_news endpoint.
+    @param nlp: Pipeline built by sentiment.load_pipeline, or None for the shared pipeline.
+    @return: A list with the (polarity, subjectivity) of each article, in order.
+    """
+
+    version = model_version()
+    keys = [article_key(news) for news in all_news]
+    stored = {
+        key: (polarity, subjectivity)
+        for key, polarity, subjectivity in FinnhubNewsSentiment.objects.filter(
+            sentiment_key__in=set(keys), sentiment_model_version=version
+        ).values_list('sentiment_key', 'sentiment_polarity', 'sentiment_subjectivity')
+    }
+
+    missing = {key: news.get('summary', '') for key, news in zip(keys, all_news) if key not in stored}
+    if missing:
+        scores = dict(zip(missing, sentiment.score_texts(nlp, list(missing.values()))))
+        with transaction.atomic():
+            FinnhubNewsSentiment.objects.bulk_create(
+                [
+                    FinnhubNewsSentiment(
+                        sentiment_key=key,
+                        sentiment_model_version=version,
+                        sentiment_polarity=polarity,
+                        sentiment_subjectivity=subjectivity,
+                    )
+                    for key, (polarity, subjectivity) in scores.items()
+                ],
+                update_conflicts=True,
+                unique_fields=['sentiment_key'],
+                update_fields=['sentiment_model_version', 'sentiment_polarity', 'sentiment_subjectivity'],
+            )
+        stored.update(scores)
+
+    return [stored[key] for key in keys]
@@ -0,0 +1,245 @@
+"""
+Local stand-in for the finnhub.io REST API, used by the benchmarks (see benchmarks.py) so that they need neither
+a key nor the network.
+
+FinnhubStub answers the endpoints FinnhubClient calls with made up, but deterministic, data: the same request
+always gets the same response, so benchmark runs are comparable. It is plugged in under the clients like a
+replayed fixture archive (see transport.py), optionally delaying every response to simulate finnhub.io's latency.
+"""
+
+import datetime
+import math
+import random
+import time
+import zlib
+
+from finnhub_integration.transport import ReplayAdapter, ReplayTransport, synthetic_latency
+
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+_WORDS = ('ACME', 'GLOBAL', 'UNITED', 'PACIFIC', 'NORTHERN', 'DIGITAL', 'MEDICAL', 'ENERGY', 'CAPITAL', 'FOODS',
+          'MOTORS', 'SYSTEMS', 'THERAPEUTICS', 'BANCORP', 'MINING', 'NETWORKS', 'HOLDINGS', 'RETAIL', 'SOLAR')
+_SUFFIXES = ('INC', 'CORP', 'LTD', 'PLC', 'GROUP INC', 'CO')
+
+# Sentences news summaries are made of, so that sentiment scoring has words to score.
+_SENTENCES = (
+    "{name} reported strong quarterly earnings that beat analyst expectations.",
+    "Shares of {name} fell sharply after a disappointing outlook.",
+    "Analysts remain cautious about {name} amid rising costs and weak demand.",
+    "{name} announced a new partnership that investors welcomed enthusiastically.",
+    "The company said revenue grew steadily while margins were stable.",
+    "Regulators opened an investigation into the accounting practices of {name}.",
+    "A surprisingly good product launch lifted sentiment across the sector.",
+    "Management expects a difficult year but sees long term opportunities.",
+)
+
+
+def _rng(*seed):
+    return random.Random(zlib.crc32(':'.join(str(part) for part in seed).encode()))
+
+
+class FinnhubStub:
+    def __init__(self, symbol_count: int = 1000, news_per_symbol: int = 20, latency: float = 0.0,
+                 exchange_code: str = 'US'):
+        """
+        Construct a stub listing `symbol_count` (at most 26 ** 3) made up symbols on one exchange.
+
+        @param news_per_symbol: Number of articles in every company_news response.
+        @param latency: Seconds every response is delayed by.
+        """
+
+        self.symbol_count = symbol_count
+        self.news_per_symbol = news_per_symbol
+        self.latency = latency
+        self.exchange_code = exchange_code
+        # Bumped by revise() to change the description of every tenth symbol.
+        self.revision = 0
+        self.calls = 0
+
+    def symbols(self):
+        """
+        @return: The listed symbols, in the shape of finnhub.io's stock_symbols response.
+        """
+
+        symbols = []
+        for i in range(self.symbol_count):
+            rng = _rng('symbol', i)
+            description = " ".join(rng.sample(_WORDS, 2) + [rng.choice(_SUFFIXES)])
+            if self.revision and i % 10 == 0:
+                description += " REV{}".format(self.revision)
+            symbols.append({
+                'currency': 'USD',
+                'description': description,
+                'displaySymbol': self.ticker(i),
+                'figi': 'BBG{:09d}'.format(i),
+                'mic': 'XNAS',
+                'symbol': self.ticker(i),
+                'type': 'Common Stock',
+            })
+        return symbols
+
+    @staticmethod
+    def ticker(i: int):
+        """
+        @return: The ticker of the i-th symbol, e.g. 'STAA' for the first.
+        """
+
+        letters = ''
+        for _ in range(3):
+            i, letter = divmod(i, 26)
+            letters = chr(ord('A') + letter) + letters
+        return 'S' + letters
+
+    def revise(self):
+        """
+        Change the description of every tenth symbol, as a later listing would.
+        """
+
+        self.revision += 1
+
+    def respond(self, path: str, params: dict):
+        """
+        @param path: API path, e.g. '/quote'.
+        @return: A (status code, JSON body) tuple.
+        """
+
+        self.calls += 1
+        handler = self._handlers().get('/' + path.strip('/'))
+        if handler is None:
+            return 404, {'error': "Unknown endpoint {}".format(path)}
+        return 200, handler(params)
+
+    def _handlers(self):
+        return {
+            '/': lambda params: {},
+            '/stock/symbol': lambda params: self.symbols() if params.get('exchange') == self.exchange_code else [],
+            '/stock/profile2': self._profile,
+            '/quote': self._quote,
+            '/stock/metric': self._metrics,
+            '/stock/candle': self._candles,
+            '/company-news': self._company_news,
+            '/news': self._general_news,
+        }
+
+    def _price(self, symbol: str, timestamp: float):
+        rng = _rng('price', symbol)
+        base, phase = rng.uniform(5, 500), rng.uniform(0, 2 * math.pi)
+        return round(base * (1 + 0.2 * math.sin(timestamp / (30 * SECONDS_PER_DAY) + phase)), 2)
+
+    def _profile(self, params: dict):
+        symbol = params.get('symbol', '')
+        rng = _rng('profile', symbol)
+        return {
+            'country': 'US',
+            'currency': 'USD',
+            'exchange': 'NASDAQ NMS - GLOBAL MARKET',
+            'finnhubIndustry': rng.choice(('Technology', 'Banking', 'Retail', 'Energy', 'Pharmaceuticals')),
+            'ipo': '2001-01-01',
+            'logo': '',
+            'marketCapitalization': round(rng.uniform(50, 500000), 2),
+            'name': symbol.title() + ' Inc',
+            'phone': '',
+            'shareOutstanding': round(rng.uniform(10, 5000), 2),
+            'ticker': symbol,
+            'weburl': 'https://example.com/' + symbol.lower(),
+        }
+
+    def _quote(self, params: dict):
+        symbol = params.get('symbol', '')
+        # Prices move by the minute, like a delayed quote.
+        now = int(time.time()) // 60 * 60
+        price, previous_close = self._price(symbol, now), self._price(symbol, now - SECONDS_PER_DAY)
+        return {
+            'c': price, 'd': round(price - previous_close, 2),
+            'dp': round((price - previous_close) / previous_close * 100, 4),
+            'h': price, 'l': price, 'o': previous_close, 'pc': previous_close, 't': now,
+        }
+
+    def _metrics(self, params: dict):
+        symbol = params.get('symbol', '')
+        rng = _rng('metric', symbol)
+        low = rng.uniform(5, 200)
+        return {
+            'metric': {
+                '52WeekHigh': round(low * rng.uniform(1.1, 2), 2),
+                '52WeekLow': round(low, 2),
+                'beta': round(rng.uniform(0.5, 2), 4),
+                'epsExclExtraItemsTTM': round(rng.uniform(-2, 10), 4),
+                'payoutRatioAnnual': round(rng.uniform(0, 60), 4),
+                'payoutRatioTTM': round(rng.uniform(0, 60), 4),
+            },
+            'metricType': params.get('metric', 'all'),
+            'symbol': symbol,
+        }
+
+    def _candles(self, params: dict):
+        symbol = params.get('symbol', '')
+        resolution = params.get('resolution', 'D')
+        step = SECONDS_PER_DAY if resolution in ('D', 'W', 'M') else int(resolution) * 60
+        start, end = int(params.get('from', 0)), int(params.get('to', 0))
+        timestamps = list(range(-(-start // step) * step, end + 1, step))
+        if not timestamps:
+            return {'s': 'no_data'}
+
+        closes = [self._price(symbol, t) for t in timestamps]
+        return {
+            's': 'ok',
+            't': timestamps,
+            'o': [self._price(symbol, t - step) for t in timestamps],
+            'h': [round(close * 1.01, 2) for close in closes],
+            'l': [round(close * 0.99, 2) for close in closes],
+            'c': closes,
+            'v': [_rng('volume', symbol, t).randint(1000, 1000000) for t in timestamps],
+        }
+
+    def _articles(self, category: str, related: str, count: int, end: datetime.date):
+        rng = _rng('news', category, related)
+        name = related.title() or 'The market'
+        end_timestamp = int(datetime.datetime.combine(end, datetime.time(), datetime.timezone.utc).timestamp())
+        articles = []
+        for i in range(count):
+            news_id = zlib.crc32('{}:{}:{}'.format(category, related, i).encode())
+            articles.append({
+                'category': category,
+                'datetime': end_timestamp - i * 3 * 60 * 60,
+                'headline': rng.choice(_SENTENCES).format(name=name).rstrip('.'),
+                'id': news_id,
+                'image': '',
+                'related': related,
+                'source': rng.choice(('Reuters', 'MarketWatch', 'Yahoo', 'SeekingAlpha')),
+                'summary': ' '.join(rng.choice(_SENTENCES).format(name=name) for _ in range(4)),
+                'url': 'https://example.com/news/{}'.format(news_id),
+            })
+        return articles
+
+    def _company_news(self, params: dict):
+        try:
+            end = datetime.date.fromisoformat(params.get('to', ''))
+        except ValueError:
+            end = datetime.date.today()
+        return self._articles('company', params.get('symbol', ''), self.news_per_symbol, end)
+
+    def _general_news(self, params: dict):
+        return self._articles(params.get('category', 'general'), '', 20, datetime.date.today())
+
+    def _replay(self, path: str, params: dict):
+        # Nothing was recorded, the stub's responses are delayed by a synthetic latency.
+        return (*self.respond(path, params), None)
+
+    def requests_adapter(self, delay=None):
+        """
+        @param delay: Function returning the seconds to delay a response by, defaults to the stub's latency. See
+                      transport.synthetic_latency.
+        @return: A requests adapter answering finnhub.io calls from the stub, for the sync clients.
+        """
+
+        return ReplayAdapter(self._replay, delay or synthetic_latency(self.latency))
+
+    def httpx_transport(self, delay=None):
+        """
+        @param delay: Function returning the seconds to delay a response by, defaults to the stub's latency.
+        @return: An httpx transport answering finnhub.io calls from the stub, for the async clients.
+        """
+
+        return ReplayTransport(self._replay, delay or synthetic_latency(self.latency))
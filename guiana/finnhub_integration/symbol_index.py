@@ -0,0 +1,199 @@
+"""
+In-memory index of the listed stock symbols, for autocompletion and searches by ticker or company name.
+
+The index is built from FinnhubSupportedStockSymbols on first use and kept by the process. Tickers and the words
+of the symbols' descriptions are kept sorted, so that prefixes are looked up by bisection. Typos are forgiven by
+also indexing every ticker and word with one character deleted: two strings within one deletion, insertion or
+substitution of each other share such a variant.
+
+Syncing symbols (see ingestion.py) bumps a version number in Django's cache, upon which every process rebuilds
+its index.
+"""
+
+import bisect
+import re
+import threading
+import time
+from django.core.cache import cache
+
+from finnhub_integration.models import FinnhubSupportedStockSymbols
+
+
+VERSION_CACHE_KEY = 'finnhub:symbol_index_version'
+
+# Seconds between two checks of the index version.
+VERSION_CHECK_INTERVAL = 10
+
+# Words shorter than this are only matched by prefix, since nearly every short word is one typo away from many.
+MIN_FUZZY_LENGTH = 4
+
+# Scores of the kinds of matches, from the best to the worst.
+EXACT, TICKER_PREFIX, WORD_PREFIX, FUZZY = range(4)
+
+_WORD = re.compile(r'[A-Z0-9]+')
+
+
+def _deletions(word: str):
+    return {word[:i] + word[i + 1:] for i in range(len(word))}
+
+
+def _prefixed(sorted_keys: list, prefix: str):
+    start = bisect.bisect_left(sorted_keys, prefix)
+    end = bisect.bisect_left(sorted_keys, prefix + '\uffff')
+    return sorted_keys[start:end]
+
+
+class SymbolIndex:
+    def __init__(self, symbols: list):
+        """
+        Build an index of symbols.
+
+        @param symbols: (symbol_name, symbol_description, symbol_type, exchange_code) tuples.
+        """
+
+        self.symbols = symbols
+        self._tickers = {}
+        self._words = {}
+        self._descriptions = {}
+        self._variants = {}
+
+        for i, (name, description, _, _) in enumerate(symbols):
+            ticker = (name or '').upper()
+            self._tickers.setdefault(ticker, []).append(i)
+            words = _WORD.findall((description or '').upper())
+            for word in words:
+                self._words.setdefault(word, []).append(i)
+            if words:
+                self._descriptions.setdefault(' '.join(words), []).append(i)
+
+        for key in list(self._tickers) + list(self._words):
+            if len(key) >= MIN_FUZZY_LENGTH:
+                for variant in _deletions(key) | {key}:
+                    self._variants.setdefault(variant, set()).add(key)
+
+        self._sorted_tickers = sorted(self._tickers)
+        self._sorted_words = sorted(self._words)
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def search(self, query: str, limit: int = 10):
+        """
+        Find the symbols matching a query, best matches first: the exact ticker, then tickers starting with the
+        query, then symbols whose description has words starting with every word of the query, then tickers and
+        words within one typo of the query.
+
+        @return: Up to `limit` matching (symbol_name, symbol_description, symbol_type, exchange_code) tuples.
+        """
+
+        terms = _WORD.findall(query.upper())
+        if not terms:
+            return []
+        ticker = query.strip().upper()
+
+        scores = {}
+
+        def score(indexes, kind, rank):
+            for i in indexes:
+                scores[i] = min(scores.get(i, (kind, rank)), (kind, rank))
+
+        score(self._tickers.get(ticker, ()), EXACT, 0)
+        for key in _prefixed(self._sorted_tickers, ticker)[:limit * 10]:
+            score(self._tickers[key], TICKER_PREFIX, len(key))
+
+        # Every query word must prefix a word of the description, e.g. "app inc" matches "APPLE INC".
+        word_matches = None
+        for term in terms:
+            matches = set()
+            for word in _prefixed(self._sorted_words, term)[:limit * 100]:
+                matches.update(self._words[word])
+            word_matches = matches if word_matches is None else word_matches & matches
+        score(word_matches, WORD_PREFIX, 0)
+
+        if len(scores) < limit and len(terms) == 1 and len(ticker) >= MIN_FUZZY_LENGTH:
+            for variant in _deletions(ticker) | {ticker}:
+                for key in self._variants.get(variant, ()):
+                    score(self._tickers.get(key, ()), FUZZY, 0)
+                    score(self._words.get(key, ()), FUZZY, 1)
+
+        # Among equal matches, short tickers (usually the primary listing) come first.
+        ranked = sorted(scores, key=lambda i: (scores[i], len(self.symbols[i][0] or ''), self.symbols[i][0] or ''))
+        return [self.symbols[i] for i in ranked[:limit]]
+
+    def resolve(self, query: str):
+        """
+        Resolve a search query that is exactly a ticker, or exactly the description of a single symbol, e.g.
+        "aapl" or "Apple Inc". Prefixes and typos are left to the user to pick from search's suggestions, rather
+        than silently swapped for another company.
+
+        @return: The symbol_name of the symbol, or None.
+        """
+
+        ticker = query.strip().upper()
+        if ticker and ticker in self._tickers:
+            return self.symbols[self._tickers[ticker][0]][0]
+        matches = self._descriptions.get(' '.join(_WORD.findall(ticker)), ())
+        return self.symbols[matches[0]][0] if len(matches) == 1 else None
+
+
+def build_index():
+    """
+    Build an index of the symbols that are still listed.
+    """
+
+    rows = FinnhubSupportedStockSymbols.objects.filter(symbol_delisted=False).values_list(
+        'symbol_name', 'symbol_description', 'symbol_type', 'symbol_exchange_code__exchange_code'
+    )
+    return SymbolIndex(list(rows))
+
+
+_index = None
+_index_version = None
+_version_checked = 0
+_index_lock = threading.Lock()
+
+
+def get_index():
+    """
+    @return: The process' symbol index, (re)building it on first use and after symbols were synced.
+    """
+
+    global _index, _index_version, _version_checked
+    now = time.monotonic()
+    if _index is not None and now - _version_checked < VERSION_CHECK_INTERVAL:
+        return _index
+
+    version = cache.get(VERSION_CACHE_KEY)
+    _version_checked = now
+    if _index is None or version != _index_version:
+        with _index_lock:
+            if _index is None or version != _index_version:
+                _index, _index_version = build_index(), version
+    return _index
+
+
+def invalidate():
+    """
+    Make every process rebuild its index on its next version check, e.g. after symbols were synced.
+    """
+
+    global _index
+    cache.set(VERSION_CACHE_KEY, time.time(), timeout=None)
+    _index = None
+
+
+def resolve(query: str):
+    """
+    @return: The symbol_name of the listed symbol a search query is exactly the ticker or description of, or None.
+    """
+
+    return get_index().resolve(query)
+
+
+def suggest(query: str, limit: int = 10):
+    """
+    @return: Up to `limit` (symbol_name, symbol_description, symbol_type, exchange_code) tuples of the listed
+             symbols best matching a search query.
+    """
+
+    return get_index().search(query, limit=limit)
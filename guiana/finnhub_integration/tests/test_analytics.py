@@ -0,0 +1,50 @@
+import numpy as np
+from django.test import SimpleTestCase
+from finnhub_integration import analytics
+
+
+class AnalyticsTestClass(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.closes = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, (250, 4)), axis=0))
+
+    def test_matches_numpy_on_complete_series(self):
+        statistics = analytics.compare(self.closes)
+        returns = self.closes[1:] / self.closes[:-1] - 1
+        self.assertTrue(np.allclose(statistics['correlation'], np.corrcoef(returns.T)))
+        self.assertTrue(np.allclose(statistics['volatility'], returns.std(axis=0, ddof=1) * np.sqrt(252)))
+        self.assertTrue(np.allclose(statistics['mean_daily_return'], returns.mean(axis=0)))
+        self.assertTrue(np.allclose(statistics['total_return'], self.closes[-1] / self.closes[0] - 1))
+
+    def test_missing_days(self):
+        closes = self.closes.copy()
+        # The second symbol was listed later, and the third has a gap.
+        closes[:100, 1] = np.nan
+        closes[150, 2] = np.nan
+        statistics = analytics.compare(closes)
+
+        self.assertAlmostEqual(statistics['total_return'][1], closes[-1, 1] / closes[100, 1] - 1)
+        returns = closes[1:] / closes[:-1] - 1
+        common = ~np.isnan(returns[:, 0]) & ~np.isnan(returns[:, 1])
+        self.assertAlmostEqual(statistics['correlation'][0, 1], np.corrcoef(returns[common][:, [0, 1]].T)[0, 1])
+        self.assertTrue(np.allclose(statistics['correlation'], statistics['correlation'].T, equal_nan=True))
+
+    def test_undefined_statistics(self):
+        closes = np.array([[1.0, np.nan, 5.0, np.nan], [2.0, np.nan, 5.0, np.nan], [3.0, 7.0, 5.0, np.nan]])
+        statistics = analytics.compare(closes)
+        self.assertEquals(statistics['total_return'][1], 0)
+        self.assertTrue(np.isnan(statistics['volatility'][1]))
+        self.assertTrue(np.isnan(statistics['total_return'][3]))
+        self.assertEquals(statistics['total_return'][2], 0)
+        # Constant series, and series without common returns, have no correlation.
+        self.assertTrue(np.isnan(statistics['correlation'][0, 2]))
+        self.assertTrue(np.isnan(statistics['correlation'][0, 1]))
+        self.assertEquals(statistics['correlation'][0, 0], 1)
+
+    def test_no_days(self):
+        statistics = analytics.compare(np.empty((0, 2)))
+        self.assertTrue(np.isnan(statistics['total_return']).all())
+        self.assertEquals(statistics['correlation'].shape, (2, 2))
+
+    def test_to_json(self):
+        self.assertEquals(analytics.to_json(np.array([[1.0, np.nan], [0.123456, 1.0]])), [[1.0, None], [0.1235, 1.0]])
@@ -0,0 +1,98 @@
+import asyncio
+import httpx
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.async_client import AsyncFinnhubClient, AsyncFinnhubClientRegistry
+from finnhub_integration.client_registry import registry
+from finnhub_integration.key_validation import get_cached_key_validity
+from finnhub_integration.rate_limit import RateLimiter
+
+
+def make_transport(*responses):
+    """
+    @return: An httpx transport answering with the given (status code, json body) responses in turn, and the list
+             of requests it received.
+    """
+
+    requests = []
+    responses = iter(responses)
+
+    def handler(request):
+        requests.append(request)
+        status_code, body = next(responses)
+        return httpx.Response(status_code, json=body)
+
+    return httpx.MockTransport(handler), requests
+
+
+@mock.patch('finnhub_integration.async_client.backoff_delay', return_value=0)
+class AsyncFinnhubClientTestClass(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+
+    async def test_quote(self, backoff_delay):
+        transport, requests = make_transport((200, {"c": 150.0}))
+        client = AsyncFinnhubClient("key1", transport=transport)
+        self.assertEquals(await client.quote("AAPL"), {"c": 150.0})
+        self.assertEquals(requests[0].url.path, "/api/v1/quote")
+        self.assertEquals(requests[0].url.params['symbol'], "AAPL")
+        self.assertEquals(requests[0].url.params['token'], "key1")
+        await client.aclose()
+
+    async def test_throttled_call_is_retried(self, backoff_delay):
+        transport, requests = make_transport((429, {"error": "limit"}), (502, {"error": "down"}), (200, {"c": 1.0}))
+        client = AsyncFinnhubClient("key1", transport=transport)
+        self.assertEquals(await client.quote("AAPL"), {"c": 1.0})
+
+        stats = client.rate_limiter.stats()
+        self.assertEquals(stats['throttled'], 1)
+        self.assertEquals(stats['retries'], 2)
+        self.assertEquals(stats['acquired']['interactive'], 3)
+        await client.aclose()
+
+    async def test_unauthorized_response_invalidates_key(self, backoff_delay):
+        transport, requests = make_transport((401, {"error": "Invalid API key"}))
+        client = AsyncFinnhubClient("key1", transport=transport)
+        with self.assertRaises(FinnhubAPIException):
+            await client.quote("AAPL")
+        self.assertIs(get_cached_key_validity("key1"), False)
+        await client.aclose()
+
+    async def test_empty_bucket_times_out(self, backoff_delay):
+        limiter = RateLimiter(calls=1, period=60, burst=1)
+        self.assertTrue(await limiter.acquire_async(timeout=0))
+        self.assertFalse(await limiter.acquire_async(timeout=0.05))
+        self.assertEquals(limiter.stats()['rejected']['interactive'], 1)
+
+
+class AsyncFinnhubClientRegistryTestClass(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(registry.clear)
+
+    async def test_same_key_reuses_client_and_shares_rate_limiter(self):
+        async_registry = AsyncFinnhubClientRegistry()
+        client = async_registry.get("key1")
+        self.assertIs(async_registry.get("key1"), client)
+        self.assertIs(client.rate_limiter, registry.get("key1").rate_limiter)
+        await async_registry.aclose()
+
+    def test_every_event_loop_gets_its_own_client(self):
+        async_registry = AsyncFinnhubClientRegistry()
+
+        async def get_client():
+            return async_registry.get("key1")
+
+        self.assertIsNot(asyncio.run(get_client()), asyncio.run(get_client()))
+
+    async def test_key_validity_is_cached(self):
+        transport, requests = make_transport((200, {}))
+        async_registry = AsyncFinnhubClientRegistry(transport=transport)
+        self.assertTrue(await async_registry.check_key_valid("key1"))
+        self.assertTrue(await async_registry.check_key_valid("key1"))
+        self.assertFalse(await async_registry.check_key_valid(None))
+        self.assertEquals(len(requests), 1)
+        await async_registry.aclose()
@@ -0,0 +1,133 @@
+import time
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from finnhub_integration import bar_aggregator as bar_aggregator_module, candle_store
+from finnhub_integration.bar_aggregator import BarAggregator, BarRing
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+
+def trade(price, volume, seconds, symbol="AAPL"):
+    return {'s': symbol, 'p': price, 'v': volume, 't': seconds * 1000}
+
+
+class BarRingTestClass(SimpleTestCase):
+    def test_oldest_bars_are_overwritten(self):
+        ring = BarRing(3)
+        for t in range(5):
+            ring.append(t, float(t), 1)
+        self.assertEquals(len(ring), 3)
+        self.assertEquals(ring.to_arrays()['t'].tolist(), [2, 3, 4])
+        self.assertIsNone(ring.find(1))
+        self.assertEquals(ring.find(3)[1], 3.0)
+
+    def test_empty_ring(self):
+        self.assertEquals(BarRing(3).to_arrays()['t'].tolist(), [])
+        self.assertIsNone(BarRing(3).last())
+
+
+class BarAggregatorTestClass(SimpleTestCase):
+    def setUp(self):
+        self.aggregator = BarAggregator()
+
+    def test_trades_are_aggregated_into_bars(self):
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(12.0, 2, 90), trade(9.0, 3, 110), trade(11.0, 4, 130)])
+
+        minute = self.aggregator.get_bars("AAPL", '1')
+        self.assertEquals(minute['t'].tolist(), [60, 120])
+        self.assertEquals(minute['o'].tolist(), [10.0, 11.0])
+        self.assertEquals(minute['h'].tolist(), [12.0, 11.0])
+        self.assertEquals(minute['l'].tolist(), [9.0, 11.0])
+        self.assertEquals(minute['c'].tolist(), [9.0, 11.0])
+        self.assertEquals(minute['v'].tolist(), [6, 4])
+
+        five_minutes = self.aggregator.get_bars("AAPL", '5')
+        self.assertEquals(five_minutes['t'].tolist(), [0])
+        self.assertEquals(five_minutes['c'].tolist(), [11.0])
+        self.assertEquals(five_minutes['v'].tolist(), [10])
+
+    def test_late_trade_does_not_move_close(self):
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(11.0, 1, 125), trade(13.0, 1, 100)])
+        minute = self.aggregator.get_bars("AAPL", '1')
+        self.assertEquals(minute['h'].tolist(), [13.0, 11.0])
+        self.assertEquals(minute['c'].tolist(), [10.0, 11.0])
+        self.assertEquals(self.aggregator.last_price("AAPL"), (11.0, 125))
+
+    def test_drain_returns_changed_bars_once(self):
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(11.0, 1, 125)])
+        batches = self.aggregator.drain()
+        self.assertEquals(batches[("AAPL", '1')]['t'], [60, 120])
+        self.assertEquals(batches[("AAPL", '5')]['t'], [0])
+        self.assertEquals(self.aggregator.drain(), {})
+
+        self.aggregator.add_trades([trade(12.0, 1, 126)])
+        self.assertEquals(self.aggregator.drain()[("AAPL", '1')]['c'], [12.0])
+
+
+class BarAggregatorStoreTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="AAPL", symbol_name="AAPL",
+        )
+        self.aggregator = BarAggregator()
+        patcher = mock.patch.object(bar_aggregator_module, 'bar_aggregator', self.aggregator)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_flush_stores_bars(self):
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(11.0, 2, 125), trade(10.0, 1, 60, symbol="UNKNOWN")])
+        self.assertEquals(self.aggregator.flush(), 3)
+        self.assertEquals(candle_store.load_candles(self.symbol, '1')['c'], [10.0, 11.0])
+        self.assertEquals(candle_store.load_candles(self.symbol, '5')['v'], [3.0])
+
+    def test_failed_flush_keeps_bars(self):
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(11.0, 2, 125)])
+        with mock.patch.object(candle_store, 'store_candles', side_effect=[1, ValueError("database error")]):
+            with self.assertRaises(ValueError):
+                self.aggregator.flush()
+        # Only the bars of the failed write are written again.
+        self.assertEquals(self.aggregator.flush(), 1)
+
+    def test_intraday_arrays_prefer_bars_in_memory(self):
+        candle_store.store_candles(self.symbol, '1', {'t': [0, 60], 'o': [9.0, 9.5], 'h': [9.0, 9.5], 'l': [9.0, 9.5],
+                                                      'c': [9.0, 9.5], 'v': [1, 1]})
+        self.aggregator.add_trades([trade(10.0, 1, 60), trade(11.0, 1, 125)])
+
+        arrays = bar_aggregator_module.load_intraday_arrays(self.symbol, '1')
+        self.assertEquals(arrays['t'].tolist(), [0, 60, 120])
+        self.assertEquals(arrays['c'].tolist(), [9.0, 10.0, 11.0])
+        self.assertEquals(bar_aggregator_module.load_intraday_arrays(self.symbol, '1', start=100)['t'].tolist(), [120])
+
+    @override_settings(FINNHUB_LIVE_PRICE_MAX_AGE=60)
+    def test_live_price(self):
+        now = int(time.time())
+        self.assertIsNone(bar_aggregator_module.get_live_price(self.symbol))
+
+        candle_store.store_candles(self.symbol, '1', {'t': [now - 30], 'o': [9.0], 'h': [9.0], 'l': [9.0],
+                                                      'c': [9.5], 'v': [1]})
+        self.assertEquals(bar_aggregator_module.get_live_price(self.symbol), 9.5)
+
+        self.aggregator.add_trades([trade(10.0, 1, now)])
+        self.assertEquals(bar_aggregator_module.get_live_price(self.symbol), 10.0)
+
+    @override_settings(FINNHUB_LIVE_PRICE_MAX_AGE=60)
+    def test_live_prices(self):
+        now = int(time.time())
+        other = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.symbol.symbol_exchange_code,
+                                                            symbol_display_sym="MSFT", symbol_name="MSFT")
+        quiet = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.symbol.symbol_exchange_code,
+                                                            symbol_display_sym="IBM", symbol_name="IBM")
+        candle_store.store_candles(other, '1', {'t': [now - 30], 'o': [9.0], 'h': [9.0], 'l': [9.0], 'c': [9.5],
+                                                'v': [1]})
+        self.aggregator.add_trades([trade(10.0, 1, now)])
+
+        # The price of the symbol traded in memory is known without a query.
+        with self.assertNumQueries(1):
+            prices = bar_aggregator_module.get_live_prices([self.symbol, other, quiet])
+        self.assertEquals(prices, {"AAPL": 10.0, "MSFT": 9.5})
+
+    @override_settings(FINNHUB_LIVE_PRICE_MAX_AGE=60)
+    def test_stale_live_price_is_ignored(self):
+        self.aggregator.add_trades([trade(10.0, 1, int(time.time()) - 120)])
+        self.assertIsNone(bar_aggregator_module.get_live_price(self.symbol))
@@ -0,0 +1,45 @@
+from django.test import TransactionTestCase, override_settings
+from finnhub_integration import benchmarks
+from finnhub_integration.async_client import async_registry
+from finnhub_integration.client_registry import registry
+
+
+@override_settings(FINNHUB_SENTIMENT_MODEL='blank:en')
+class BenchmarksTestClass(TransactionTestCase):
+    # The searches' database lookups run in other threads, which only see committed rows.
+    def test_run_benchmarks(self):
+        adapter, transport = registry.adapter, async_registry.transport
+        report = benchmarks.run_benchmarks(symbols=50, news=5, latency=0, concurrency_levels=(1, 2), requests=2,
+                                           articles=10)
+
+        self.assertEquals(report['version'], benchmarks.REPORT_VERSION)
+        self.assertEquals(report['environment']['sentiment_model'], 'blank:en')
+        results = report['results']
+        self.assertEquals(set(results), set(benchmarks.SECTIONS))
+
+        for concurrency in ('1', '2'):
+            self.assertEquals(results['search'][concurrency]['requests'], 2)
+            self.assertEquals(results['search'][concurrency]['errors'], 0)
+            self.assertIn('upstream.quote', results['search'][concurrency]['timers'])
+
+        ingestion = results['ingestion']
+        self.assertEquals(ingestion['insert']['written'], {'inserted': 50, 'updated': 0, 'delisted': 0})
+        self.assertEquals(ingestion['unchanged']['written'], {'inserted': 0, 'updated': 0, 'delisted': 0})
+        self.assertEquals(ingestion['update']['written'], {'inserted': 0, 'updated': 5, 'delisted': 0})
+
+        # Measured cold, even though the search benchmark loaded the pipeline first.
+        self.assertGreater(results['sentiment']['pipeline_load_seconds'], 0)
+        self.assertEquals(results['sentiment']['score_texts']['articles'], 10)
+        self.assertEquals(results['sentiment']['get_symbol_news']['articles'], 10)
+
+        # The stub is unplugged afterwards.
+        self.assertIs(registry.adapter, adapter)
+        self.assertIs(async_registry.transport, transport)
+
+    def test_compare_reports(self):
+        baseline = {'results': {'search': {'1': {'p50_ms': 100, 'errors': 0}}, 'ingestion': {'seconds': 2}}}
+        report = {'results': {'search': {'1': {'p50_ms': 80, 'errors': 0}}, 'sentiment': {'seconds': 1}}}
+        self.assertEquals(benchmarks.compare_reports(baseline, report), [
+            ('search.1.errors', 0, 0, None),
+            ('search.1.p50_ms', 100, 80, -0.2),
+        ])
@@ -0,0 +1,108 @@
+from unittest import mock
+
+import numpy as np
+
+from django.test import TestCase
+from finnhub_integration import candle_store
+from finnhub_integration.models import FinnhubStockCandles, FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+DAY = 24 * 60 * 60
+
+
+def make_candles(timestamps, close=1.0):
+    return {
+        's': 'ok',
+        't': list(timestamps),
+        'o': [close] * len(timestamps),
+        'h': [close + 1] * len(timestamps),
+        'l': [close - 1] * len(timestamps),
+        'c': [close] * len(timestamps),
+        'v': [100] * len(timestamps),
+    }
+
+
+class CandleStoreTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange,
+            symbol_display_sym="AAPL",
+            symbol_name="AAPL",
+        )
+        self.client = mock.Mock()
+
+    def test_first_update_fetches_full_history(self):
+        self.client.stock_candles.return_value = make_candles([DAY * i for i in range(1, 4)])
+        self.assertEquals(candle_store.update_candles(self.client, self.symbol), 3)
+
+        args = self.client.stock_candles.call_args[0]
+        self.assertEquals(args[:3], ("AAPL", 'D', candle_store.EARLIEST_TIMESTAMP))
+        self.assertEquals(candle_store.get_last_timestamp(self.symbol), DAY * 3)
+
+    def test_later_update_only_fetches_new_bars(self):
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * i for i in range(1, 4)]))
+        self.client.stock_candles.return_value = make_candles([DAY * 3, DAY * 4], close=2.0)
+        candle_store.update_candles(self.client, self.symbol)
+
+        self.assertEquals(self.client.stock_candles.call_args[0][2], DAY * 3)
+        candles = candle_store.load_candles(self.symbol)
+        self.assertEquals(candles['t'], [DAY, DAY * 2, DAY * 3, DAY * 4])
+        # The last stored bar is overwritten with its updated values.
+        self.assertEquals(candles['c'], [1.0, 1.0, 2.0, 2.0])
+        self.assertEquals(FinnhubStockCandles.objects.count(), 4)
+
+    def test_no_data_response_stores_nothing(self):
+        self.client.stock_candles.return_value = {'s': 'no_data'}
+        self.assertEquals(candle_store.update_candles(self.client, self.symbol), 0)
+        self.assertEquals(candle_store.load_candles(self.symbol)['t'], [])
+
+    def test_load_recent_closes_of_several_symbols(self):
+        other = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.symbol.symbol_exchange_code,
+                                                            symbol_display_sym="MSFT", symbol_name="MSFT")
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * i for i in range(1, 6)]))
+        candle_store.store_candles(other, 'D', make_candles([DAY], close=2.0))
+
+        with self.assertNumQueries(1):
+            closes = candle_store.load_recent_closes([self.symbol, other], 'D', since=DAY * 4)
+        self.assertEquals(closes, {self.symbol.id: [1.0, 1.0]})
+
+    def test_load_close_matrix(self):
+        other = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.symbol.symbol_exchange_code,
+                                                            symbol_display_sym="MSFT", symbol_name="MSFT")
+        unstored = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.symbol.symbol_exchange_code,
+                                                               symbol_display_sym="IBM", symbol_name="IBM")
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * i for i in range(1, 4)]))
+        candle_store.store_candles(other, 'D', make_candles([DAY * 2, DAY * 4], close=2.0))
+
+        with self.assertNumQueries(1):
+            days, closes = candle_store.load_close_matrix([other, unstored, self.symbol], start=DAY * 2)
+        self.assertEquals(days.tolist(), [2, 3, 4])
+        self.assertTrue(np.array_equal(closes, [[2.0, np.nan, 1.0], [np.nan, np.nan, 1.0], [2.0, np.nan, np.nan]],
+                                       equal_nan=True))
+
+    def test_load_close_matrix_without_candles(self):
+        days, closes = candle_store.load_close_matrix([self.symbol])
+        self.assertEquals(len(days), 0)
+        self.assertEquals(closes.shape, (0, 1))
+
+    def test_load_candles_in_range(self):
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * i for i in range(1, 6)]))
+        candles = candle_store.load_candles(self.symbol, start=DAY * 2, end=DAY * 4)
+        self.assertEquals(candles['t'], [DAY * 2, DAY * 3, DAY * 4])
+        self.assertEquals(candles['v'], [100, 100, 100])
+
+    def test_load_candle_arrays(self):
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * i for i in range(1, 4)]))
+        arrays = candle_store.load_candle_arrays(self.symbol, start=DAY * 2)
+        self.assertEquals(arrays['t'].tolist(), [DAY * 2, DAY * 3])
+        self.assertEquals(arrays['h'].tolist(), [2.0, 2.0])
+
+    def test_load_candle_arrays_without_candles(self):
+        arrays = candle_store.load_candle_arrays(self.symbol)
+        self.assertEquals(arrays['t'].tolist(), [])
+        self.assertEquals(candle_store.to_columnar(arrays)['day'], [])
+
+    def test_to_columnar(self):
+        candle_store.store_candles(self.symbol, 'D', make_candles([DAY * 3 + 60], close=1.23456))
+        payload = candle_store.to_columnar(candle_store.load_candle_arrays(self.symbol))
+        self.assertEquals(payload, {'day': [3], 'o': [1.2346], 'h': [2.2346], 'l': [0.2346], 'c': [1.2346], 'v': [100]})
@@ -0,0 +1,95 @@
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.client_registry import FinnhubClientRegistry, PooledFinnhubClient
+from finnhub_integration.key_validation import remember_key_validity
+
+
+class FinnhubClientRegistryTestClass(SimpleTestCase):
+    def setUp(self):
+        self.registry = FinnhubClientRegistry()
+
+    def tearDown(self):
+        self.registry.clear()
+
+    def test_same_key_reuses_client(self):
+        client = self.registry.get("key1")
+        self.assertIsInstance(client, PooledFinnhubClient)
+        self.assertIs(self.registry.get("key1"), client)
+        self.assertEquals(client.api_key, "key1")
+
+    def test_different_keys_get_different_clients(self):
+        self.assertIsNot(self.registry.get("key1"), self.registry.get("key2"))
+        self.assertEquals(len(self.registry), 2)
+
+    def test_idle_clients_are_evicted(self):
+        self.registry.idle_timeout = -1
+        client = self.registry.get("key1")
+        client_id, rate_limiter = id(client), client.rate_limiter
+        del client
+        with mock.patch('requests.Session.close') as close:
+            self.registry.get("key2")
+        self.assertEquals(len(self.registry), 1)
+        close.assert_called_once_with()
+
+        # The key gets a new client, but keeps its rate limiter.
+        client = self.registry.get("key1")
+        self.assertNotEqual(id(client), client_id)
+        self.assertIs(client.rate_limiter, rate_limiter)
+        self.assertIs(self.registry.rate_limiter("key1"), rate_limiter)
+
+    def test_held_clients_are_not_closed_when_evicted(self):
+        self.registry.idle_timeout = -1
+        client = self.registry.get("key1")
+        with mock.patch('requests.Session.close') as close:
+            self.registry.get("key2")
+        close.assert_not_called()
+        self.assertIs(self.registry.get("key1"), client)
+
+    def test_discard_removes_client(self):
+        client = self.registry.get("key1")
+        self.registry.discard("key1")
+        self.assertEquals(len(self.registry), 0)
+        self.assertIsNot(self.registry.get("key1"), client)
+
+    def test_session_is_pooled(self):
+        adapter = self.registry.get("key1")._session.get_adapter("https://finnhub.io/api/v1/quote")
+        self.assertEquals(adapter._pool_maxsize, PooledFinnhubClient.POOL_SIZE)
+
+
+class FinnhubKeyValidationCacheTestClass(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.registry = FinnhubClientRegistry()
+
+    def tearDown(self):
+        self.registry.clear()
+
+    def test_missing_key_is_invalid(self):
+        self.assertFalse(self.registry.check_key_valid(None))
+        self.assertFalse(self.registry.check_key_valid(""))
+
+    @mock.patch.object(PooledFinnhubClient, 'check_key_valid', return_value=True)
+    def test_valid_key_is_cached(self, check_key_valid):
+        self.assertTrue(self.registry.check_key_valid("key1"))
+        self.assertTrue(self.registry.check_key_valid("key1"))
+        check_key_valid.assert_called_once()
+
+    @mock.patch.object(PooledFinnhubClient, 'check_key_valid', return_value=False)
+    def test_invalid_key_is_cached(self, check_key_valid):
+        self.assertFalse(self.registry.check_key_valid("key1"))
+        self.assertFalse(self.registry.check_key_valid("key1"))
+        check_key_valid.assert_called_once()
+
+    def test_unauthorized_response_invalidates_key(self):
+        remember_key_validity("key1", True)
+        client = self.registry.get("key1")
+        response = mock.Mock(ok=False, status_code=401, text='{"error": "Invalid API key"}')
+        response.json.return_value = {"error": "Invalid API key"}
+
+        with mock.patch.object(client._session, 'get', return_value=response):
+            with self.assertRaises(FinnhubAPIException):
+                client.quote("AAPL")
+        self.assertFalse(self.registry.check_key_valid("key1"))
@@ -0,0 +1,72 @@
+import datetime
+import numpy as np
+from django.test import SimpleTestCase
+
+from finnhub_integration import downsampling
+from finnhub_integration.candle_store import SECONDS_PER_DAY
+
+
+def make_arrays(days):
+    n = len(days)
+    return {
+        't': np.array(days, dtype=np.int64) * SECONDS_PER_DAY,
+        'o': np.arange(n, dtype=np.float64) + 1,
+        'h': np.arange(n, dtype=np.float64) + 2,
+        'l': np.arange(n, dtype=np.float64),
+        'c': np.arange(n, dtype=np.float64) + 1.5,
+        'v': np.full(n, 10, dtype=np.float64),
+    }
+
+
+def epoch_day(year, month, day):
+    return (datetime.date(year, month, day) - datetime.date(1970, 1, 1)).days
+
+
+class DownsamplingTestClass(SimpleTestCase):
+    def test_daily_is_unchanged(self):
+        arrays = make_arrays([1, 2, 3])
+        self.assertIs(downsampling.downsample(arrays, 'D'), arrays)
+
+    def test_weekly_bars_start_on_mondays(self):
+        # Mon 2022-10-03 to Fri 2022-10-07, then Mon 2022-10-10 and Tue 2022-10-11.
+        monday = epoch_day(2022, 10, 3)
+        weekly = downsampling.downsample(make_arrays([monday + i for i in (0, 1, 2, 3, 4, 7, 8)]), 'W')
+        self.assertEquals((weekly['t'] // SECONDS_PER_DAY).tolist(), [monday, monday + 7])
+        self.assertEquals(weekly['o'].tolist(), [1, 6])
+        self.assertEquals(weekly['h'].tolist(), [6, 8])
+        self.assertEquals(weekly['l'].tolist(), [0, 5])
+        self.assertEquals(weekly['c'].tolist(), [5.5, 7.5])
+        self.assertEquals(weekly['v'].tolist(), [50, 20])
+
+    def test_monthly_bars_follow_the_calendar(self):
+        days = [epoch_day(2022, 1, 31), epoch_day(2022, 2, 1), epoch_day(2022, 2, 28), epoch_day(2022, 3, 1)]
+        monthly = downsampling.downsample(make_arrays(days), 'M')
+        self.assertEquals((monthly['t'] // SECONDS_PER_DAY).tolist(), [days[0], days[1], days[3]])
+        self.assertEquals(monthly['c'].tolist(), [1.5, 3.5, 4.5])
+
+    def test_unsupported_resolution(self):
+        with self.assertRaises(ValueError):
+            downsampling.downsample(make_arrays([1]), 'Y')
+
+    def test_empty_series(self):
+        arrays = make_arrays([])
+        sampled, resolution = downsampling.downsample_to(arrays, 10)
+        self.assertEquals(resolution, 'D')
+        self.assertEquals(sampled['t'].tolist(), [])
+
+    def test_downsample_to_picks_finest_resolution(self):
+        arrays = make_arrays(list(range(epoch_day(2022, 1, 3), epoch_day(2022, 12, 31))))
+        self.assertEquals(downsampling.downsample_to(arrays, 400)[1], 'D')
+        self.assertEquals(downsampling.downsample_to(arrays, 60)[1], 'W')
+        sampled, resolution = downsampling.downsample_to(arrays, 12)
+        self.assertEquals(resolution, 'M')
+        self.assertEquals(len(sampled['t']), 12)
+
+    def test_downsample_to_merges_months(self):
+        arrays = make_arrays(list(range(epoch_day(2020, 1, 1), epoch_day(2022, 12, 31))))
+        sampled, resolution = downsampling.downsample_to(arrays, 12)
+        self.assertEquals(resolution, '3M')
+        self.assertEquals(len(sampled['t']), 12)
+        self.assertEquals(sampled['h'].max(), arrays['h'].max())
+        self.assertEquals(sampled['l'].min(), arrays['l'].min())
+        self.assertEquals(sampled['v'].sum(), arrays['v'].sum())
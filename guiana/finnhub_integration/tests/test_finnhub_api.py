@@ -0,0 +1,212 @@
+import asyncio
+import time
+from unittest import mock
+
+from django.conf import settings
+from django.test import TestCase, TransactionTestCase, override_settings
+from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+from finnhub_integration.rate_limit import PRIORITY_BACKGROUND, get_priority, request_priority
+from finnhub_integration.response_cache import response_cache
+
+
+class FinnhubClientSearchSymbolTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange,
+            symbol_currency="USD",
+            symbol_description="APPLE INC",
+            symbol_type="Common Stock",
+            symbol_display_sym="AAPL",
+            symbol_name="AAPL",
+        )
+
+        self.f = FinnhubClient()
+        self.f.get_symbol_info = mock.Mock(return_value={"name": "Apple Inc", "currency": "USD"})
+        self.f.get_symbol_last_quote = mock.Mock(return_value={"c": 150.0})
+        self.f.get_symbol_news = mock.Mock(return_value=([], 0.1, 0.2))
+        self.f.get_ytd_close = mock.Mock(return_value=149.0)
+        self.f.get_symbol_financials = mock.Mock(return_value={"Beta (5Y, monthly)": 1.2})
+
+    def test_search_symbol_fills_context(self):
+        context = self.f.search_symbol("AAPL", {})
+        self.assertEquals(context['sym_name'], "Apple Inc")
+        self.assertEquals(context['sym_last_close'], 150.0)
+        self.assertEquals(context['sym_ytd_close'], 149.0)
+        self.assertEquals(context['news_polarity'], 0.1)
+        self.assertEquals(context['fetch_errors'], [])
+
+    def test_search_symbol_sequential_matches_concurrent(self):
+        concurrent_context = self.f.search_symbol("AAPL", {})
+        sequential_context = self.f.search_symbol("AAPL", {}, concurrent=False)
+        self.assertEquals(concurrent_context, sequential_context)
+
+    def test_search_symbol_unknown_symbol_leaves_context_untouched(self):
+        context = self.f.search_symbol("NOTASYMBOL", {"message": "Search successful!"})
+        self.assertEquals(context, {"message": "Search successful!"})
+        self.f.get_symbol_info.assert_not_called()
+
+    def test_search_symbol_partial_failure(self):
+        self.f.get_symbol_financials.side_effect = ValueError("upstream error")
+        context = self.f.search_symbol("AAPL", {})
+        self.assertEquals(context['financials'], {})
+        self.assertEquals(context['sym_name'], "Apple Inc")
+        self.assertEquals(context['fetch_errors'], ['financials'])
+
+    def test_search_symbol_slow_call_times_out(self):
+        self.f.FETCH_TIMEOUT = 0.1
+        self.f.get_symbol_info.side_effect = lambda symbol: time.sleep(1)
+        context = self.f.search_symbol("AAPL", {})
+        self.assertIsNone(context['sym_name'])
+        self.assertIn('info', context['fetch_errors'])
+        self.assertEquals(context['sym_last_close'], 150.0)
+
+    def test_searched_symbol_comes_with_its_exchange(self):
+        # One query to find the symbol and its exchange, and one to record the search.
+        with self.assertNumQueries(2):
+            symbol_obj = self.f._find_searched_symbol("aapl")
+            self.assertEquals(symbol_obj.symbol_exchange_code.exchange_code, "US")
+
+    def test_delisted_symbol_is_not_found(self):
+        FinnhubSupportedStockSymbols.objects.filter(symbol_name="AAPL").update(symbol_delisted=True)
+        self.assertIsNone(self.f._find_searched_symbol("AAPL"))
+        self.assertIsNotNone(FinnhubSupportedStockSymbols.objects.resolve("AAPL"))
+
+    def test_fetch_concurrently_keeps_caller_context(self):
+        with request_priority(PRIORITY_BACKGROUND):
+            results, errors = self.f.fetch_concurrently({'priority': (get_priority,)})
+        self.assertEquals(results['priority'], PRIORITY_BACKGROUND)
+
+    def test_fetch_concurrently_runs_calls_in_parallel(self):
+        calls = {str(i): (time.sleep, 0.2) for i in range(5)}
+        start = time.monotonic()
+        results, errors = self.f.fetch_concurrently(calls)
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEquals(len(results), 5)
+        self.assertEquals(errors, {})
+
+
+class FinnhubClientAsyncSearchSymbolTestClass(TransactionTestCase):
+    # The searches' database lookups run in other threads, which only see committed rows.
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange,
+            symbol_type="Common Stock",
+            symbol_display_sym="AAPL",
+            symbol_name="AAPL",
+        )
+
+        self.f = FinnhubClient()
+        self.f.aget_symbol_info = mock.AsyncMock(return_value={"name": "Apple Inc", "currency": "USD"})
+        self.f.aget_symbol_last_quote = mock.AsyncMock(return_value={"c": 150.0})
+        self.f.aget_symbol_news = mock.AsyncMock(return_value=([], 0.1, 0.2))
+        self.f.aget_ytd_close = mock.AsyncMock(return_value=149.0)
+        self.f.aget_symbol_financials = mock.AsyncMock(return_value={"Beta (5Y, monthly)": 1.2})
+
+    async def test_asearch_symbol_fills_context(self):
+        context = await self.f.asearch_symbol("AAPL", {})
+        self.assertEquals(context['sym_name'], "Apple Inc")
+        self.assertEquals(context['sym_last_close'], 150.0)
+        self.assertEquals(context['sym_ytd_close'], 149.0)
+        self.assertEquals(context['news_polarity'], 0.1)
+        self.assertEquals(context['fetch_errors'], [])
+
+    async def test_asearch_symbol_unknown_symbol_leaves_context_untouched(self):
+        context = await self.f.asearch_symbol("NOTASYMBOL", {"message": "Search successful!"})
+        self.assertEquals(context, {"message": "Search successful!"})
+        self.f.aget_symbol_info.assert_not_called()
+
+    async def test_asearch_symbol_partial_failure(self):
+        self.f.aget_symbol_financials.side_effect = ValueError("upstream error")
+        context = await self.f.asearch_symbol("AAPL", {})
+        self.assertEquals(context['financials'], {})
+        self.assertEquals(context['sym_name'], "Apple Inc")
+        self.assertEquals(context['fetch_errors'], ['financials'])
+
+    async def test_asearch_symbol_slow_call_times_out(self):
+        self.f.FETCH_TIMEOUT = 0.1
+
+        async def slow_info(symbol):
+            await asyncio.sleep(1)
+
+        self.f.aget_symbol_info.side_effect = slow_info
+        context = await self.f.asearch_symbol("AAPL", {})
+        self.assertIsNone(context['sym_name'])
+        self.assertIn('info', context['fetch_errors'])
+        self.assertEquals(context['sym_last_close'], 150.0)
+
+    async def test_concurrent_searches_overlap(self):
+        # The database lookups of concurrent searches don't wait on each other.
+        found = FinnhubSupportedStockSymbols(symbol_name="AAPL")
+        self.f._find_searched_symbol = mock.Mock(side_effect=lambda symbol: time.sleep(0.3) or found)
+        start = time.monotonic()
+        contexts = await asyncio.gather(self.f.asearch_symbol("AAPL", {}), self.f.asearch_symbol("AAPL", {}))
+        self.assertLess(time.monotonic() - start, 0.5)
+        self.assertEquals([context['sym_name'] for context in contexts], ["Apple Inc", "Apple Inc"])
+
+
+class FinnhubClientLastQuoteTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=exchange,
+                                                                  symbol_display_sym="AAPL", symbol_name="AAPL")
+        self.f = FinnhubClient()
+        self.f.client = mock.Mock()
+        self.f.client.quote.return_value = {"c": 150.0}
+
+    @mock.patch('finnhub_integration.bar_aggregator.get_live_price', return_value=151.0)
+    def test_last_quote_from_live_trades(self, get_live_price):
+        # The symbol found by the search isn't looked up again.
+        with self.assertNumQueries(0):
+            self.assertEquals(self.f.get_symbol_last_quote(self.symbol), {"c": 151.0})
+        get_live_price.assert_called_once_with(self.symbol)
+        self.f.client.quote.assert_not_called()
+
+    @mock.patch('finnhub_integration.bar_aggregator.get_live_price', return_value=None)
+    def test_last_quote_without_live_trades(self, get_live_price):
+        self.assertEquals(self.f.get_symbol_last_quote(self.symbol), {"c": 150.0})
+        self.f.client.quote.assert_called_once_with("AAPL")
+
+
+class FinnhubClientQuotesTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        self.symbols = [
+            FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=exchange, symbol_display_sym=name,
+                                                        symbol_name=name)
+            for name in ("AAPL", "MSFT", "IBM")
+        ]
+        self.f = FinnhubClient()
+        self.f.aget_quote = mock.AsyncMock(side_effect=self.quote)
+
+    async def quote(self, symbol):
+        if symbol == "IBM":
+            raise ValueError("upstream error")
+        return {"c": 100.0, "dp": 1.5}
+
+    @mock.patch('finnhub_integration.bar_aggregator.get_live_prices', return_value={"AAPL": 151.0})
+    async def test_quotes_of_several_symbols(self, get_live_prices):
+        quotes, errors = await self.f.aget_quotes(self.symbols)
+        self.assertEquals(quotes, {"AAPL": {"c": 151.0}, "MSFT": {"c": 100.0, "dp": 1.5}})
+        self.assertEquals(list(errors), ["IBM"])
+        # Symbols priced from their live trades aren't quoted.
+        self.assertEquals(sorted(call.args[0] for call in self.f.aget_quote.call_args_list), ["IBM", "MSFT"])
+
+    @mock.patch('finnhub_integration.bar_aggregator.get_live_prices', return_value={})
+    async def test_quotes_beyond_the_burst_are_served_from_the_cache(self, get_live_prices):
+        response_cache.clear()
+        self.addCleanup(response_cache.clear)
+        await response_cache.aget_or_fetch('quote', ('IBM',), mock.AsyncMock(return_value={"c": 120.0}))
+        self.f.aclient = mock.Mock(quote=mock.AsyncMock(return_value={"c": 300.0}))
+
+        with override_settings(FINNHUB_RATE_LIMIT={**settings.FINNHUB_RATE_LIMIT, 'burst': 1}):
+            quotes, errors = await self.f.aget_quotes(self.symbols)
+        self.assertEquals(quotes, {"AAPL": {"c": 100.0, "dp": 1.5}, "IBM": {"c": 120.0}})
+        self.assertEquals([call.args[0] for call in self.f.aget_quote.call_args_list], ["AAPL"])
+
+        # The missing quote is fetched in the background, for the next views.
+        await asyncio.gather(*response_cache._async_tasks)
+        self.f.aclient.quote.assert_awaited_once_with("MSFT")
+        self.assertEquals(await self.f.aget_cached_quote("MSFT"), {"c": 300.0})
@@ -0,0 +1,121 @@
+import numpy as np
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
+from finnhub_integration import candle_store, indicators
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+DAY = 24 * 60 * 60
+
+
+def make_closes(n, seed=0):
+    return 100 * np.exp(np.cumsum(np.random.default_rng(seed).normal(0, 0.01, n)))
+
+
+def ewm_loop(values, alpha):
+    result = [values[0]]
+    for value in values[1:]:
+        result.append((1 - alpha) * result[-1] + alpha * value)
+    return np.array(result)
+
+
+class IndicatorsTestClass(SimpleTestCase):
+    def setUp(self):
+        self.closes = make_closes(300)
+        self.values, _ = indicators.compute(self.closes)
+
+    def test_moving_averages(self):
+        self.assertTrue(np.isnan(self.values['sma_50'][:49]).all())
+        self.assertAlmostEqual(self.values['sma_50'][49], self.closes[:50].mean())
+        self.assertAlmostEqual(self.values['sma_20'][-1], self.closes[-20:].mean())
+        self.assertTrue(np.allclose(self.values['ema_20'], ewm_loop(self.closes, 2 / 21)))
+
+    def test_bollinger_bands_and_volatility(self):
+        window = self.closes[-20:]
+        self.assertAlmostEqual(self.values['bb_upper'][-1], window.mean() + 2 * window.std())
+        self.assertAlmostEqual(self.values['bb_lower'][-1], window.mean() - 2 * window.std())
+        returns = np.diff(np.log(self.closes[-21:]))
+        self.assertAlmostEqual(self.values['volatility_20'][-1], returns.std(ddof=1) * np.sqrt(252))
+        self.assertTrue(np.isnan(self.values['volatility_20'][:20]).all())
+
+    def test_rsi(self):
+        changes = np.diff(self.closes)
+        gains = ewm_loop(np.clip(changes, 0, None), 1 / 14)
+        losses = ewm_loop(np.clip(-changes, 0, None), 1 / 14)
+        self.assertTrue(np.isnan(self.values['rsi_14'][:14]).all())
+        self.assertTrue(np.allclose(self.values['rsi_14'][14:], (100 * gains / (gains + losses))[13:]))
+
+        rising, _ = indicators.compute(np.arange(1, 20, dtype=np.float64))
+        self.assertEquals(rising['rsi_14'][-1], 100)
+        flat, _ = indicators.compute(np.ones(20))
+        self.assertEquals(flat['rsi_14'][-1], 50)
+
+    def test_incremental_computation_matches_full(self):
+        state, parts = None, []
+        for chunk in (self.closes[:1], self.closes[1:2], self.closes[2:40], self.closes[40:]):
+            values, state = indicators.compute(chunk, state)
+            parts.append(values)
+        for name in indicators.INDICATORS:
+            self.assertTrue(np.allclose(np.concatenate([part[name] for part in parts]), self.values[name],
+                                        equal_nan=True), name)
+
+    def test_empty_series(self):
+        values, state = indicators.compute(np.empty(0))
+        self.assertEquals({name: len(value) for name, value in values.items()}, dict.fromkeys(indicators.INDICATORS, 0))
+        self.assertEquals(state['count'], 0)
+
+    def test_to_payload(self):
+        payload = indicators.to_payload({'sma_20': np.array([np.nan, 1.23456])}, ('sma_20',))
+        self.assertEquals(payload, {'sma_20': [None, 1.2346]})
+
+
+class CachedIndicatorsTestClass(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_country="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange,
+            symbol_display_sym="AAPL",
+            symbol_name="AAPL",
+        )
+        self.closes = make_closes(120)
+        self.store(range(100))
+
+    def store(self, days, closes=None):
+        closes = self.closes[list(days)] if closes is None else closes
+        candle_store.store_candles(self.symbol, 'D', {
+            't': [DAY * day for day in days], 'o': closes, 'h': closes, 'l': closes, 'c': closes,
+            'v': [100] * len(closes),
+        })
+
+    def assertMatchesFullComputation(self, result):
+        arrays = candle_store.load_candle_arrays(self.symbol, 'D')
+        values, _ = indicators.compute(arrays['c'])
+        self.assertEquals(result['t'].tolist(), arrays['t'].tolist())
+        for name in indicators.INDICATORS:
+            self.assertTrue(np.allclose(result[name], values[name], equal_nan=True), name)
+
+    def test_appended_bars_extend_the_cached_indicators(self):
+        self.assertEquals(len(indicators.get_indicators(self.symbol)['t']), 100)
+        # The last cached bar closed at another price.
+        self.store([99, 100, 101], np.array([101.5, 102.0, 99.0]))
+        with self.assertNumQueries(2):
+            result = indicators.get_indicators(self.symbol)
+        self.assertMatchesFullComputation(result)
+
+    def test_unchanged_bars_are_served_from_cache(self):
+        indicators.get_indicators(self.symbol)
+        with self.assertNumQueries(2):
+            result = indicators.get_indicators(self.symbol)
+        self.assertMatchesFullComputation(result)
+
+    def test_changed_history_is_computed_again(self):
+        indicators.get_indicators(self.symbol)
+        self.store([-1], np.array([50.0]))
+        self.assertMatchesFullComputation(indicators.get_indicators(self.symbol))
+
+    def test_at_bars(self):
+        result = indicators.get_indicators(self.symbol)
+        # Bars starting on days 0 and 7, the second one ending on day 13.
+        values = indicators.at_bars(result, np.array([0, 7 * DAY]), end=13 * DAY + DAY - 1)
+        self.assertEquals(values['ema_20'].tolist(), [result['ema_20'][6], result['ema_20'][13]])
@@ -0,0 +1,155 @@
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase
+from finnhub_integration import ingestion
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+
+
+def make_symbol(name, description="", currency="USD", display=None):
+    return {
+        "currency": currency,
+        "description": description,
+        "displaySymbol": name if display is None else display,
+        "symbol": name,
+        "type": "Common Stock",
+    }
+
+
+class IngestionTestClass(TestCase):
+    def test_import_exchanges_from_csv(self):
+        count = ingestion.upsert_exchanges(ingestion.read_supported_exchanges())
+        self.assertEquals(FinnhubSupportedExchanges.objects.count(), count)
+        self.assertTrue(FinnhubSupportedExchanges.objects.filter(exchange_code="US").exists())
+
+    def test_import_exchanges_can_be_rerun(self):
+        ingestion.upsert_exchanges(ingestion.read_supported_exchanges())
+        count = ingestion.upsert_exchanges(ingestion.read_supported_exchanges())
+        self.assertEquals(FinnhubSupportedExchanges.objects.count(), count)
+
+    def test_upsert_symbols_updates_existing_rows(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        ingestion.upsert_symbols([ingestion.build_symbol(make_symbol("AAPL", "APPLE"), exchange)])
+        ingestion.upsert_symbols([
+            ingestion.build_symbol(make_symbol("AAPL", "APPLE INC"), exchange),
+            ingestion.build_symbol(make_symbol("MSFT", "MICROSOFT CORP"), exchange),
+        ])
+
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.count(), 2)
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.get(symbol_name="AAPL").symbol_description, "APPLE INC")
+
+    def test_upsert_symbols_with_colliding_display_symbols(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        ingestion.upsert_symbols([ingestion.build_symbol(make_symbol("FB", "META PLATFORMS"), exchange)])
+        ingestion.upsert_symbols([
+            ingestion.build_symbol(make_symbol("META", "META PLATFORMS", display="FB"), exchange),
+            ingestion.build_symbol(make_symbol("META.B", "META PLATFORMS", display="FB"), exchange),
+        ])
+
+        display_symbols = dict(FinnhubSupportedStockSymbols.objects.values_list('symbol_name', 'symbol_display_sym'))
+        self.assertEquals(display_symbols, {"FB": None, "META": "FB", "META.B": None})
+
+    def test_upsert_many_symbols(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        symbols = [ingestion.build_symbol(make_symbol("SYM%d" % i), exchange) for i in range(5000)]
+        self.assertEquals(ingestion.upsert_symbols(symbols), 5000)
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.count(), 5000)
+
+
+class IngestCommandTestClass(TestCase):
+    def test_ingest_exchanges(self):
+        out = StringIO()
+        call_command('ingest_finnhub', 'exchanges', stdout=out)
+        self.assertIn("rows/s", out.getvalue())
+        self.assertTrue(FinnhubSupportedExchanges.objects.filter(exchange_code="US").exists())
+
+    def test_ingest_symbols(self):
+        FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        client = mock.Mock()
+        client.stock_symbols.return_value = [make_symbol("AAPL"), make_symbol("MSFT")]
+
+        with mock.patch('finnhub_integration.management.commands.ingest_finnhub.registry') as registry:
+            registry.get.return_value = client
+            call_command('ingest_finnhub', 'symbols', api_key="key", stdout=StringIO())
+
+        client.stock_symbols.assert_called_once_with("US")
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.count(), 2)
+
+    def test_ingest_symbols_of_unknown_exchange(self):
+        with self.assertRaises(CommandError):
+            call_command('ingest_finnhub', 'symbols', api_key="key", exchange="XX", stdout=StringIO())
+
+
+class SyncSymbolsTestClass(TestCase):
+    def setUp(self):
+        self.us = FinnhubSupportedExchanges.objects.create(exchange_code="US", exchange_name="US exchanges")
+        self.l = FinnhubSupportedExchanges.objects.create(exchange_code="L", exchange_name="LONDON STOCK EXCHANGE")
+        ingestion.sync_symbols(self.us, [make_symbol("AAPL", "APPLE INC"), make_symbol("TWTR", "TWITTER INC")])
+
+    def test_first_sync_inserts_everything(self):
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.count(), 2)
+
+    def test_unchanged_sync_writes_nothing(self):
+        result = ingestion.sync_symbols(self.us, [make_symbol("AAPL", "APPLE INC"), make_symbol("TWTR", "TWITTER INC")])
+        self.assertEquals(result, {'inserted': 0, 'updated': 0, 'delisted': 0})
+
+    def test_sync_applies_inserts_updates_and_delistings(self):
+        result = ingestion.sync_symbols(self.us, [make_symbol("AAPL", "APPLE"), make_symbol("MSFT", "MICROSOFT CORP")])
+        self.assertEquals(result, {'inserted': 1, 'updated': 1, 'delisted': 1})
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.get(symbol_name="AAPL").symbol_description, "APPLE")
+        self.assertTrue(FinnhubSupportedStockSymbols.objects.get(symbol_name="TWTR").symbol_delisted)
+
+    def test_relisted_symbol_is_updated(self):
+        ingestion.sync_symbols(self.us, [make_symbol("AAPL", "APPLE INC")])
+        result = ingestion.sync_symbols(self.us, [make_symbol("AAPL", "APPLE INC"), make_symbol("TWTR", "TWITTER INC")])
+        self.assertEquals(result['updated'], 1)
+        self.assertFalse(FinnhubSupportedStockSymbols.objects.get(symbol_name="TWTR").symbol_delisted)
+
+    def test_sync_other_exchange_leaves_symbols_alone(self):
+        result = ingestion.sync_symbols(self.l, [make_symbol("VOD.L", "VODAFONE GROUP PLC", currency="GBP")])
+        self.assertEquals(result, {'inserted': 1, 'updated': 0, 'delisted': 0})
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.filter(symbol_delisted=False).count(), 3)
+
+    def test_symbol_moved_between_exchanges(self):
+        result = ingestion.sync_symbols(self.l, [make_symbol("AAPL", "APPLE INC")])
+        self.assertEquals(result, {'inserted': 0, 'updated': 1, 'delisted': 0})
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.get(symbol_name="AAPL").symbol_exchange_code, self.l)
+
+    def test_colliding_display_symbols(self):
+        # TWTR was renamed to X, which is still displayed as TWTR, and BRK.B is listed twice.
+        result = ingestion.sync_symbols(self.us, [
+            make_symbol("AAPL", "APPLE INC"),
+            make_symbol("X", "X CORP", display="TWTR"),
+            make_symbol("BRK-B", "BERKSHIRE HATHAWAY", display="BRK.B"),
+            make_symbol("BRK.B", "BERKSHIRE HATHAWAY"),
+        ])
+        self.assertEquals(result, {'inserted': 3, 'updated': 0, 'delisted': 1})
+
+        display_symbols = dict(FinnhubSupportedStockSymbols.objects.values_list('symbol_name', 'symbol_display_sym'))
+        self.assertEquals(display_symbols, {"AAPL": "AAPL", "TWTR": None, "X": "TWTR", "BRK-B": None,
+                                            "BRK.B": "BRK.B"})
+
+        # Both symbols swap their display symbols.
+        result = ingestion.sync_symbols(self.us, [
+            make_symbol("AAPL", "APPLE INC", display="TWTR"),
+            make_symbol("X", "X CORP", display="AAPL"),
+        ])
+        self.assertEquals(result['updated'], 2)
+        self.assertEquals(FinnhubSupportedStockSymbols.objects.get(symbol_name="X").symbol_display_sym, "AAPL")
+
+    def test_empty_listing_does_not_delist(self):
+        result = ingestion.sync_symbols(self.us, [])
+        self.assertEquals(result['delisted'], 0)
+
+    def test_sync_command(self):
+        client = mock.Mock()
+        client.stock_symbols.return_value = [make_symbol("AAPL", "APPLE INC")]
+        out = StringIO()
+
+        with mock.patch('finnhub_integration.management.commands.sync_symbols.registry') as registry:
+            registry.get.return_value = client
+            call_command('sync_symbols', api_key="key", exchange=["US"], stdout=out)
+
+        self.assertIn("US: 0 inserted, 0 updated, 1 delisted", out.getvalue())
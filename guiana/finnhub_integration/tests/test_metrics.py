@@ -0,0 +1,115 @@
+import asyncio
+from unittest import mock
+
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.metrics import Histogram, metrics, server_timing_middleware, timed, upstream_name
+
+
+def api_exception(status_code):
+    return FinnhubAPIException(mock.Mock(status_code=status_code, json=mock.Mock(return_value={'error': "error"})))
+
+
+class HistogramTestClass(SimpleTestCase):
+    def test_quantiles(self):
+        histogram = Histogram(buckets=(10, 100))
+        for value in (1, 2, 3, 50, 500):
+            histogram.observe(value)
+        self.assertEquals(histogram.quantile(0.5), 10)
+        self.assertEquals(histogram.quantile(0.8), 100)
+        self.assertEquals(histogram.quantile(1), 500)
+        self.assertEquals(histogram.to_dict()['buckets'], {'<=10': 3, '<=100': 1, '+Inf': 1})
+
+    def test_empty_histogram(self):
+        self.assertIsNone(Histogram().quantile(0.5))
+        self.assertIsNone(Histogram().to_dict()['mean_ms'])
+
+
+class MetricsTestClass(SimpleTestCase):
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+
+    def test_timed_counts_calls_errors_and_throttling(self):
+        with timed('upstream.quote'):
+            pass
+        for status_code in (429, 500):
+            with self.assertRaises(FinnhubAPIException), timed('upstream.quote'):
+                raise api_exception(status_code)
+
+        timer = metrics.snapshot()['timers']['upstream.quote']
+        self.assertEquals((timer['calls'], timer['errors'], timer['throttled']), (3, 2, 1))
+        self.assertEquals(timer['latency']['count'], 3)
+
+    def test_timed_decorator(self):
+        @timed('db.find_symbol')
+        def find_symbol():
+            return "AAPL"
+
+        self.assertEquals(find_symbol(), "AAPL")
+        self.assertEquals(find_symbol(), "AAPL")
+        self.assertEquals(metrics.snapshot()['timers']['db.find_symbol']['calls'], 2)
+
+    def test_cache_hit_ratio(self):
+        for outcome in ('hit', 'hit', 'stale', 'miss'):
+            metrics.count_cache('quote', outcome)
+        self.assertEquals(metrics.snapshot()['cache']['quote'], {'hit': 2, 'stale': 1, 'miss': 1, 'hit_ratio': 0.75})
+
+    def test_upstream_name(self):
+        self.assertEquals(upstream_name("/stock/profile2"), "upstream.stock.profile2")
+        self.assertEquals(upstream_name("/"), "upstream.root")
+
+
+def staff_request():
+    request = RequestFactory().get('/')
+    request.user = mock.Mock(is_staff=True)
+    return request
+
+
+class ServerTimingMiddlewareTestClass(SimpleTestCase):
+    def setUp(self):
+        self.addCleanup(metrics.reset)
+
+    def test_request_timings(self):
+        def view(request):
+            with timed('upstream.quote'):
+                pass
+            with timed('upstream.quote'):
+                pass
+            return HttpResponse()
+
+        response = server_timing_middleware(view)(staff_request())
+        header = response['Server-Timing']
+        self.assertRegex(header, r'^upstream\.quote;dur=[\d.]+;desc="2 calls", total;dur=[\d.]+$')
+
+    def test_async_request_timings(self):
+        async def view(request):
+            # Timings recorded in concurrent tasks count towards the request too.
+            async def fetch():
+                with timed('upstream.quote'):
+                    await asyncio.sleep(0)
+
+            await asyncio.gather(fetch(), fetch())
+            return HttpResponse()
+
+        response = asyncio.run(server_timing_middleware(view)(staff_request()))
+        self.assertIn('desc="2 calls"', response['Server-Timing'])
+
+    def test_timings_outside_requests_are_not_reported(self):
+        with timed('upstream.quote'):
+            pass
+        response = server_timing_middleware(lambda request: HttpResponse())(staff_request())
+        self.assertRegex(response['Server-Timing'], r'^total;dur=[\d.]+$')
+
+    def test_timings_are_only_reported_to_staff(self):
+        request = RequestFactory().get('/')
+        request.user = mock.Mock(is_staff=False)
+        self.assertNotIn('Server-Timing', server_timing_middleware(lambda request: HttpResponse())(request))
+
+        async def view(request):
+            return HttpResponse()
+
+        self.assertNotIn('Server-Timing', asyncio.run(server_timing_middleware(view)(request)))
+        with override_settings(DEBUG=True):
+            self.assertIn('Server-Timing', server_timing_middleware(lambda request: HttpResponse())(request))
@@ -0,0 +1,134 @@
+import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from finnhub_integration import news_store
+from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.models import FinnhubCompanyNews, FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+from finnhub_integration.news_worker import NewsWorker
+
+
+def make_news(news_id, summary, hours_ago=1):
+    return {
+        "id": news_id,
+        "datetime": int((timezone.now() - datetime.timedelta(hours=hours_ago)).timestamp()),
+        "headline": "Headline %d" % news_id,
+        "summary": summary,
+        "source": "Reuters",
+        "url": "https://example.com/%d" % news_id,
+        "image": "",
+        "category": "company",
+    }
+
+
+@override_settings(FINNHUB_SENTIMENT_MODEL='blank:en')
+class NewsStoreTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        self.symbol = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="AAPL", symbol_name="AAPL",
+        )
+        self.client = mock.Mock()
+        self.client.company_news.return_value = [
+            make_news(1, "Apple reported great quarterly results.", hours_ago=2),
+            make_news(2, "Shares fell after a terrible earnings miss.", hours_ago=1),
+        ]
+
+    def test_update_news_stores_scored_news(self):
+        self.assertFalse(news_store.is_fresh(self.symbol))
+        self.assertEquals(news_store.update_news(self.client, self.symbol), 2)
+        self.assertTrue(news_store.is_fresh(self.symbol))
+
+        news = news_store.load_news(self.symbol)
+        self.assertEquals([n['id'] for n in news], [2, 1])
+        self.assertLess(news[0]['polarity'], 0)
+        self.assertGreater(news[1]['polarity'], 0)
+
+        polarity, subjectivity = news_store.load_news_averages(self.symbol)
+        self.assertAlmostEquals(polarity, (news[0]['polarity'] + news[1]['polarity']) / 2)
+
+    def test_update_news_can_be_rerun(self):
+        news_store.update_news(self.client, self.symbol)
+        news_store.update_news(self.client, self.symbol)
+        self.assertEquals(FinnhubCompanyNews.objects.count(), 2)
+
+    def test_purge_old_news(self):
+        self.client.company_news.return_value.append(make_news(3, "Old news.", hours_ago=24 * 30))
+        news_store.update_news(self.client, self.symbol)
+        self.assertEquals(len(news_store.load_news(self.symbol)), 2)
+        self.assertEquals(news_store.purge_old_news(), 1)
+
+    def test_search_reads_fresh_news_from_store(self):
+        news_store.update_news(self.client, self.symbol)
+        f = FinnhubClient()
+        f.client = mock.Mock()
+
+        all_news, polarity, subjectivity = f.get_symbol_news("AAPL")
+        f.client.company_news.assert_not_called()
+        self.assertEquals(len(all_news), 2)
+        self.assertIn('upload_timedelta', all_news[0])
+
+    def test_search_fetches_stale_news(self):
+        f = FinnhubClient()
+        f.client = self.client
+        all_news, polarity, subjectivity = f.get_symbol_news("AAPL")
+        self.client.company_news.assert_called_once()
+        self.assertEquals(len(all_news), 2)
+
+    def test_search_without_news(self):
+        self.client.company_news.return_value = []
+        f = FinnhubClient()
+        f.client = self.client
+        self.assertEquals(f.get_symbol_news("AAPL"), ([], None, None))
+
+
+class NewsWorkerTestClass(TestCase):
+    def setUp(self):
+        exchange = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        now = timezone.now()
+        self.searched = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="AAPL", symbol_name="AAPL", symbol_last_searched=now,
+        )
+        self.up_to_date = FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="MSFT", symbol_name="MSFT", symbol_last_searched=now,
+            symbol_news_updated=now,
+        )
+        FinnhubSupportedStockSymbols.objects.create(
+            symbol_exchange_code=exchange, symbol_display_sym="TSLA", symbol_name="TSLA",
+            symbol_last_searched=now - datetime.timedelta(days=7),
+        )
+        self.worker = NewsWorker(mock.Mock(), threads=2)
+
+    def test_due_symbols(self):
+        self.assertEquals(self.worker.due_symbols(), [self.searched])
+
+    @mock.patch.object(news_store, 'update_news')
+    def test_run_once_refreshes_due_symbols(self, update_news):
+        self.assertEquals(self.worker.run_once(), 1)
+        update_news.assert_called_once_with(self.worker.client, self.searched)
+
+        # The worker can poll again once the queue has been drained.
+        self.assertEquals(self.worker.run_once(), 1)
+
+    @mock.patch.object(news_store, 'update_news', side_effect=ValueError("upstream error"))
+    def test_run_once_survives_failures(self, update_news):
+        self.assertEquals(self.worker.run_once(), 1)
+
+    def test_at_least_one_thread_is_required(self):
+        with self.assertRaises(ValueError):
+            NewsWorker(mock.Mock(), threads=0)
+
+    def test_command_rejects_no_threads(self):
+        with mock.patch('finnhub_integration.management.commands.run_news_worker.registry'):
+            with self.assertRaises(CommandError):
+                call_command('run_news_worker', once=True, threads=0, api_key="key")
+
+    @mock.patch.object(news_store, 'update_news')
+    def test_command_once(self, update_news):
+        out = StringIO()
+        with mock.patch('finnhub_integration.management.commands.run_news_worker.registry'):
+            call_command('run_news_worker', once=True, api_key="key", stdout=out)
+        self.assertIn("Refreshed the news of 1 symbols", out.getvalue())
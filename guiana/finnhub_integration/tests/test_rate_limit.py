@@ -0,0 +1,102 @@
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.client_registry import PooledFinnhubClient
+from finnhub_integration.rate_limit import (PRIORITY_BACKGROUND, PRIORITY_BULK, PRIORITY_INTERACTIVE, RateLimiter,
+                                            get_priority, request_priority)
+
+
+def make_response(status_code, body=None):
+    response = mock.Mock(ok=status_code < 400, status_code=status_code, text="", headers={'Content-Type': 'application/json'})
+    response.json.return_value = body if body is not None else {"error": "error"}
+    return response
+
+
+class RateLimiterTestClass(SimpleTestCase):
+    def test_burst_is_served_immediately(self):
+        limiter = RateLimiter(calls=1, period=60, burst=5)
+        start = time.monotonic()
+        for _ in range(5):
+            self.assertTrue(limiter.acquire(PRIORITY_INTERACTIVE))
+        self.assertLess(time.monotonic() - start, 0.1)
+        self.assertEquals(limiter.stats()['acquired']['interactive'], 5)
+
+    def test_empty_bucket_times_out(self):
+        limiter = RateLimiter(calls=1, period=60, burst=1)
+        limiter.acquire(PRIORITY_INTERACTIVE)
+        self.assertFalse(limiter.acquire(PRIORITY_INTERACTIVE, timeout=0.05))
+        self.assertEquals(limiter.stats()['rejected']['interactive'], 1)
+
+    def test_bucket_refills(self):
+        limiter = RateLimiter(calls=20, period=1, burst=1)
+        limiter.acquire(PRIORITY_INTERACTIVE)
+        start = time.monotonic()
+        self.assertTrue(limiter.acquire(PRIORITY_INTERACTIVE, timeout=1))
+        self.assertGreater(time.monotonic() - start, 0.02)
+
+    def test_higher_priority_goes_first(self):
+        limiter = RateLimiter(calls=10, period=1, burst=1)
+        limiter.acquire(PRIORITY_INTERACTIVE)
+        order = []
+
+        def acquire(priority):
+            limiter.acquire(priority)
+            order.append(priority)
+
+        threads = [threading.Thread(target=acquire, args=(PRIORITY_BULK,))]
+        threads[0].start()
+        time.sleep(0.02)
+        threads += [threading.Thread(target=acquire, args=(priority,))
+                    for priority in (PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE)]
+        for thread in threads[1:]:
+            thread.start()
+            time.sleep(0.02)
+
+        self.assertEquals(limiter.queue_depth(), {'interactive': 1, 'background': 1, 'bulk': 1})
+        for thread in threads:
+            thread.join()
+        self.assertEquals(order, [PRIORITY_INTERACTIVE, PRIORITY_BACKGROUND, PRIORITY_BULK])
+
+    def test_request_priority(self):
+        self.assertEquals(get_priority(), PRIORITY_INTERACTIVE)
+        with request_priority(PRIORITY_BULK):
+            self.assertEquals(get_priority(), PRIORITY_BULK)
+        self.assertEquals(get_priority(), PRIORITY_INTERACTIVE)
+
+
+@mock.patch('finnhub_integration.client_registry.backoff_delay', return_value=0)
+class PooledFinnhubClientRetryTestClass(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = PooledFinnhubClient(api_key="key1")
+
+    def tearDown(self):
+        self.client.close()
+
+    def test_throttled_call_is_retried(self, backoff_delay):
+        responses = [make_response(429), make_response(502), make_response(200, {"c": 150.0})]
+        with mock.patch.object(self.client._session, 'get', side_effect=responses):
+            self.assertEquals(self.client.quote("AAPL"), {"c": 150.0})
+
+        stats = self.client.rate_limiter.stats()
+        self.assertEquals(stats['throttled'], 1)
+        self.assertEquals(stats['retries'], 2)
+        self.assertEquals(stats['acquired']['interactive'], 3)
+
+    @override_settings(FINNHUB_RATE_LIMIT={'calls': 60, 'period': 60, 'burst': 10, 'retries': 1,
+                                           'backoff_base': 0, 'backoff_cap': 0})
+    def test_retries_are_limited(self, backoff_delay):
+        with mock.patch.object(self.client._session, 'get', return_value=make_response(429)):
+            with self.assertRaises(FinnhubAPIException):
+                self.client.quote("AAPL")
+        self.assertEquals(self.client.rate_limiter.stats()['throttled'], 2)
+
+    def test_client_errors_are_not_retried(self, backoff_delay):
+        with mock.patch.object(self.client._session, 'get', return_value=make_response(403)) as get:
+            with self.assertRaises(FinnhubAPIException):
+                self.client.quote("AAPL")
+        get.assert_called_once()
@@ -0,0 +1,109 @@
+import asyncio
+import threading
+import time
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from finnhub_integration.metrics import metrics
+from finnhub_integration.response_cache import TieredResponseCache, get_endpoint_ttls
+
+
+class TieredResponseCacheTestClass(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.cache = TieredResponseCache(max_entries=2)
+
+    def test_ttls_can_be_overridden_in_settings(self):
+        with override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 1, 'stale': 2}}):
+            self.assertEquals(get_endpoint_ttls('candles'), (1, 2))
+
+    def test_ttls_default_to_none(self):
+        with override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 1}}):
+            self.assertEquals(get_endpoint_ttls('candles'), (1, 0))
+            self.assertEquals(get_endpoint_ttls('quote'), (0, 0))
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    def test_fresh_response_is_not_refetched(self):
+        fetch = mock.Mock(return_value={'c': [1.0]})
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), {'c': [1.0]})
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), {'c': [1.0]})
+        fetch.assert_called_once()
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    def test_lookups_are_counted(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        fetch = mock.Mock(return_value={'c': [1.0]})
+        self.cache.get_or_fetch('candles', ('AAPL',), fetch)
+        self.cache.get_or_fetch('candles', ('AAPL',), fetch)
+        self.assertEquals(metrics.snapshot()['cache']['candles'], {'hit': 1, 'stale': 0, 'miss': 1, 'hit_ratio': 0.5})
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    def test_shared_tier_is_used_after_lru_eviction(self):
+        fetch = mock.Mock(side_effect=lambda: time.time())
+        first = self.cache.get_or_fetch('candles', ('AAPL',), fetch)
+        self.cache.get_or_fetch('candles', ('MSFT',), fetch)
+        self.cache.get_or_fetch('candles', ('TSLA',), fetch)
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), first)
+        self.assertEquals(fetch.call_count, 3)
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 0, 'stale': 60}})
+    def test_stale_response_is_served_and_revalidated(self):
+        fetch = mock.Mock(side_effect=['old', 'new'])
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), 'old')
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), 'old')
+
+        self.cache._revalidator.shutdown(wait=True)
+        self.assertEquals(fetch.call_count, 2)
+        self.assertEquals(self.cache._lookup(self.cache.make_key('candles', ('AAPL',)))[0], 'new')
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    def test_concurrent_misses_are_coalesced(self):
+        fetch = mock.Mock(side_effect=lambda: time.sleep(0.2) or 'value')
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(self.cache.get_or_fetch('candles', ('AAPL',), fetch)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEquals(results, ['value'] * 5)
+        fetch.assert_called_once()
+
+    def test_failed_fetch_is_not_cached(self):
+        fetch = mock.Mock(side_effect=[ValueError("upstream error"), 'value'])
+        with self.assertRaises(ValueError):
+            self.cache.get_or_fetch('candles', ('AAPL',), fetch)
+        self.assertEquals(self.cache.get_or_fetch('candles', ('AAPL',), fetch), 'value')
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    async def test_async_concurrent_misses_are_coalesced(self):
+        async def slow_fetch():
+            await asyncio.sleep(0.1)
+            return 'value'
+
+        fetch = mock.AsyncMock(side_effect=slow_fetch)
+        results = await asyncio.gather(*(self.cache.aget_or_fetch('candles', ('AAPL',), fetch) for _ in range(5)))
+        self.assertEquals(results, ['value'] * 5)
+        fetch.assert_called_once()
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 60, 'stale': 60}})
+    async def test_async_and_sync_getters_share_responses(self):
+        self.cache.get_or_fetch('candles', ('AAPL',), mock.Mock(return_value='value'))
+        fetch = mock.AsyncMock()
+        self.assertEquals(await self.cache.aget_or_fetch('candles', ('AAPL',), fetch), 'value')
+        fetch.assert_not_called()
+
+    @override_settings(FINNHUB_CACHE_TTLS={'candles': {'fresh': 0, 'stale': 60}})
+    async def test_async_stale_response_is_served_and_revalidated(self):
+        fetch = mock.AsyncMock(side_effect=['old', 'new'])
+        self.assertEquals(await self.cache.aget_or_fetch('candles', ('AAPL',), fetch), 'old')
+        self.assertEquals(await self.cache.aget_or_fetch('candles', ('AAPL',), fetch), 'old')
+
+        await asyncio.gather(*self.cache._async_tasks)
+        self.assertEquals(fetch.await_count, 2)
+        self.assertEquals((await self.cache._alookup(self.cache.make_key('candles', ('AAPL',))))[0], 'new')
@@ -0,0 +1,102 @@
+from unittest import mock
+
+from django.test import SimpleTestCase, TestCase, override_settings
+from finnhub_integration import sentiment, sentiment_store
+from finnhub_integration.finnhub_api import FinnhubClient
+from finnhub_integration.models import FinnhubNewsSentiment
+from textblob import TextBlob
+
+SUMMARIES = [
+    "Apple reported great quarterly results, beating expectations.",
+    "Shares fell sharply after a terrible earnings miss.",
+    "The company will hold its annual meeting on Tuesday.",
+]
+
+
+class SentimentPipelineTestClass(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.nlp = sentiment.load_pipeline('blank:en')
+
+    def test_pipeline_only_computes_sentiment(self):
+        self.assertEquals(self.nlp.pipe_names, ['spacytextblob', 'sentiment_scores'])
+
+    def test_scores_match_textblob(self):
+        expected = [(TextBlob(text).sentiment.polarity, TextBlob(text).sentiment.subjectivity) for text in SUMMARIES]
+        self.assertEquals(sentiment.score_texts(self.nlp, SUMMARIES, batch_size=2), expected)
+
+    def test_scores_with_worker_processes(self):
+        self.assertEquals(
+            sentiment.score_texts(self.nlp, SUMMARIES, n_process=2),
+            sentiment.score_texts(self.nlp, SUMMARIES, n_process=1),
+        )
+
+    def test_score_no_texts(self):
+        self.assertEquals(sentiment.score_texts(self.nlp, []), [])
+
+
+@override_settings(FINNHUB_SENTIMENT_MODEL='blank:en')
+class SharedSentimentPipelineTestClass(SimpleTestCase):
+    def setUp(self):
+        sentiment.reset_pipeline()
+
+    def tearDown(self):
+        sentiment.reset_pipeline()
+
+    def test_client_does_not_load_pipeline(self):
+        FinnhubClient()
+        self.assertIsNone(sentiment._pipeline)
+
+    def test_pipeline_is_loaded_once(self):
+        self.assertIs(FinnhubClient().nlp, FinnhubClient().nlp)
+
+    def test_score_texts_uses_shared_pipeline(self):
+        self.assertEquals(sentiment.score_texts(None, SUMMARIES[:1]), [(0.8, 0.75)])
+        self.assertIsNotNone(sentiment._pipeline)
+
+    def test_preload(self):
+        sentiment.preload()
+        self.assertIsNotNone(sentiment._pipeline)
+
+
+@override_settings(FINNHUB_SENTIMENT_MODEL='blank:en')
+class SentimentStoreTestClass(TestCase):
+    def setUp(self):
+        self.nlp = sentiment.load_pipeline('blank:en')
+        self.news = [{"id": i, "summary": summary} for i, summary in enumerate(SUMMARIES, start=1)]
+
+    def test_scores_are_stored(self):
+        scores = sentiment_store.score_articles(self.news, self.nlp)
+        self.assertEquals(scores, sentiment.score_texts(self.nlp, SUMMARIES))
+        self.assertEquals(FinnhubNewsSentiment.objects.count(), 3)
+
+    def test_stored_articles_are_not_rescored(self):
+        sentiment_store.score_articles(self.news[:2], self.nlp)
+        with mock.patch.object(sentiment, 'score_texts', wraps=sentiment.score_texts) as score_texts:
+            sentiment_store.score_articles(self.news, self.nlp)
+            sentiment_store.score_articles(self.news, self.nlp)
+        score_texts.assert_called_once_with(self.nlp, [SUMMARIES[2]])
+
+    def test_articles_without_id_are_keyed_by_summary(self):
+        news = {"id": 0, "summary": SUMMARIES[0]}
+        self.assertTrue(sentiment_store.article_key(news).startswith('sha256:'))
+        self.assertEquals(sentiment_store.article_key(news), sentiment_store.article_key(dict(news)))
+
+    def test_articles_without_summary_are_keyed_by_url_and_headline(self):
+        news = [{"id": 0, "url": "https://example.com/%d" % i, "headline": "Headline"} for i in range(2)]
+        keys = [sentiment_store.article_key(article) for article in news]
+        self.assertTrue(keys[0].startswith('sha256:'))
+        self.assertNotEqual(keys[0], keys[1])
+        self.assertEquals(len(sentiment_store.score_articles(news, self.nlp)), 2)
+
+    def test_model_change_invalidates_scores(self):
+        sentiment_store.score_articles(self.news, self.nlp)
+        with override_settings(FINNHUB_SENTIMENT_MODEL='blank:xx'):
+            with mock.patch.object(sentiment, 'score_texts', wraps=sentiment.score_texts) as score_texts:
+                sentiment_store.score_articles(self.news, self.nlp)
+            score_texts.assert_called_once()
+            self.assertEquals(
+                set(FinnhubNewsSentiment.objects.values_list('sentiment_model_version', flat=True)),
+                {sentiment_store.model_version()},
+            )
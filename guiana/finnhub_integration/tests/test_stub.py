@@ -0,0 +1,64 @@
+from django.test import SimpleTestCase
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.async_client import AsyncFinnhubClient
+from finnhub_integration.client_registry import FinnhubClientRegistry
+from finnhub_integration.stub import FinnhubStub
+
+
+class FinnhubStubTestClass(SimpleTestCase):
+    def setUp(self):
+        self.stub = FinnhubStub(symbol_count=30, news_per_symbol=5)
+
+    def test_symbols_are_deterministic(self):
+        symbols = self.stub.symbols()
+        self.assertEquals(len(symbols), 30)
+        self.assertEquals(symbols[0]['symbol'], 'SAAA')
+        self.assertEquals(symbols, FinnhubStub(symbol_count=30).symbols())
+        self.assertEquals(len({symbol['symbol'] for symbol in symbols}), 30)
+
+    def test_revise_changes_every_tenth_description(self):
+        before = self.stub.symbols()
+        self.stub.revise()
+        changed = [i for i, (old, new) in enumerate(zip(before, self.stub.symbols())) if old != new]
+        self.assertEquals(changed, [0, 10, 20])
+
+    def test_responses(self):
+        status_code, quote = self.stub.respond('/quote', {'symbol': 'SAAA'})
+        self.assertEquals(status_code, 200)
+        self.assertEquals(set(quote), {'c', 'd', 'dp', 'h', 'l', 'o', 'pc', 't'})
+
+        _, candles = self.stub.respond('stock/candle', {'symbol': 'SAAA', 'resolution': 'D',
+                                                        'from': 0, 'to': 10 * 24 * 60 * 60})
+        self.assertEquals(candles['s'], 'ok')
+        self.assertEquals(len(candles['t']), 11)
+
+        _, news = self.stub.respond('/company-news', {'symbol': 'SAAA', 'from': '2022-01-01', 'to': '2022-01-31'})
+        self.assertEquals(len(news), 5)
+        self.assertEquals(news, self.stub.respond('/company-news', {'symbol': 'SAAA', 'to': '2022-01-31'})[1])
+
+    def test_unknown_endpoint(self):
+        self.assertEquals(self.stub.respond('/unknown', {})[0], 404)
+
+
+class FinnhubStubClientsTestClass(SimpleTestCase):
+    def setUp(self):
+        self.stub = FinnhubStub(symbol_count=30)
+
+    def test_sync_client(self):
+        registry = FinnhubClientRegistry(adapter=self.stub.requests_adapter())
+        self.addCleanup(registry.clear)
+        client = registry.get("key")
+
+        self.assertEquals(len(client.stock_symbols(exchange='US')), 30)
+        self.assertEquals(client.company_profile2(symbol='SAAA')['ticker'], 'SAAA')
+        with self.assertRaises(FinnhubAPIException):
+            client.forex_exchanges()
+
+    async def test_async_client(self):
+        client = AsyncFinnhubClient("key", transport=self.stub.httpx_transport())
+        try:
+            quote = await client.quote('SAAA')
+            self.assertEquals(quote, self.stub.respond('/quote', {'symbol': 'SAAA'})[1])
+            self.assertEquals(len(await client.company_news('SAAA', '2022-01-01', '2022-01-31')), 20)
+        finally:
+            await client.aclose()
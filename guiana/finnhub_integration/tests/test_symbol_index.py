@@ -0,0 +1,84 @@
+from django.test import SimpleTestCase, TestCase
+from finnhub_integration import ingestion, symbol_index
+from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+from finnhub_integration.symbol_index import SymbolIndex
+
+
+SYMBOLS = [
+    ("AAPL", "APPLE INC", "Common Stock", "US"),
+    ("APLE", "APPLE HOSPITALITY REIT INC", "REIT", "US"),
+    ("AA", "ALCOA CORP", "Common Stock", "US"),
+    ("AAL", "AMERICAN AIRLINES GROUP INC", "Common Stock", "US"),
+    ("MSFT", "MICROSOFT CORP", "Common Stock", "US"),
+    ("VOD.L", "VODAFONE GROUP PLC", "Common Stock", "L"),
+]
+
+
+class SymbolIndexTestClass(SimpleTestCase):
+    def setUp(self):
+        self.index = SymbolIndex(SYMBOLS)
+
+    def names(self, query, limit=10):
+        return [symbol[0] for symbol in self.index.search(query, limit=limit)]
+
+    def test_exact_ticker_comes_first(self):
+        self.assertEquals(self.names("aa"), ["AA", "AAL", "AAPL"])
+
+    def test_ticker_prefix(self):
+        self.assertEquals(self.names("AAP"), ["AAPL"])
+        self.assertEquals(self.names("vod"), ["VOD.L"])
+
+    def test_description_words(self):
+        self.assertEquals(self.names("apple"), ["AAPL", "APLE"])
+        self.assertEquals(self.names("app hosp"), ["APLE"])
+        self.assertEquals(self.names("micro"), ["MSFT"])
+
+    def test_typos(self):
+        self.assertEquals(self.names("MSFY"), ["MSFT"])
+        self.assertEquals(self.names("micrsoft"), ["MSFT"])
+        # Swapped letters share a variant with one letter deleted.
+        self.assertEquals(self.names("microsfot"), ["MSFT"])
+        self.assertEquals(self.names("macrosoft"), ["MSFT"])
+        self.assertEquals(self.names("macrohard"), [])
+
+    def test_short_queries_are_not_fuzzy(self):
+        self.assertEquals(self.names("ZA"), [])
+
+    def test_limit(self):
+        self.assertEquals(self.names("a", limit=2), ["AA", "AAL"])
+
+    def test_resolve(self):
+        self.assertEquals(self.index.resolve("msft"), "MSFT")
+        self.assertEquals(self.index.resolve(" Apple Inc. "), "AAPL")
+        self.assertIsNone(self.index.resolve("nothing like it"))
+        self.assertIsNone(self.index.resolve(""))
+
+    def test_resolve_leaves_prefixes_and_typos_unresolved(self):
+        self.assertIsNone(self.index.resolve("apple"))
+        self.assertIsNone(self.index.resolve("AAP"))
+        self.assertIsNone(self.index.resolve("MSFY"))
+
+
+class SymbolIndexCacheTestClass(TestCase):
+    def setUp(self):
+        self.us = FinnhubSupportedExchanges.objects.create(exchange_code="US")
+        FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.us, symbol_name="AAPL",
+                                                    symbol_description="APPLE INC")
+        FinnhubSupportedStockSymbols.objects.create(symbol_exchange_code=self.us, symbol_name="TWTR",
+                                                    symbol_description="TWITTER INC", symbol_delisted=True)
+        symbol_index.invalidate()
+
+    def test_delisted_symbols_are_not_indexed(self):
+        self.assertEquals(symbol_index.get_index().symbols, [("AAPL", "APPLE INC", None, "US")])
+
+    def test_index_is_reused(self):
+        with self.assertNumQueries(1):
+            symbol_index.get_index()
+            symbol_index.get_index()
+
+    def test_sync_rebuilds_index(self):
+        self.assertIsNone(symbol_index.resolve("microsoft corp"))
+        ingestion.sync_symbols(self.us, [{"currency": "USD", "description": "MICROSOFT CORP", "displaySymbol": "MSFT",
+                                          "symbol": "MSFT", "type": "Common Stock"}])
+        self.assertEquals(symbol_index.resolve("microsoft corp"), "MSFT")
+        self.assertEquals([symbol[0] for symbol in symbol_index.suggest("micro")], ["MSFT"])
@@ -0,0 +1,129 @@
+import asyncio
+from unittest import mock
+
+from django.test import SimpleTestCase
+from finnhub_integration.bar_aggregator import BarAggregator
+from finnhub_integration.trade_stream import FinnhubTradeFeed, LocalTradeFeed, TradeHub, TradeSubscription
+
+
+class TradeHubTestClass(SimpleTestCase):
+    def setUp(self):
+        self.feeds = {}
+
+        def feed_factory(api_key):
+            feed = self.feeds[api_key] = LocalTradeFeed(api_key)
+            return feed
+
+        # Flushed by hand in the tests.
+        self.aggregator = BarAggregator()
+        self.hub = TradeHub(feed_factory=feed_factory, throttle=60, aggregator=self.aggregator)
+
+    async def test_browsers_share_upstream_feed(self):
+        first, second = self.hub.connect("key1"), self.hub.connect("key1")
+        await first.subscribe("AAPL")
+        await second.subscribe("AAPL")
+        await second.subscribe("MSFT")
+        self.assertEquals(self.hub.upstream_count(), 1)
+        self.assertEquals(self.feeds["key1"].symbols, {"AAPL", "MSFT"})
+
+        await second.close()
+        self.assertEquals(self.feeds["key1"].symbols, {"AAPL"})
+        await first.close()
+        self.assertEquals(self.hub.upstream_count(), 0)
+
+    async def test_keys_get_their_own_upstream_feed(self):
+        await self.hub.connect("key1").subscribe("AAPL")
+        await self.hub.connect("key2").subscribe("AAPL")
+        self.assertEquals(self.hub.upstream_count(), 2)
+
+    async def test_trades_are_coalesced(self):
+        subscription = self.hub.connect("key1")
+        await subscription.subscribe("AAPL")
+        self.hub.coalesce("key1", [{'s': "AAPL", 'p': 150.0, 'v': 10, 't': 1000},
+                                   {'s': "AAPL", 'p': 151.0, 'v': 5, 't': 3000},
+                                   {'s': "AAPL", 'p': 149.0, 'v': 1, 't': 2000}])
+        self.hub.flush()
+
+        message = await asyncio.wait_for(subscription.get(), 1)
+        self.assertEquals(message, {'type': 'trade', 'data': [{'s': "AAPL", 'p': 151.0, 'v': 16, 't': 3000, 'n': 3}]})
+        await subscription.close()
+
+    async def test_feed_trades_reach_subscribers_of_the_symbol_only(self):
+        aapl, msft = self.hub.connect("key1"), self.hub.connect("key1")
+        await aapl.subscribe("AAPL")
+        await msft.subscribe("MSFT")
+        self.feeds["key1"].publish("AAPL", 150.0, 10, 1000)
+        await asyncio.sleep(0.01)
+        self.hub.flush()
+
+        self.assertEquals((await asyncio.wait_for(aapl.get(), 1))['data'][0]['p'], 150.0)
+        self.assertTrue(msft._queue.empty())
+        await aapl.close()
+        await msft.close()
+
+    async def test_trades_are_aggregated_once_per_symbol(self):
+        first, second = self.hub.connect("key1"), self.hub.connect("key2")
+        await first.subscribe("AAPL")
+        await second.subscribe("AAPL")
+        # Both keys' feeds relay the same trade.
+        self.feeds["key1"].publish("AAPL", 150.0, 10, 60000)
+        self.feeds["key2"].publish("AAPL", 150.0, 10, 60000)
+        await asyncio.sleep(0.01)
+
+        self.assertEquals(self.aggregator.get_bars("AAPL", '1')['v'].tolist(), [10])
+        with mock.patch.object(self.aggregator, 'flush') as flush:
+            await first.close()
+            await second.close()
+            await asyncio.sleep(0.01)
+        flush.assert_called_once()
+
+    @mock.patch('finnhub_integration.trade_stream.backoff_delay', return_value=0)
+    async def test_failed_feed_is_restarted(self, backoff_delay):
+        first, second = self.hub.connect("key1"), self.hub.connect("key2")
+        await first.subscribe("AAPL")
+        await second.subscribe("AAPL")
+        self.feeds["key1"].publish("AAPL", 150.0, 10, 60000)
+        await asyncio.sleep(0.01)
+        self.assertEquals(self.hub._aggregated, {"AAPL": "key1"})
+
+        with self.assertLogs('finnhub_integration.trade_stream', 'ERROR'):
+            # A malformed batch makes the feed fail, as a dropped connection would.
+            self.feeds["key1"]._queue.put_nowait(None)
+            await asyncio.sleep(0.01)
+            # Another key's feed supplies the symbol's bars meanwhile.
+            self.feeds["key2"].publish("AAPL", 151.0, 5, 61000)
+            await asyncio.sleep(0.01)
+            self.assertEquals(self.hub._aggregated, {"AAPL": "key2"})
+
+            self.feeds["key1"].publish("AAPL", 152.0, 1, 62000)
+            await asyncio.sleep(0.01)
+            self.hub.flush()
+            self.assertEquals((await asyncio.wait_for(first.get(), 1))['data'][-1]['p'], 152.0)
+        self.assertEquals(self.hub.upstream_count(), 2)
+        await first.close()
+        await second.close()
+
+    async def test_slow_browser_drops_oldest_messages(self):
+        subscription = TradeSubscription(self.hub, "key1")
+        for i in range(TradeSubscription.MAX_PENDING + 2):
+            subscription.put({'type': 'trade', 'data': [i]})
+        self.assertEquals(subscription.dropped, 2)
+        self.assertEquals((await subscription.get())['data'], [2])
+
+    async def test_local_feed_makes_up_trades(self):
+        feed = LocalTradeFeed(interval=0.01)
+        await feed.subscribe("AAPL")
+        trades = await asyncio.wait_for(feed.trades().__anext__(), 1)
+        self.assertEquals(trades[0]['s'], "AAPL")
+
+
+class FinnhubTradeFeedTestClass(SimpleTestCase):
+    async def test_subscriptions_survive_a_dropped_connection(self):
+        feed = FinnhubTradeFeed("key")
+        feed._socket = mock.Mock(send=mock.AsyncMock(side_effect=ConnectionError("connection closed")))
+        with self.assertLogs('finnhub_integration.trade_stream', 'WARNING'):
+            await feed.subscribe("AAPL")
+            await feed.subscribe("MSFT")
+            await feed.unsubscribe("MSFT")
+        # They are sent again once the feed has reconnected.
+        self.assertEquals(feed.symbols, {"AAPL"})
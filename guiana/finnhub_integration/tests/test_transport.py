@@ -0,0 +1,193 @@
+import asyncio
+import os
+import tempfile
+from unittest import mock
+
+import httpx
+import requests
+from django.test import SimpleTestCase, override_settings
+from finnhub.exceptions import FinnhubAPIException
+from finnhub_integration.async_client import AsyncFinnhubClient, AsyncFinnhubClientRegistry
+from finnhub_integration.client_registry import FinnhubClientRegistry
+from finnhub_integration.transport import (FixtureArchive, RecordingAdapter, RecordingTransport, ReplayAdapter,
+                                           get_adapter, get_archive, get_async_transport, request_key,
+                                           synthetic_latency)
+
+
+QUOTE = {'c': 150.0, 'pc': 148.0}
+
+
+class TransportTestMixin:
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'fixtures', 'finnhub.json.gz')
+
+
+class FixtureArchiveTestClass(TransportTestMixin, SimpleTestCase):
+    def test_request_key_leaves_out_the_api_key(self):
+        self.assertEquals(request_key('/quote', {'token': 'secret', 'symbol': 'AAPL'}), 'GET /quote?symbol=AAPL')
+        self.assertEquals(request_key('/', {}), 'GET /')
+
+    def test_recorded_responses_are_saved(self):
+        archive = FixtureArchive(self.path)
+        archive.record('/quote', {'symbol': 'AAPL', 'token': 'secret'}, 200, QUOTE, 0.12345)
+        self.assertFalse(os.path.exists(self.path))
+        archive.flush()
+
+        reopened = FixtureArchive(self.path)
+        self.assertEquals(len(reopened), 1)
+        self.assertEquals(reopened.respond('/quote', {'symbol': 'AAPL'}), (200, QUOTE, 0.1235))
+        with open(self.path, 'rb') as f:
+            self.assertNotIn(b'secret', f.read())
+
+    def test_saves_are_due_every_few_responses(self):
+        archive = FixtureArchive(self.path)
+        with mock.patch('finnhub_integration.transport.SAVE_EVERY', 2):
+            self.assertFalse(archive.record('/quote', {'symbol': 'AAPL'}, 200, QUOTE, 0))
+            self.assertTrue(archive.record('/quote', {'symbol': 'MSFT'}, 200, QUOTE, 0))
+            archive.flush()
+            self.assertFalse(archive.record('/quote', {'symbol': 'IBM'}, 200, QUOTE, 0))
+        self.assertEquals(len(FixtureArchive(self.path)), 2)
+
+    def test_other_date_ranges_fall_back_to_the_last_recorded_one(self):
+        archive = FixtureArchive(self.path)
+        archive.record('/company-news', {'symbol': 'AAPL', 'from': '2022-01-01', 'to': '2022-01-31'}, 200, [1], 0)
+        archive.record('/company-news', {'symbol': 'AAPL', 'from': '2022-02-01', 'to': '2022-02-28'}, 200, [2], 0)
+
+        self.assertEquals(archive.respond('/company-news', {'symbol': 'AAPL', 'from': '2022-01-01',
+                                                            'to': '2022-01-31'})[1], [1])
+        self.assertEquals(archive.respond('/company-news', {'symbol': 'AAPL', 'from': '2022-03-01',
+                                                            'to': '2022-03-31'})[1], [2])
+        self.assertEquals(archive.respond('/company-news', {'symbol': 'MSFT', 'from': '2022-03-01',
+                                                            'to': '2022-03-31'})[0], 404)
+
+    def test_candles_are_shifted_to_the_requested_range(self):
+        day = 24 * 60 * 60
+        today = 1700006400
+        archive = FixtureArchive(self.path)
+        # The close of the previous day, as in FinnhubClient.get_ytd_close, then the whole history of a chart.
+        archive.record('/stock/candle', {'symbol': 'AAPL', 'resolution': 'D', 'from': today - day, 'to': today},
+                       200, {'s': 'ok', 't': [today - day], 'c': [178.7], 'v': [10]}, 0)
+        history = list(range(today - 10 * day, today, day))
+        archive.record('/stock/candle', {'symbol': 'AAPL', 'resolution': 'D', 'from': 0, 'to': today},
+                       200, {'s': 'ok', 't': history, 'c': [7.64 + i for i in range(10)], 'v': [1] * 10}, 0)
+
+        # A day later, the previous day's close is still the one recorded for the shortest range.
+        status, body, _ = archive.respond('/stock/candle', {'symbol': 'AAPL', 'resolution': 'D',
+                                                            'from': today, 'to': today + day + 600})
+        self.assertEquals((status, body), (200, {'s': 'ok', 't': [today], 'c': [178.7], 'v': [10]}))
+
+        # Longer ranges are taken from the history.
+        body = archive.respond('/stock/candle', {'symbol': 'AAPL', 'resolution': 'D',
+                                                 'from': today + 17 * day, 'to': today + 20 * day})[1]
+        self.assertEquals(body['t'], [today + 17 * day, today + 18 * day, today + 19 * day])
+        self.assertEquals(body['c'], [14.64, 15.64, 16.64])
+
+        self.assertEquals(archive.respond('/stock/candle', {'symbol': 'MSFT', 'resolution': 'D',
+                                                            'from': today, 'to': today + day})[0], 404)
+
+    def test_synthetic_latency(self):
+        self.assertEquals(synthetic_latency('recorded')(0.2), 0.2)
+        self.assertEquals(synthetic_latency('recorded')(None), 0)
+        self.assertEquals(synthetic_latency(0.05)(0.2), 0.05)
+        delay = synthetic_latency(0.05, jitter=0.1)(None)
+        self.assertTrue(0.05 <= delay <= 0.15)
+
+
+class RecordingTestClass(TransportTestMixin, SimpleTestCase):
+    def test_recording_adapter(self):
+        archive = FixtureArchive(self.path)
+        session = requests.Session()
+        session.mount('https://', RecordingAdapter(archive))
+
+        def send(adapter, request, **kwargs):
+            response = requests.Response()
+            response.status_code = 429 if 'MSFT' in request.url else 200
+            response._content = b'{"c": 150.0, "pc": 148.0}'
+            return response
+
+        with mock.patch('requests.adapters.HTTPAdapter.send', send):
+            session.get('https://finnhub.io/api/v1//quote', params={'symbol': 'AAPL', 'token': 'secret'})
+            session.get('https://finnhub.io/api/v1//quote', params={'symbol': 'MSFT', 'token': 'secret'})
+
+        self.assertEquals(len(archive), 1)
+        self.assertEquals(archive.respond('/quote', {'symbol': 'AAPL'})[:2], (200, QUOTE))
+        session.close()
+        self.assertEquals(len(FixtureArchive(self.path)), 1)
+
+    async def test_recording_transport(self):
+        archive = FixtureArchive(self.path)
+
+        async def handle(transport, request):
+            return httpx.Response(200, json=QUOTE)
+
+        with mock.patch('httpx.AsyncHTTPTransport.handle_async_request', handle), \
+                mock.patch('finnhub_integration.transport.SAVE_EVERY', 2), \
+                mock.patch('asyncio.to_thread', wraps=asyncio.to_thread) as to_thread:
+            client = AsyncFinnhubClient("secret", transport=RecordingTransport(archive))
+            try:
+                self.assertEquals(await client.quote('AAPL'), QUOTE)
+                self.assertFalse(os.path.exists(self.path))
+                await client.quote('MSFT')
+                self.assertEquals(len(FixtureArchive(self.path)), 2)
+                await client.quote('IBM')
+            finally:
+                await client.aclose()
+        self.assertEquals(len(FixtureArchive(self.path)), 3)
+        self.assertEquals(to_thread.call_count, 2)
+
+
+class ReplayTestClass(TransportTestMixin, SimpleTestCase):
+    def setUp(self):
+        super().setUp()
+        archive = FixtureArchive(self.path)
+        archive.record('/quote', {'symbol': 'AAPL'}, 200, QUOTE, 0.5)
+        archive.record('/', {}, 200, {}, 0.5)
+        archive.flush()
+        config = {'mode': 'replay', 'archive': self.path, 'latency': 0, 'jitter': 0}
+        settings_override = override_settings(FINNHUB_TRANSPORT=config)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_sync_clients_replay_the_archive(self):
+        registry = FinnhubClientRegistry()
+        self.addCleanup(registry.clear)
+        self.assertEquals(registry.get("any key").quote('AAPL'), QUOTE)
+        self.assertTrue(registry.check_key_valid("any key"))
+        with self.assertRaises(FinnhubAPIException) as cm:
+            registry.get("any key").quote('MSFT')
+        self.assertEquals(cm.exception.status_code, 404)
+
+    async def test_async_clients_replay_the_archive(self):
+        registry = AsyncFinnhubClientRegistry()
+        try:
+            self.assertEquals(await registry.get("any key").quote('AAPL'), QUOTE)
+        finally:
+            await registry.aclose()
+
+    def test_replayed_latency(self):
+        adapter = get_adapter()
+        self.assertIsInstance(adapter, ReplayAdapter)
+        self.assertIs(adapter.respond.__self__, get_archive(self.path))
+        with override_settings(FINNHUB_TRANSPORT={'mode': 'replay', 'archive': self.path, 'latency': 'recorded'}):
+            with mock.patch('finnhub_integration.transport.time.sleep') as sleep:
+                get_adapter().send(requests.Request('GET', 'https://finnhub.io/api/v1//quote?symbol=AAPL').prepare())
+        sleep.assert_called_once_with(0.5)
+
+
+class TransportModesTestClass(SimpleTestCase):
+    def test_live_mode_calls_finnhub(self):
+        with override_settings(FINNHUB_TRANSPORT={'mode': 'live'}):
+            self.assertIsNone(get_adapter())
+            self.assertIsNone(get_async_transport())
+
+    def test_stub_mode(self):
+        with override_settings(FINNHUB_TRANSPORT={'mode': 'stub', 'latency': 0}):
+            registry = FinnhubClientRegistry()
+            self.addCleanup(registry.clear)
+            self.assertEquals(registry.get("any key").company_profile2(symbol='SAAA')['ticker'], 'SAAA')
+
+    def test_unknown_mode(self):
+        with override_settings(FINNHUB_TRANSPORT={'mode': 'offline'}), self.assertRaises(ValueError):
+            get_adapter()
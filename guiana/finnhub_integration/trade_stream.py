@@ -0,0 +1,341 @@
+"""
+Fan-out of live trades from finnhub.io to the browsers.
+
+Rather than every browser tab opening its own WebSocket to finnhub.io with the user's API key, the server keeps
+one upstream feed per API key, subscribed to the union of the symbols its browsers watch. The trades of every
+symbol are coalesced into a single tick (last price, total volume and number of trades) and sent to the
+subscribed browsers at most every FINNHUB_TRADE_THROTTLE seconds. The trades are also aggregated into intraday
+bars (see bar_aggregator.py), which are written to the candle store every FINNHUB_BARS_FLUSH_INTERVAL seconds.
+
+Feeds are async iterators of finnhub.io-style trade batches, i.e. lists of {'s', 'p', 'v', 't'} dicts.
+FinnhubTradeFeed streams them from finnhub.io and LocalTradeFeed is an in-process stand-in for tests and
+development.
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+import weakref
+from asgiref.sync import sync_to_async
+from django.conf import settings
+
+from finnhub_integration.bar_aggregator import bar_aggregator
+from finnhub_integration.rate_limit import backoff_delay
+
+
+logger = logging.getLogger(__name__)
+
+
+class FinnhubTradeFeed:
+    URL = 'wss://ws.finnhub.io?token={}'
+
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+        self.symbols = set()
+        self._socket = None
+
+    async def subscribe(self, symbol: str):
+        self.symbols.add(symbol)
+        await self._send({'type': 'subscribe', 'symbol': symbol})
+
+    async def unsubscribe(self, symbol: str):
+        self.symbols.discard(symbol)
+        await self._send({'type': 'unsubscribe', 'symbol': symbol})
+
+    async def _send(self, message: dict):
+        socket = self._socket
+        if socket is None:
+            return
+        try:
+            await socket.send(json.dumps(message))
+        except Exception as e:
+            # The connection dropped, and the feed subscribes to its symbols again once it has reconnected.
+            logger.warning("Could not send %s to the finnhub trade feed: %r", message['type'], e)
+
+    async def trades(self):
+        """
+        Yield trade batches for as long as the feed is iterated, reconnecting with backoff whenever the
+        connection drops.
+        """
+
+        import websockets  # Only needed when streaming from finnhub.io.
+
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.URL.format(self.api_key)) as socket:
+                    self._socket = socket
+                    attempt = 0
+                    for symbol in list(self.symbols):
+                        await socket.send(json.dumps({'type': 'subscribe', 'symbol': symbol}))
+                    async for message in socket:
+                        message = json.loads(message)
+                        if message.get('type') == 'trade':
+                            yield message['data']
+            except (OSError, websockets.WebSocketException) as e:
+                logger.warning("Finnhub trade feed disconnected: %r", e)
+            finally:
+                self._socket = None
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+
+class LocalTradeFeed:
+    def __init__(self, api_key: str = None, interval: float = None):
+        """
+        Construct an in-process trade feed.
+
+        @param interval: Seconds between made up trades of every subscribed symbol, or None to only yield the
+                         trades given to publish.
+        """
+
+        self.api_key = api_key
+        self.interval = interval
+        self.symbols = set()
+        self._queue = asyncio.Queue()
+        self._prices = {}
+
+    async def subscribe(self, symbol: str):
+        self.symbols.add(symbol)
+
+    async def unsubscribe(self, symbol: str):
+        self.symbols.discard(symbol)
+
+    def publish(self, symbol: str, price: float, volume: float = 1, timestamp: int = None):
+        """
+        Feed a trade, timestamped in milliseconds like finnhub.io's.
+        """
+
+        timestamp = int(time.time() * 1000) if timestamp is None else timestamp
+        self._queue.put_nowait([{'s': symbol, 'p': price, 'v': volume, 't': timestamp}])
+
+    def _make_up_trades(self):
+        for symbol in self.symbols:
+            price = self._prices.get(symbol, 100.0) * (1 + random.gauss(0, 0.001))
+            self._prices[symbol] = price
+            self.publish(symbol, round(price, 2), random.randint(1, 500))
+
+    async def trades(self):
+        while True:
+            try:
+                yield await asyncio.wait_for(self._queue.get(), self.interval)
+            except asyncio.TimeoutError:
+                self._make_up_trades()
+
+
+def make_trade_feed(api_key: str):
+    """
+    @return: The trade feed of an API key, as configured by settings.FINNHUB_TRADE_FEED.
+    """
+
+    if settings.FINNHUB_TRADE_FEED == 'local':
+        return LocalTradeFeed(api_key, interval=settings.FINNHUB_TRADE_THROTTLE)
+    return FinnhubTradeFeed(api_key)
+
+
+class TradeSubscription:
+    # Messages kept for a browser that doesn't keep up. Older ones are dropped first.
+    MAX_PENDING = 32
+
+    def __init__(self, hub, api_key: str):
+        self.hub = hub
+        self.api_key = api_key
+        self.symbols = set()
+        self.dropped = 0
+        self._queue = asyncio.Queue(maxsize=self.MAX_PENDING)
+
+    async def subscribe(self, symbol: str):
+        await self.hub.subscribe(self, symbol)
+
+    async def unsubscribe(self, symbol: str):
+        await self.hub.unsubscribe(self, symbol)
+
+    async def close(self):
+        for symbol in list(self.symbols):
+            await self.hub.unsubscribe(self, symbol)
+
+    def put(self, message: dict):
+        if self._queue.full():
+            self._queue.get_nowait()
+            self.dropped += 1
+        self._queue.put_nowait(message)
+
+    async def get(self):
+        """
+        @return: The next finnhub.io-style {'type': 'trade', 'data': [...]} message for the browser.
+        """
+
+        return await self._queue.get()
+
+
+class _Upstream:
+    def __init__(self, feed, task):
+        self.feed = feed
+        self.task = task
+        self.subscriptions = {}
+
+
+class TradeHub:
+    def __init__(self, feed_factory=None, throttle: float = None, aggregator=None):
+        """
+        Construct a hub without upstream feeds. It must be used from a single event loop.
+
+        @param feed_factory: Function returning the trade feed of an API key, defaults to make_trade_feed.
+        @param throttle: Seconds between two messages to a browser, defaults to settings.FINNHUB_TRADE_THROTTLE.
+        @param aggregator: BarAggregator the trades are added to, defaults to the process-wide one.
+        """
+
+        self.feed_factory = make_trade_feed if feed_factory is None else feed_factory
+        self.throttle = settings.FINNHUB_TRADE_THROTTLE if throttle is None else throttle
+        self.aggregator = bar_aggregator if aggregator is None else aggregator
+        self._upstreams = {}
+        self._ticks = {}
+        # API key whose feed the trades of a symbol are aggregated from, so that they aren't counted once per key.
+        self._aggregated = {}
+        self._flusher = None
+        self._bars_flusher = None
+
+    def connect(self, api_key: str):
+        """
+        @return: A new subscription for a browser of a user with the given API key.
+        """
+
+        return TradeSubscription(self, api_key)
+
+    def upstream_count(self):
+        return len(self._upstreams)
+
+    async def subscribe(self, subscription: TradeSubscription, symbol: str):
+        upstream = self._upstreams.get(subscription.api_key)
+        if upstream is None:
+            feed = self.feed_factory(subscription.api_key)
+            upstream = self._upstreams[subscription.api_key] = _Upstream(
+                feed, asyncio.create_task(self._pump(subscription.api_key, feed))
+            )
+        if self._flusher is None:
+            self._flusher = asyncio.create_task(self._flush_periodically())
+            self._bars_flusher = asyncio.create_task(self._flush_bars_periodically())
+
+        subscribers = upstream.subscriptions.setdefault(symbol, set())
+        if not subscribers:
+            await upstream.feed.subscribe(symbol)
+        subscribers.add(subscription)
+        subscription.symbols.add(symbol)
+
+    async def unsubscribe(self, subscription: TradeSubscription, symbol: str):
+        subscription.symbols.discard(symbol)
+        upstream = self._upstreams.get(subscription.api_key)
+        if upstream is None or subscription not in upstream.subscriptions.get(symbol, ()):
+            return
+
+        upstream.subscriptions[symbol].discard(subscription)
+        if not upstream.subscriptions[symbol]:
+            del upstream.subscriptions[symbol]
+            self._ticks.pop((subscription.api_key, symbol), None)
+            if self._aggregated.get(symbol) == subscription.api_key:
+                del self._aggregated[symbol]
+            await upstream.feed.unsubscribe(symbol)
+        if not upstream.subscriptions:
+            # Nobody watches the key's symbols anymore, so its upstream connection is closed.
+            del self._upstreams[subscription.api_key]
+            upstream.task.cancel()
+        if not self._upstreams and self._flusher is not None:
+            self._flusher.cancel()
+            self._bars_flusher.cancel()
+            self._flusher = self._bars_flusher = None
+
+    async def _pump(self, api_key: str, feed):
+        """
+        Relay the trades of a key's feed for as long as its upstream is open, restarting the feed with backoff
+        whenever it fails or ends.
+        """
+
+        attempt = 0
+        while True:
+            try:
+                async for trades in feed.trades():
+                    attempt = 0
+                    self.coalesce(api_key, trades)
+                    self.aggregator.add_trades([
+                        trade for trade in trades if self._aggregated.setdefault(trade['s'], api_key) == api_key
+                    ])
+                logger.warning("Trade feed of %s... ended, restarting it", api_key[:4])
+            except Exception:
+                logger.exception("Trade feed of %s... failed, restarting it", api_key[:4])
+            # Meanwhile, the symbols' bars may be aggregated from the trades of other keys' feeds.
+            self._release_aggregated(api_key)
+            await asyncio.sleep(backoff_delay(attempt))
+            attempt += 1
+
+    def _release_aggregated(self, api_key: str):
+        for symbol in [symbol for symbol, key in self._aggregated.items() if key == api_key]:
+            del self._aggregated[symbol]
+
+    def coalesce(self, api_key: str, trades: list):
+        """
+        Merge trades into the ticks waiting for the next flush.
+        """
+
+        for trade in trades:
+            key = (api_key, trade['s'])
+            tick = self._ticks.get(key)
+            if tick is None:
+                self._ticks[key] = {'s': trade['s'], 'p': trade['p'], 'v': trade['v'], 't': trade['t'], 'n': 1}
+                continue
+            if trade['t'] >= tick['t']:
+                tick['p'], tick['t'] = trade['p'], trade['t']
+            tick['v'] += trade['v']
+            tick['n'] += 1
+
+    def flush(self):
+        """
+        Send every subscription the ticks of its symbols coalesced since the last flush.
+        """
+
+        ticks, self._ticks = self._ticks, {}
+        messages = {}
+        for (api_key, symbol), tick in ticks.items():
+            upstream = self._upstreams.get(api_key)
+            if upstream is None:
+                continue
+            for subscription in upstream.subscriptions.get(symbol, ()):
+                messages.setdefault(subscription, []).append(tick)
+        for subscription, data in messages.items():
+            subscription.put({'type': 'trade', 'data': data})
+
+    async def _flush_periodically(self):
+        while True:
+            await asyncio.sleep(self.throttle)
+            self.flush()
+
+    async def _flush_bars(self):
+        try:
+            await sync_to_async(self.aggregator.flush)()
+        except Exception:
+            logger.exception("Could not store the aggregated bars")
+
+    async def _flush_bars_periodically(self):
+        try:
+            while True:
+                await asyncio.sleep(settings.FINNHUB_BARS_FLUSH_INTERVAL)
+                await self._flush_bars()
+        finally:
+            # The bars of the last trades are stored once the last browser leaves.
+            await self._flush_bars()
+
+
+_hubs = weakref.WeakKeyDictionary()
+
+
+def get_trade_hub():
+    """
+    @return: The trade hub of the running event loop, creating it on first use.
+    """
+
+    loop = asyncio.get_running_loop()
+    hub = _hubs.get(loop)
+    if hub is None:
+        hub = _hubs[loop] = TradeHub()
+    return hub
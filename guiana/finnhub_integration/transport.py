@@ -0,0 +1,400 @@
+"""
+Pluggable transport under the finnhub.io clients, to run the site without finnhub.io.
+
+FINNHUB_TRANSPORT['mode'] selects what answers the clients' calls:
+ - 'live': finnhub.io.
+ - 'record': finnhub.io, every response being also saved to an on-disk fixture archive.
+ - 'replay': the archive, without a key or the network.
+ - 'stub': made up, but deterministic, data (see stub.py), without an archive.
+
+Replayed and stubbed responses are delayed by a synthetic latency: the one measured while recording
+('recorded'), or a fixed number of seconds, plus up to FINNHUB_TRANSPORT['jitter'] random seconds. Together,
+they let the dashboard be load tested on a single machine with realistic upstream delays.
+
+Recorded responses are buffered, and the archive is saved every SAVE_EVERY responses or SAVE_INTERVAL
+seconds, when the clients are closed, and when the process exits.
+
+Responses are archived by endpoint and parameters, the API key excepted. Since the date ranges of candles and
+news move with the clock, a call no response was recorded for is answered with the last response recorded for
+the same endpoint and parameters regardless of the date range, and a call matching nothing gets a 404. Candles
+are the exception, as their bars must fall in the requested range: the candles recorded over the shortest range
+at least as long as the requested one (or else the longest) are shifted to end where it ends, and trimmed to it.
+
+The transport plugs in under the sync clients as a requests adapter, and under the async clients as an httpx
+transport (see client_registry.py and async_client.py).
+"""
+
+import asyncio
+import atexit
+import gzip
+import json
+import os
+import random
+import threading
+import time
+from urllib.parse import parse_qsl, urlsplit
+import finnhub as fh
+import httpx
+import requests
+from django.conf import settings
+from requests.adapters import BaseAdapter, HTTPAdapter
+
+
+ARCHIVE_VERSION = 1
+
+MODES = ('live', 'record', 'replay', 'stub')
+
+API_PATH = urlsplit(fh.Client.API_URL).path
+
+# Number of recorded responses, and seconds, after which the archive is saved.
+SAVE_EVERY = 50
+SAVE_INTERVAL = 30
+
+# Parameters ignored when falling back to a response recorded for another date range.
+VOLATILE_PARAMS = ('from', 'to', 'minId')
+
+CANDLES_PATH = '/stock/candle'
+CANDLE_ARRAYS = ('t', 'o', 'h', 'l', 'c', 'v')
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def api_path(url_path: str):
+    """
+    @return: The API path of a finnhub.io URL path, e.g. '/quote' for '/api/v1//quote'.
+    """
+
+    return '/' + url_path[len(API_PATH):].strip('/')
+
+
+def _candle_step(params: dict):
+    resolution = params.get('resolution', 'D')
+    return SECONDS_PER_DAY if resolution in ('D', 'W', 'M') else int(resolution) * 60
+
+
+def _candle_range(params: dict):
+    # The number of bars a range spans, so that ranges ending at different times of the day compare equal.
+    return round((int(params['to']) - int(params['from'])) / _candle_step(params))
+
+
+def _shift_candles(entry: dict, start: int, end: int):
+    """
+    @return: A copy of a recorded candles entry, its bars shifted by whole bars to end at `end` and trimmed to
+             those from `start` on.
+    """
+
+    body = entry['body']
+    if not isinstance(body, dict) or not body.get('t'):
+        return entry
+    step = _candle_step(entry['params'])
+    offset = round((end - int(entry['params']['to'])) / step) * step
+    kept = [i for i, t in enumerate(body['t']) if start <= t + offset <= end]
+    if not kept:
+        return {**entry, 'body': {'s': 'no_data'}}
+
+    shifted = {name: [body[name][i] for i in kept] for name in CANDLE_ARRAYS if name in body}
+    shifted['t'] = [t + offset for t in shifted['t']]
+    return {**entry, 'body': {**body, **shifted}}
+
+
+def request_key(path: str, params: dict, ignored: tuple = ()):
+    """
+    @return: The key a response is archived under, e.g. 'GET /quote?symbol=AAPL'. The API key is left out.
+    """
+
+    params = sorted((name, str(value)) for name, value in params.items() if name not in ('token',) + ignored)
+    return 'GET ' + path + ('?' + '&'.join('{}={}'.format(name, value) for name, value in params) if params else '')
+
+
+class FixtureArchive:
+    def __init__(self, path: str):
+        """
+        Open the archive at a path, which is gzipped if it ends with '.gz'. A missing archive is empty.
+        """
+
+        self.path = str(path)
+        self._responses = {}
+        self._fallbacks = {}
+        # Candles recorded for each symbol and resolution, by request key.
+        self._candles = {}
+        self._lock = threading.Lock()
+        # Serialises saves, so that an older snapshot can't overwrite a newer one.
+        self._save_lock = threading.Lock()
+        self._unsaved = 0
+        self._saved_at = time.monotonic()
+        if os.path.exists(self.path):
+            opener = gzip.open if self.path.endswith('.gz') else open
+            with opener(self.path, 'rt', encoding='utf-8') as f:
+                archive = json.load(f)
+            for entry in archive['responses']:
+                self._add(entry)
+
+    def __len__(self):
+        return len(self._responses)
+
+    def _add(self, entry: dict):
+        key = request_key(entry['path'], entry['params'])
+        fallback_key = request_key(entry['path'], entry['params'], VOLATILE_PARAMS)
+        self._responses[key] = entry
+        if entry['path'] == CANDLES_PATH:
+            if 'from' in entry['params'] and 'to' in entry['params']:
+                self._candles.setdefault(fallback_key, {})[key] = entry
+        else:
+            self._fallbacks[fallback_key] = entry
+
+    def record(self, path: str, params: dict, status_code: int, body, elapsed: float):
+        """
+        Archive a response, without saving the archive.
+
+        @return: Whether the archive is due to be saved, see flush.
+        """
+
+        params = {name: str(value) for name, value in params.items() if name != 'token'}
+        with self._lock:
+            self._add({'path': path, 'params': params, 'status': status_code, 'body': body,
+                       'elapsed': round(elapsed, 4)})
+            self._unsaved += 1
+            return self._unsaved >= SAVE_EVERY or time.monotonic() - self._saved_at >= SAVE_INTERVAL
+
+    def flush(self):
+        """
+        Save the archive if responses were recorded since it was last saved.
+        """
+
+        with self._save_lock:
+            with self._lock:
+                if not self._unsaved:
+                    return
+                responses = list(self._responses.values())
+                self._unsaved, self._saved_at = 0, time.monotonic()
+            self._write(responses)
+
+    def lookup(self, path: str, params: dict):
+        """
+        @return: The response recorded for a call, or for the same call over another date range (see the module
+                 docstring), or None.
+        """
+
+        entry = self._responses.get(request_key(path, params))
+        if entry is not None:
+            return entry
+        fallback_key = request_key(path, params, VOLATILE_PARAMS)
+        if path != CANDLES_PATH:
+            return self._fallbacks.get(fallback_key)
+
+        recorded = list(self._candles.get(fallback_key, {}).values())
+        if not recorded or 'from' not in params or 'to' not in params:
+            return None
+        length = _candle_range(params)
+
+        def distance(entry):
+            # Shorter ranges come after every range covering the requested one.
+            recorded_length = _candle_range(entry['params'])
+            return recorded_length < length, abs(recorded_length - length)
+
+        # The last recorded entry wins ties, as for the other endpoints.
+        closest = min(reversed(recorded), key=distance)
+        return _shift_candles(closest, int(params['from']), int(params['to']))
+
+    def respond(self, path: str, params: dict):
+        """
+        @return: A (status code, JSON body, recorded latency) tuple.
+        """
+
+        entry = self.lookup(path, params)
+        if entry is None:
+            return 404, {'error': "No recorded response for {}".format(request_key(path, params))}, None
+        return entry['status'], entry['body'], entry['elapsed']
+
+    def _write(self, responses: list):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Written aside and then moved, so that an interrupted save doesn't corrupt the archive.
+        opener = gzip.open if self.path.endswith('.gz') else open
+        with opener(self.path + '.tmp', 'wt', encoding='utf-8') as f:
+            json.dump({'version': ARCHIVE_VERSION, 'responses': responses}, f)
+        os.replace(self.path + '.tmp', self.path)
+
+
+def synthetic_latency(latency='recorded', jitter: float = 0.0):
+    """
+    @param latency: 'recorded' to delay responses by the latency measured while recording them, or seconds.
+    @param jitter: Upper bound of random seconds added to every delay.
+    @return: A function of a response's recorded latency (None if unknown) returning the seconds to delay it by.
+    """
+
+    def delay(recorded):
+        base = (recorded or 0.0) if latency == 'recorded' else latency
+        return base + (random.uniform(0, jitter) if jitter else 0.0)
+
+    return delay
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, respond, delay=synthetic_latency(0)):
+        """
+        @param respond: Function of an API path and parameters returning a (status code, JSON body, recorded
+                        latency) tuple, e.g. FixtureArchive.respond.
+        @param delay: Function returning the seconds to delay a response by, see synthetic_latency.
+        """
+
+        super().__init__()
+        self.respond = respond
+        self.delay = delay
+
+    def send(self, request, **kwargs):
+        url = urlsplit(request.url)
+        status_code, body, elapsed = self.respond(api_path(url.path), dict(parse_qsl(url.query)))
+        time.sleep(self.delay(elapsed))
+
+        response = requests.Response()
+        response.status_code = status_code
+        response.headers['Content-Type'] = 'application/json'
+        response._content = json.dumps(body).encode()
+        response.encoding = 'utf-8'
+        response.url = request.url
+        response.request = request
+        return response
+
+    def close(self):
+        pass
+
+
+class ReplayTransport(httpx.AsyncBaseTransport):
+    def __init__(self, respond, delay=synthetic_latency(0)):
+        """
+        The async counterpart of ReplayAdapter.
+        """
+
+        self.respond = respond
+        self.delay = delay
+
+    async def handle_async_request(self, request: httpx.Request):
+        status_code, body, elapsed = self.respond(api_path(request.url.path), dict(request.url.params))
+        await asyncio.sleep(self.delay(elapsed))
+        return httpx.Response(status_code, json=body, request=request)
+
+
+def _recordable(status_code: int):
+    # Rate limiting and server errors are transient, and not worth replaying.
+    return status_code != 429 and status_code < 500
+
+
+class RecordingAdapter(HTTPAdapter):
+    def __init__(self, archive: FixtureArchive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    def send(self, request, **kwargs):
+        start = time.perf_counter()
+        response = super().send(request, **kwargs)
+        if _recordable(response.status_code):
+            url = urlsplit(request.url)
+            try:
+                body = response.json()
+            except ValueError:
+                body = response.text
+            if self.archive.record(api_path(url.path), dict(parse_qsl(url.query)), response.status_code, body,
+                                   time.perf_counter() - start):
+                self.archive.flush()
+        return response
+
+    def close(self):
+        super().close()
+        self.archive.flush()
+
+
+class RecordingTransport(httpx.AsyncHTTPTransport):
+    def __init__(self, archive: FixtureArchive, **kwargs):
+        super().__init__(**kwargs)
+        self.archive = archive
+
+    async def handle_async_request(self, request: httpx.Request):
+        start = time.perf_counter()
+        response = await super().handle_async_request(request)
+        if not _recordable(response.status_code):
+            return response
+
+        content = await response.aread()
+        elapsed = time.perf_counter() - start
+        try:
+            body = json.loads(content)
+        except ValueError:
+            body = content.decode('utf-8', 'replace')
+        if self.archive.record(api_path(request.url.path), dict(request.url.params), response.status_code, body,
+                               elapsed):
+            # Saving blocks on the disk, so it is kept off the event loop.
+            await asyncio.to_thread(self.archive.flush)
+        return httpx.Response(response.status_code, headers=response.headers, content=content, request=request)
+
+    async def aclose(self):
+        await super().aclose()
+        await asyncio.to_thread(self.archive.flush)
+
+
+_archives = {}
+_archives_lock = threading.Lock()
+
+
+def get_archive(path: str = None):
+    """
+    @return: The process' archive at a path, defaulting to FINNHUB_TRANSPORT['archive'], loaded on first use and
+             shared by the sync and async clients.
+    """
+
+    path = str(settings.FINNHUB_TRANSPORT['archive'] if path is None else path)
+    with _archives_lock:
+        if path not in _archives:
+            _archives[path] = FixtureArchive(path)
+            # The responses recorded since the last save are saved on exit.
+            atexit.register(_archives[path].flush)
+        return _archives[path]
+
+
+def _get_mode():
+    mode = settings.FINNHUB_TRANSPORT['mode']
+    if mode not in MODES:
+        raise ValueError("FINNHUB_TRANSPORT['mode'] must be one of {}, not {!r}".format(MODES, mode))
+    return mode
+
+
+def _get_stub():
+    # Imported here, since the stub builds its transports on this module.
+    from finnhub_integration.stub import FinnhubStub
+    return FinnhubStub()
+
+
+def _get_delay():
+    config = settings.FINNHUB_TRANSPORT
+    return synthetic_latency(config.get('latency', 'recorded'), config.get('jitter', 0.0))
+
+
+def get_adapter(pool_maxsize: int = 10):
+    """
+    @return: A requests adapter for the FINNHUB_TRANSPORT mode, or None to call finnhub.io as usual.
+    """
+
+    mode = _get_mode()
+    if mode == 'live':
+        return None
+    if mode == 'record':
+        return RecordingAdapter(get_archive(), pool_connections=1, pool_maxsize=pool_maxsize)
+    if mode == 'stub':
+        return _get_stub().requests_adapter(_get_delay())
+    return ReplayAdapter(get_archive().respond, _get_delay())
+
+
+def get_async_transport(max_connections: int = 10):
+    """
+    @return: An httpx transport for the FINNHUB_TRANSPORT mode, or None to call finnhub.io as usual.
+    """
+
+    mode = _get_mode()
+    if mode == 'live':
+        return None
+    if mode == 'record':
+        return RecordingTransport(get_archive(), limits=httpx.Limits(max_connections=max_connections,
+                                                                     max_keepalive_connections=max_connections))
+    if mode == 'stub':
+        return _get_stub().httpx_transport(_get_delay())
+    return ReplayTransport(get_archive().respond, _get_delay())
@@ -13,4 +13,22 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'guiana.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# Imported once Django is set up, since they use its models and settings.
+from dashboard.consumers import trades_consumer
+
+websocket_routes = {
+    '/ws/trades/': trades_consumer,
+}
+
+
+async def application(scope, receive, send):
+    if scope['type'] == 'websocket':
+        consumer = websocket_routes.get(scope['path'])
+        if consumer is None:
+            await receive()
+            await send({'type': 'websocket.close'})
+            return
+        return await consumer(scope, receive, send)
+    return await django_application(scope, receive, send)
@@ -44,6 +44,9 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Reports the timings of finnhub.io calls, cache and database access in a Server-Timing header, to staff or in DEBUG.
+    # See finnhub_integration/metrics.py.
+    'finnhub_integration.metrics.server_timing_middleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -85,6 +88,89 @@ DATABASES = {
 }
 
 
+# Finnhub rate limiting
+# Calls made with the same API key are limited to 'calls' per 'period' seconds, with bursts of up to 'burst'
+# calls. Calls rejected with a 429 or 5xx are retried up to 'retries' times, after a random delay of up to
+# backoff_base * 2 ** attempt seconds (capped at 'backoff_cap'). See finnhub_integration/rate_limit.py.
+
+FINNHUB_RATE_LIMIT = {
+    'calls': 60,
+    'period': 60,
+    'burst': 10,
+    'retries': 3,
+    'backoff_base': 0.5,
+    'backoff_cap': 8,
+}
+
+
+# Finnhub transport
+# 'mode' is 'live' to call finnhub.io, 'record' to also save every response to the 'archive', 'replay' to
+# answer from the archive without a key or the network, or 'stub' for made up data. Replayed responses are
+# delayed by the 'latency' measured while recording them ('recorded') or by a number of seconds, plus up to
+# 'jitter' random seconds. See finnhub_integration/transport.py.
+
+FINNHUB_TRANSPORT = {
+    'mode': 'live',
+    'archive': BASE_DIR / 'fixtures' / 'finnhub.json.gz',
+    'latency': 'recorded',
+    'jitter': 0.0,
+}
+
+
+# Finnhub response cache
+# Seconds a response is served from cache ('fresh'), and for how much longer it may be served while
+# it is refreshed in the background ('stale'). See finnhub_integration/response_cache.py.
+
+FINNHUB_CACHE_TTLS = {
+    'company_profile': {'fresh': 24 * 60 * 60, 'stale': 7 * 24 * 60 * 60},
+    'basic_financials': {'fresh': 6 * 60 * 60, 'stale': 24 * 60 * 60},
+    'candles': {'fresh': 60 * 60, 'stale': 24 * 60 * 60},
+    'general_news': {'fresh': 5 * 60, 'stale': 30 * 60},
+    'quote': {'fresh': 60, 'stale': 15 * 60},
+}
+
+
+# News sentiment analysis
+# TextBlob scores only depend on the raw text, so 'blank:en' gives the same results as a trained spaCy
+# model (e.g. 'en_core_web_lg') without loading its vectors. The model is loaded on first use, unless
+# FINNHUB_SENTIMENT_PRELOAD is set. See finnhub_integration/sentiment.py.
+
+FINNHUB_SENTIMENT_MODEL = 'blank:en'
+FINNHUB_SENTIMENT_BATCH_SIZE = 64
+FINNHUB_SENTIMENT_N_PROCESS = 1
+FINNHUB_SENTIMENT_PRELOAD = False
+
+
+# Company news
+# Stored news are served for FINNHUB_NEWS_MAX_AGE seconds before being fetched again. The news worker
+# (manage.py run_news_worker) polls every FINNHUB_NEWS_WORKER_INTERVAL seconds and refreshes the news of
+# the symbols searched in the last FINNHUB_NEWS_WORKER_LOOKBACK seconds.
+
+FINNHUB_NEWS_MAX_AGE = 15 * 60
+FINNHUB_NEWS_WORKER_INTERVAL = 5 * 60
+FINNHUB_NEWS_WORKER_LOOKBACK = 24 * 60 * 60
+
+
+# Live trades
+# Browsers receive trades over the project's own WebSocket (/ws/trades/), fed by one upstream connection per
+# API key. FINNHUB_TRADE_FEED is 'finnhub' to stream them from finnhub.io, or 'local' for made up trades, e.g.
+# during development. Trades are coalesced and sent at most every FINNHUB_TRADE_THROTTLE seconds. See
+# finnhub_integration/trade_stream.py.
+
+FINNHUB_TRADE_FEED = 'finnhub'
+FINNHUB_TRADE_THROTTLE = 1.0
+
+
+# Intraday bars
+# Live trades are aggregated into 1 and 5 minute bars, which are written to the candle store every
+# FINNHUB_BARS_FLUSH_INTERVAL seconds. A symbol's last price is taken from its live trades for
+# FINNHUB_LIVE_PRICE_MAX_AGE seconds, before asking finnhub.io for a quote again. See
+# finnhub_integration/bar_aggregator.py.
+
+FINNHUB_BARS_FLUSH_INTERVAL = 30
+FINNHUB_LIVE_PRICE_MAX_AGE = 5 * 60
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.1/ref/settings/#auth-password-validators
 
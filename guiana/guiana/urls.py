@@ -14,7 +14,8 @@ Including another URLconf
     2. Add a URL to urlpatterns:  path('blog/', include('blog.urls'))
 """
 from accounts.views import LoginPageView, LogoutPageView, RegisterPageView
-from dashboard.views import DashboardView, SearchResultsView, UserSettingsView
+from dashboard.views import (CandlesticksView, DashboardView, MetricsView, SearchResultsView, SymbolAutocompleteView,
+                             SymbolComparisonView, UserSettingsView)
 from django.contrib import admin
 from django.urls import path
 
@@ -26,6 +27,11 @@ urlpatterns = [
 
     path('dashboard/', DashboardView.as_view(), name='dashboard'),  
     path('search_results/', SearchResultsView.as_view(), name='search_results'),
+    path('candlesticks/<str:symbol>/', CandlesticksView.as_view(), name='candlesticks'),
+    path('symbols/autocomplete/', SymbolAutocompleteView.as_view(), name='symbol_autocomplete'),
+    path('symbols/compare/', SymbolComparisonView.as_view(), name='symbol_comparison'),
     
     path('dashboard/settings', UserSettingsView.as_view(), name='settings'),
+
+    path('metrics/', MetricsView.as_view(), name='metrics'),
 ]
@@ -1,6 +1,8 @@
 import os
+import time
 import finnhub as fh
-from finnhub_integration.models import FinnhubSupportedExchanges, FinnhubSupportedStockSymbols
+from finnhub_integration import ingestion
+from finnhub_integration.models import FinnhubSupportedExchanges
 
 FINNHUB_KEY = os.environ.get('FINNHUB_API_KEY')
 
@@ -9,17 +11,6 @@ fc = fh.Client(api_key=FINNHUB_KEY)
 symbols = fc.stock_symbols('US')
 symbol_exchange = FinnhubSupportedExchanges.objects.get(exchange_code='US')
 
-counter = 0
-for symbol in symbols:
-    symbol_obj = FinnhubSupportedStockSymbols.objects.create(
-        symbol_exchange_code = symbol_exchange,
-        symbol_currency = symbol['currency'],
-        symbol_description = symbol['description'],
-        symbol_type = symbol['type'],
-        symbol_display_sym = symbol['displaySymbol'],
-        symbol_name = symbol['symbol']
-    )
-    symbol_obj.save()        
-    counter += 1
-    if counter % 10 == 0:
-        print("10 symbols added!")
\ No newline at end of file
+start = time.perf_counter()
+counter = ingestion.upsert_symbols([ingestion.build_symbol(symbol, symbol_exchange) for symbol in symbols])
+print("%d symbols added in %.2fs!" % (counter, time.perf_counter() - start))